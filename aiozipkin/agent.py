@@ -0,0 +1,284 @@
+"""Local agent that receives encoded spans from application processes on
+same host and sends them to collector in large compressed batches.
+
+Applications use AgentTransport, which encodes spans and writes them to
+agent Unix datagram socket or localhost UDP port without waiting, spans
+are dropped and counted if agent is not running or socket buffer is
+full. Retries, buffering, compression and collector connections are
+handled by agent process only.
+
+Run agent with::
+
+    aiozipkin-agent --collector http://localhost:9411/api/v2/spans \\
+        --unix /run/aiozipkin.sock --udp-port 9412
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import stat
+import struct
+from typing import Any, List, Optional, Sequence, Tuple
+
+from .compression import GZIP
+from .encoding import JSON, OTLP, PROTO3, get_encoder
+from .log import logger
+from .mypy_types import OptStr
+from .record import Record
+from .transport import (
+    DROP_ENCODING_ERROR,
+    DROP_QUEUE_FULL,
+    DROP_TOO_LARGE,
+    DROP_UNAVAILABLE,
+    Transport,
+    TransportABC,
+    TransportStats,
+    _priority,
+)
+
+
+DEFAULT_AGENT_HOST = "127.0.0.1"
+DEFAULT_AGENT_PORT = 9412
+MAX_DATAGRAM_SIZE = 65507
+
+_VERSION = 1
+_ENCODING_CODES = {JSON: 0, PROTO3: 1, OTLP: 2}
+# datagram header: protocol version and encoding of spans
+_DATAGRAM = struct.Struct("<BB")
+# span header: span length and priority
+_SPAN = struct.Struct("<IB")
+
+
+def _parse_datagram(data: bytes) -> Tuple[int, int, List[Tuple[bytes, int]]]:
+    version, encoding = _DATAGRAM.unpack_from(data)
+    spans = []
+    pos = _DATAGRAM.size
+    while pos + _SPAN.size <= len(data):
+        length, priority = _SPAN.unpack_from(data, pos)
+        pos += _SPAN.size
+        if pos + length > len(data):
+            raise ValueError("Truncated span in datagram")
+        spans.append((data[pos : pos + length], priority))
+        pos += length
+    if pos != len(data):
+        raise ValueError("Truncated span in datagram")
+    return version, encoding, spans
+
+
+def _remove_stale_socket(path: str) -> None:
+    # socket left by previous agent is replaced, anything else at that
+    # path is never removed
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"{path!r} exists and is not a socket")
+    os.unlink(path)
+
+
+class AgentTransport(TransportABC):
+    """Transport that sends encoded spans to local agent.
+
+    Spans finished during one event loop iteration are packed into as few
+    datagrams as possible. If path is set, Unix datagram socket is used,
+    otherwise UDP to host and port.
+    """
+
+    def __init__(
+        self,
+        path: OptStr = None,
+        *,
+        host: str = DEFAULT_AGENT_HOST,
+        port: int = DEFAULT_AGENT_PORT,
+        encoding: str = JSON,
+        max_datagram_size: int = MAX_DATAGRAM_SIZE,
+    ) -> None:
+        self._encoder = get_encoder(encoding)
+        self._header = _DATAGRAM.pack(_VERSION, _ENCODING_CODES[encoding])
+        self._max_datagram_size = max_datagram_size
+        self._address: Any
+        if path is not None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._address = path
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._address = (host, port)
+        self._sock.setblocking(False)
+        self._loop = asyncio.get_event_loop()
+        self._pending: List[bytes] = []
+        self._flush_scheduled = False
+        self._closed = False
+        self._stats = TransportStats()
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    def send(self, record: Record) -> None:
+        if self._closed:
+            self._stats.drop(DROP_UNAVAILABLE)
+            return
+        try:
+            data = self._encoder.encode_span(record)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        frame = _SPAN.pack(len(data), _priority(record)) + data
+        if len(self._header) + len(frame) > self._max_datagram_size:
+            self._stats.drop(DROP_TOO_LARGE)
+            return
+        self._pending.append(frame)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        datagram = [self._header]
+        size = len(self._header)
+        for frame in pending:
+            if size + len(frame) > self._max_datagram_size:
+                self._send_datagram(datagram)
+                datagram = [self._header]
+                size = len(self._header)
+            datagram.append(frame)
+            size += len(frame)
+        if len(datagram) > 1:
+            self._send_datagram(datagram)
+
+    def _send_datagram(self, datagram: List[bytes]) -> None:
+        try:
+            self._sock.sendto(b"".join(datagram), self._address)
+        except BlockingIOError:
+            self._stats.drop(DROP_QUEUE_FULL, len(datagram) - 1)
+        except OSError:
+            # agent is not running, spans are lost
+            self._stats.drop(DROP_UNAVAILABLE, len(datagram) - 1)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+        self._sock.close()
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, agent: "Agent") -> None:
+        self._agent = agent
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self._agent._receive(data)
+
+
+class Agent:
+    """Receives spans from AgentTransport clients and sends them to
+    collector with Transport, keyword arguments are passed to Transport.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        path: OptStr = None,
+        host: str = DEFAULT_AGENT_HOST,
+        port: Optional[int] = DEFAULT_AGENT_PORT,
+        encoding: str = JSON,
+        **kwargs: Any,
+    ) -> None:
+        if path is None and port is None:
+            raise ValueError("Unix socket path or UDP port is required")
+        self._path = path
+        self._host = host
+        self.port = port
+        self._transport = Transport(address, encoding=encoding, **kwargs)
+        self._encoding_code = _ENCODING_CODES[encoding]
+        self._endpoints: List[asyncio.DatagramTransport] = []
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._transport.stats
+
+    async def start(self) -> None:
+        loop = asyncio.get_event_loop()
+        if self._path is not None:
+            _remove_stale_socket(self._path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self._path)
+            endpoint, _ = await loop.create_datagram_endpoint(
+                lambda: _AgentProtocol(self), sock=sock
+            )
+            self._endpoints.append(endpoint)
+        if self.port is not None:
+            endpoint, _ = await loop.create_datagram_endpoint(
+                lambda: _AgentProtocol(self), local_addr=(self._host, self.port)
+            )
+            self.port = endpoint.get_extra_info("sockname")[1]
+            self._endpoints.append(endpoint)
+
+    def _receive(self, data: bytes) -> None:
+        try:
+            version, encoding, spans = _parse_datagram(data)
+        except (ValueError, struct.error):
+            logger.warning("Malformed datagram of %s bytes", len(data))
+            return
+        if version != _VERSION or encoding != self._encoding_code:
+            logger.warning("Datagram with unsupported version or encoding")
+            self.stats.drop(DROP_ENCODING_ERROR, len(spans))
+            return
+        for span, priority in spans:
+            self._transport.send_encoded(span, priority)
+
+    async def close(self) -> None:
+        for endpoint in self._endpoints:
+            endpoint.close()
+        self._endpoints = []
+        if self._path is not None:
+            _remove_stale_socket(self._path)
+        await self._transport.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="aiozipkin-agent", description="Zipkin span forwarding agent"
+    )
+    parser.add_argument("--collector", required=True, help="collector span URL")
+    parser.add_argument("--unix", help="Unix datagram socket path")
+    parser.add_argument("--host", default=DEFAULT_AGENT_HOST, help="UDP host")
+    parser.add_argument("--udp-port", type=int, help="UDP port")
+    parser.add_argument("--encoding", default=JSON, choices=sorted(_ENCODING_CODES))
+    parser.add_argument("--compression", default=GZIP, help="gzip, zstd or none")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--send-interval", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    if args.unix is None and args.udp_port is None:
+        parser.error("at least one of --unix and --udp-port is required")
+
+    async def run() -> None:
+        agent = Agent(
+            args.collector,
+            path=args.unix,
+            host=args.host,
+            port=args.udp_port,
+            encoding=args.encoding,
+            compression=None if args.compression == "none" else args.compression,
+            send_max_size=args.batch_size,
+            send_interval=args.send_interval,
+        )
+        await agent.start()
+        loop = asyncio.get_event_loop()
+        stopper = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopper.set)
+        await stopper.wait()
+        await agent.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,7 @@ from .helpers import (
     parse_debug_header,
     parse_sampled_header,
 )
+from .sampler import SamplingAttributes
 from .span import SpanAbc
 from .tracer import Tracer
 
@@ -77,17 +78,36 @@ def _set_remote_endpoint(span: SpanAbc, request: Request) -> None:
             span.remote_endpoint(None, **kwargs)
 
 
+def _get_route(request: Request) -> Optional[str]:
+    resource = request.match_info.route.resource
+    if resource is None:
+        return None
+    return resource.canonical
+
+
+def _get_sampling_attributes(request: Request) -> SamplingAttributes:
+    method = request.method.upper()
+    return SamplingAttributes(
+        name=f"{method} {request.path}",
+        method=method,
+        path=request.path,
+        route=_get_route(request),
+        headers=request.headers,
+    )
+
+
 def _get_span(request: Request, tracer: Tracer) -> SpanAbc:
     # builds span from incoming request, if no context found, create
     # new span
     context = make_context(request.headers)
+    attributes = _get_sampling_attributes(request)
 
     if context is None:
         sampled = parse_sampled_header(request.headers)
         debug = parse_debug_header(request.headers)
-        span = tracer.new_trace(sampled=sampled, debug=debug)
+        span = tracer.new_trace(sampled=sampled, debug=debug, attributes=attributes)
     else:
-        span = tracer.join_span(context)
+        span = tracer.join_span(context, attributes=attributes)
     return span
 
 
@@ -98,9 +118,8 @@ def _set_span_properties(span: SpanAbc, request: Request) -> None:
     span.tag(HTTP_PATH, request.path)
     span.tag(HTTP_METHOD, request.method.upper())
 
-    resource = request.match_info.route.resource
-    if resource is not None:
-        route = resource.canonical
+    route = _get_route(request)
+    if route is not None:
         span.tag(HTTP_ROUTE, route)
 
     _set_remote_endpoint(span, request)
@@ -0,0 +1,62 @@
+"""Request body compression for span export.
+
+Zipkin compatible collectors accept compressed request bodies, span
+lists compress very well since trace ids, endpoints and tag keys repeat
+across spans of a batch.
+"""
+import gzip
+from typing import Callable, NamedTuple, Optional
+
+from .mypy_types import OptInt
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+
+class Compressor(NamedTuple):
+    content_encoding: str
+    compress: Callable[[bytes], bytes]
+
+
+def get_compressor(
+    compression: Optional[str], level: OptInt = None
+) -> Optional[Compressor]:
+    """Returns compressor for given compression name, None means request
+    body is sent as is.
+    """
+    if compression is None:
+        return None
+
+    if compression == GZIP:
+        gzip_level = DEFAULT_GZIP_LEVEL if level is None else level
+
+        def compress_gzip(data: bytes) -> bytes:
+            return gzip.compress(data, compresslevel=gzip_level)
+
+        return Compressor(GZIP, compress_gzip)
+
+    if compression == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires zstandard package")
+        zstd_level = DEFAULT_ZSTD_LEVEL if level is None else level
+
+        def compress_zstd(data: bytes) -> bytes:
+            # compressor objects are not thread safe, and compression
+            # may run in executor, so new one is created for each call
+            c = zstandard.ZstdCompressor(level=zstd_level)
+            result: bytes = c.compress(data)
+            return result
+
+        return Compressor(ZSTD, compress_zstd)
+
+    raise ValueError(f"Unsupported compression: {compression!r}")
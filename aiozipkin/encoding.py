@@ -0,0 +1,348 @@
+"""Wire formats supported by zipkin v2 collectors.
+
+Zipkin accepts span lists encoded either as JSON or as proto3
+``zipkin.proto3.ListOfSpans`` messages, for more information see:
+https://github.com/openzipkin/zipkin-api/blob/master/zipkin.proto
+
+OpenTelemetry collectors are supported with OTLP ``ExportTraceServiceRequest``
+messages, for more information see:
+https://github.com/open-telemetry/opentelemetry-proto
+
+Spans are encoded one by one as soon as they are finished, so batches
+are kept as lists of ready to send fragments and joined into request
+body without another serialization pass.
+"""
+import abc
+import ipaddress
+import json
+import struct
+from json.encoder import encode_basestring_ascii as _quote
+from typing import Dict, List, Optional, Tuple, Type
+
+from .constants import ERROR
+from .helpers import CLIENT, CONSUMER, PRODUCER, SERVER, Endpoint, filter_none
+from .record import Record
+
+
+JSON = "json"
+PROTO3 = "proto3"
+OTLP = "otlp"
+
+
+class EncoderABC(abc.ABC):
+    content_type: str
+
+    @abc.abstractmethod
+    def encode_span(self, record: Record) -> bytes:  # pragma: no cover
+        """Encodes finished record into fragment of request body."""
+        pass
+
+    @abc.abstractmethod
+    def encode_list(self, spans: List[bytes]) -> bytes:  # pragma: no cover
+        """Joins encoded spans into request body for zipkin collector."""
+        pass
+
+
+class JsonEncoder(EncoderABC):
+    content_type = "application/json"
+
+    def __init__(self) -> None:
+        # local endpoint is the same for all spans of a tracer, so its
+        # representation is built only once
+        self._local_endpoints: Dict[Endpoint, str] = {}
+
+    def _local_endpoint(self, endpoint: Endpoint) -> str:
+        fragment = self._local_endpoints.get(endpoint)
+        if fragment is None:
+            fragment = ',"localEndpoint":' + _json_endpoint(endpoint)
+            self._local_endpoints[endpoint] = fragment
+        return fragment
+
+    def encode_span(self, record: Record) -> bytes:
+        r = record
+        c = r._context
+        parts = ['{"traceId":', _quote(c.trace_id), ',"id":', _quote(c.span_id)]
+        if c.parent_id is not None:
+            parts.append(',"parentId":')
+            parts.append(_quote(c.parent_id))
+        parts.append(',"name":')
+        parts.append(_quote(r._name))
+        if r._kind is not None:
+            parts.append(',"kind":')
+            parts.append(_quote(r._kind))
+        if r._timestamp is not None:
+            parts.append(',"timestamp":%d' % r._timestamp)
+        if r._duration is not None:
+            parts.append(',"duration":%d' % r._duration)
+        if c.debug:
+            parts.append(',"debug":true')
+        if c.shared:
+            parts.append(',"shared":true')
+        parts.append(self._local_endpoint(r._local_endpoint))
+        if r._remote_endpoint is not None:
+            parts.append(',"remoteEndpoint":')
+            parts.append(_json_endpoint(r._remote_endpoint))
+        if r._annotations:
+            parts.append(',"annotations":[')
+            parts.append(
+                ",".join(
+                    '{"timestamp":%d,"value":%s}' % (a.timestamp, _quote(a.value))
+                    for a in r._annotations
+                )
+            )
+            parts.append("]")
+        if r._tags:
+            parts.append(',"tags":{')
+            parts.append(
+                ",".join(_quote(k) + ":" + _quote(v) for k, v in r._tags.items())
+            )
+            parts.append("}")
+        parts.append("}")
+        return "".join(parts).encode("ascii")
+
+    def encode_list(self, spans: List[bytes]) -> bytes:
+        return b"[" + b",".join(spans) + b"]"
+
+
+def _json_endpoint(endpoint: Endpoint) -> str:
+    return json.dumps(filter_none(endpoint._asdict()), separators=(",", ":"))
+
+
+# protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LEN = 2
+
+_KINDS = {CLIENT: 1, SERVER: 2, PRODUCER: 3, CONSUMER: 4}
+
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return bytes((value,))
+    buf = bytearray()
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+    return bytes(buf)
+
+
+def _tag(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _len_field(field: int, value: bytes) -> bytes:
+    return _tag(field, _LEN) + _varint(len(value)) + value
+
+
+def _str_field(field: int, value: str) -> bytes:
+    return _len_field(field, value.encode("utf-8"))
+
+
+def _fixed64_field(field: int, value: int) -> bytes:
+    return _tag(field, _FIXED64) + struct.pack("<Q", value)
+
+
+def _varint_field(field: int, value: int) -> bytes:
+    return _tag(field, _VARINT) + _varint(value)
+
+
+def _proto_endpoint(endpoint: Endpoint) -> bytes:
+    # message Endpoint {service_name = 1; ipv4 = 2; ipv6 = 3; port = 4}
+    parts: List[bytes] = []
+    if endpoint.serviceName:
+        parts.append(_str_field(1, endpoint.serviceName))
+    if endpoint.ipv4:
+        parts.append(_len_field(2, ipaddress.IPv4Address(endpoint.ipv4).packed))
+    if endpoint.ipv6:
+        parts.append(_len_field(3, ipaddress.IPv6Address(endpoint.ipv6).packed))
+    if endpoint.port:
+        parts.append(_varint_field(4, endpoint.port))
+    return b"".join(parts)
+
+
+class Proto3Encoder(EncoderABC):
+    content_type = "application/x-protobuf"
+
+    def __init__(self) -> None:
+        self._local_endpoints: Dict[Endpoint, bytes] = {}
+
+    def _local_endpoint(self, endpoint: Endpoint) -> bytes:
+        fragment = self._local_endpoints.get(endpoint)
+        if fragment is None:
+            fragment = _len_field(8, _proto_endpoint(endpoint))
+            self._local_endpoints[endpoint] = fragment
+        return fragment
+
+    def encode_span(self, record: Record) -> bytes:
+        r = record
+        c = r._context
+        # ids are encoded as raw big endian bytes instead of hex strings
+        parts = [_len_field(1, bytes.fromhex(c.trace_id))]
+        if c.parent_id is not None:
+            parts.append(_len_field(2, bytes.fromhex(c.parent_id)))
+        parts.append(_len_field(3, bytes.fromhex(c.span_id)))
+        kind: Optional[int] = _KINDS.get(r._kind or "")
+        if kind is not None:
+            parts.append(_varint_field(4, kind))
+        if r._name:
+            parts.append(_str_field(5, r._name))
+        if r._timestamp:
+            parts.append(_fixed64_field(6, r._timestamp))
+        if r._duration:
+            parts.append(_varint_field(7, r._duration))
+        parts.append(self._local_endpoint(r._local_endpoint))
+        if r._remote_endpoint is not None:
+            parts.append(_len_field(9, _proto_endpoint(r._remote_endpoint)))
+        for a in r._annotations:
+            annotation = _fixed64_field(1, a.timestamp) + _str_field(2, a.value)
+            parts.append(_len_field(10, annotation))
+        for key, value in r._tags.items():
+            parts.append(_len_field(11, _str_field(1, key) + _str_field(2, value)))
+        if c.debug:
+            parts.append(_varint_field(12, 1))
+        if c.shared:
+            parts.append(_varint_field(13, 1))
+        # message ListOfSpans {repeated Span spans = 1;}, so each encoded
+        # span is already a valid list fragment
+        return _len_field(1, b"".join(parts))
+
+    def encode_list(self, spans: List[bytes]) -> bytes:
+        return b"".join(spans)
+
+
+# opentelemetry.proto.trace.v1.Span.SpanKind
+_OTLP_KINDS = {SERVER: 2, CLIENT: 3, PRODUCER: 4, CONSUMER: 5}
+_OTLP_STATUS_ERROR = 2
+# opentelemetry.proto.common.v1.InstrumentationScope {name = 1}
+_OTLP_SCOPE = _len_field(1, _str_field(1, "aiozipkin"))
+
+
+def _otlp_attribute(key: str, value: str) -> bytes:
+    # KeyValue {key = 1; AnyValue value = 2}, AnyValue {string_value = 1}
+    return _str_field(1, key) + _len_field(2, _str_field(1, value))
+
+
+def _otlp_endpoint(prefix: str, endpoint: Endpoint) -> List[Tuple[str, str]]:
+    attributes = []
+    ip = endpoint.ipv4 or endpoint.ipv6
+    if ip:
+        attributes.append((f"net.{prefix}.ip", ip))
+    if endpoint.port:
+        attributes.append((f"net.{prefix}.port", str(endpoint.port)))
+    return attributes
+
+
+def _otlp_resource(endpoint: Endpoint) -> bytes:
+    # Resource {repeated KeyValue attributes = 1}
+    attributes = _otlp_endpoint("host", endpoint)
+    if endpoint.serviceName:
+        attributes.insert(0, ("service.name", endpoint.serviceName))
+    return b"".join(_len_field(1, _otlp_attribute(k, v)) for k, v in attributes)
+
+
+class OtlpEncoder(EncoderABC):
+    """Encodes spans as OTLP/HTTP protobuf ``ExportTraceServiceRequest``.
+
+    Local endpoint of span becomes resource, and spans are grouped by
+    resource in request body. Each encoded span is prefixed with its
+    resource, so fragments stay self contained, for example when they are
+    written to disk spool.
+    """
+
+    content_type = "application/x-protobuf"
+
+    def __init__(self) -> None:
+        self._resources: Dict[Endpoint, bytes] = {}
+
+    def _resource(self, endpoint: Endpoint) -> bytes:
+        fragment = self._resources.get(endpoint)
+        if fragment is None:
+            resource = _otlp_resource(endpoint)
+            fragment = _varint(len(resource)) + resource
+            self._resources[endpoint] = fragment
+        return fragment
+
+    def encode_span(self, record: Record) -> bytes:
+        r = record
+        c = r._context
+        # 64 bit trace ids are padded to 128 bits
+        parts = [
+            _len_field(1, bytes.fromhex(c.trace_id.rjust(32, "0"))),
+            _len_field(2, bytes.fromhex(c.span_id)),
+        ]
+        if c.parent_id is not None:
+            parts.append(_len_field(4, bytes.fromhex(c.parent_id)))
+        parts.append(_str_field(5, r._name))
+        kind = _OTLP_KINDS.get(r._kind or "")
+        if kind is not None:
+            parts.append(_varint_field(6, kind))
+        # zipkin timestamps are in microseconds, otlp ones in nanoseconds
+        start = (r._timestamp or 0) * 1000
+        parts.append(_fixed64_field(7, start))
+        parts.append(_fixed64_field(8, start + (r._duration or 0) * 1000))
+
+        attributes = list(r._tags.items())
+        if r._remote_endpoint is not None:
+            remote = r._remote_endpoint
+            if remote.serviceName:
+                attributes.append(("peer.service", remote.serviceName))
+            attributes.extend(_otlp_endpoint("peer", remote))
+        for key, value in attributes:
+            parts.append(_len_field(9, _otlp_attribute(key, value)))
+        for a in r._annotations:
+            # Event {time_unix_nano = 1; name = 2}
+            event = _fixed64_field(1, a.timestamp * 1000) + _str_field(2, a.value)
+            parts.append(_len_field(11, event))
+        error = r._tags.get(ERROR)
+        if error is not None:
+            # Status {message = 2; code = 3}
+            status = _str_field(2, error) + _varint_field(3, _OTLP_STATUS_ERROR)
+            parts.append(_len_field(15, status))
+        # ScopeSpans {repeated Span spans = 2}
+        return self._resource(r._local_endpoint) + _len_field(2, b"".join(parts))
+
+    def encode_list(self, spans: List[bytes]) -> bytes:
+        groups: Dict[bytes, List[bytes]] = {}
+        for fragment in spans:
+            size, pos = _read_varint(fragment, 0)
+            resource = fragment[pos : pos + size]
+            groups.setdefault(resource, []).append(fragment[pos + size :])
+        # ExportTraceServiceRequest {repeated ResourceSpans resource_spans = 1}
+        # ResourceSpans {Resource resource = 1; repeated ScopeSpans scope_spans = 2}
+        # ScopeSpans {InstrumentationScope scope = 1; repeated Span spans = 2}
+        return b"".join(
+            _len_field(
+                1,
+                _len_field(1, resource)
+                + _len_field(2, _OTLP_SCOPE + b"".join(fragments)),
+            )
+            for resource, fragments in groups.items()
+        )
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return result, pos
+
+
+_ENCODERS: Dict[str, Type[EncoderABC]] = {
+    JSON: JsonEncoder,
+    PROTO3: Proto3Encoder,
+    OTLP: OtlpEncoder,
+}
+
+
+def get_encoder(encoding: str) -> EncoderABC:
+    """Returns encoder instance for given encoding name."""
+    try:
+        encoder_cls = _ENCODERS[encoding]
+    except KeyError:
+        raise ValueError(f"Unsupported encoding: {encoding!r}") from None
+    return encoder_cls()
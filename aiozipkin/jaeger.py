@@ -0,0 +1,311 @@
+"""Transport that sends spans to local jaeger agent over UDP.
+
+Spans are packed into ``Agent.emitBatch`` oneway calls encoded with
+Thrift compact protocol, which jaeger agent accepts on port 6831, for
+more information see:
+https://github.com/jaegertracing/jaeger-idl/blob/main/thrift/jaeger.thrift
+
+Datagrams are sent without waiting for reply, so there are no retries and
+spans are dropped and counted if agent is not running.
+"""
+import asyncio
+import socket
+from typing import Dict, List, Optional
+
+from .constants import ERROR
+from .helpers import Endpoint
+from .log import logger
+from .record import Record
+from .transport import (
+    DROP_ENCODING_ERROR,
+    DROP_QUEUE_FULL,
+    DROP_TOO_LARGE,
+    DROP_UNAVAILABLE,
+    TransportABC,
+    TransportStats,
+)
+from .utils import unsigned_hex_to_signed_int
+
+
+DEFAULT_JAEGER_HOST = "127.0.0.1"
+DEFAULT_JAEGER_PORT = 6831
+# jaeger agent drops datagrams larger than its 65000 bytes buffer
+MAX_PACKET_SIZE = 65000
+
+# thrift compact protocol types
+_BOOL_TRUE = 1
+_I32 = 5
+_I64 = 6
+_BINARY = 8
+_LIST = 9
+_STRUCT = 12
+_STOP = b"\x00"
+
+# jaeger.thrift TagType
+_TAG_STRING = 0
+_TAG_BOOL = 2
+_TAG_LONG = 3
+
+_MAX_SEQ_ID = 2**31 - 1
+_SAMPLED = 1
+_DEBUG = 2
+
+
+def _varint(value: int) -> bytes:
+    buf = bytearray()
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+    return bytes(buf)
+
+
+def _zigzag(value: int) -> bytes:
+    return _varint((value << 1) ^ (value >> 63))
+
+
+def _binary(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _varint(len(data)) + data
+
+
+def _list_header(size: int, elem_type: int) -> bytes:
+    if size < 15:
+        return bytes(((size << 4) | elem_type,))
+    return bytes((0xF0 | elem_type,)) + _varint(size)
+
+
+class _Struct:
+    """Builds thrift compact struct, fields must be added in id order."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._last = 0
+
+    def _field(self, field: int, field_type: int) -> None:
+        # ids are always small and increasing, so short form is enough
+        self._parts.append(bytes((((field - self._last) << 4) | field_type,)))
+        self._last = field
+
+    def i32(self, field: int, value: int) -> "_Struct":
+        self._field(field, _I32)
+        self._parts.append(_zigzag(value))
+        return self
+
+    def i64(self, field: int, value: int) -> "_Struct":
+        self._field(field, _I64)
+        self._parts.append(_zigzag(value))
+        return self
+
+    def string(self, field: int, value: str) -> "_Struct":
+        self._field(field, _BINARY)
+        self._parts.append(_binary(value))
+        return self
+
+    def true(self, field: int) -> "_Struct":
+        self._field(field, _BOOL_TRUE)
+        return self
+
+    def struct(self, field: int, value: bytes) -> "_Struct":
+        self._field(field, _STRUCT)
+        self._parts.append(value)
+        return self
+
+    def structs(self, field: int, values: List[bytes]) -> "_Struct":
+        self._field(field, _LIST)
+        self._parts.append(_list_header(len(values), _STRUCT))
+        self._parts.extend(values)
+        return self
+
+    def build(self) -> bytes:
+        return b"".join(self._parts) + _STOP
+
+
+def _string_tag(key: str, value: str) -> bytes:
+    return _Struct().string(1, key).i32(2, _TAG_STRING).string(3, value).build()
+
+
+def _long_tag(key: str, value: int) -> bytes:
+    return _Struct().string(1, key).i32(2, _TAG_LONG).i64(6, value).build()
+
+
+def _bool_tag(key: str) -> bytes:
+    return _Struct().string(1, key).i32(2, _TAG_BOOL).true(5).build()
+
+
+def _signed_id(hex_id: Optional[str]) -> int:
+    return unsigned_hex_to_signed_int(hex_id) if hex_id else 0
+
+
+def encode_process(endpoint: Endpoint) -> bytes:
+    """Encodes local endpoint as jaeger.thrift Process struct."""
+    tags = []
+    ip = endpoint.ipv4 or endpoint.ipv6
+    if ip:
+        tags.append(_string_tag("ip", ip))
+    if endpoint.port:
+        tags.append(_long_tag("port", endpoint.port))
+    process = _Struct().string(1, endpoint.serviceName or "unknown")
+    if tags:
+        process.structs(2, tags)
+    return process.build()
+
+
+def encode_span(record: Record) -> bytes:
+    """Encodes finished record as jaeger.thrift Span struct."""
+    r = record
+    c = r._context
+    trace_id = c.trace_id
+    tags = []
+    for key, value in r._tags.items():
+        if key == ERROR:
+            # jaeger marks failed spans with boolean error tag
+            tags.append(_bool_tag(key))
+            if value != "true":
+                tags.append(_string_tag("error.message", value))
+        else:
+            tags.append(_string_tag(key, value))
+    if r._kind is not None:
+        tags.append(_string_tag("span.kind", r._kind.lower()))
+    if r._remote_endpoint is not None:
+        remote = r._remote_endpoint
+        if remote.serviceName:
+            tags.append(_string_tag("peer.service", remote.serviceName))
+        if remote.ipv4:
+            tags.append(_string_tag("peer.ipv4", remote.ipv4))
+        if remote.ipv6:
+            tags.append(_string_tag("peer.ipv6", remote.ipv6))
+        if remote.port:
+            tags.append(_long_tag("peer.port", remote.port))
+    logs = [
+        _Struct()
+        .i64(1, a.timestamp)
+        .structs(2, [_string_tag("event", a.value)])
+        .build()
+        for a in r._annotations
+    ]
+
+    span = (
+        _Struct()
+        .i64(1, _signed_id(trace_id[-16:]))
+        .i64(2, _signed_id(trace_id[:-16]))
+        .i64(3, _signed_id(c.span_id))
+        .i64(4, _signed_id(c.parent_id))
+        .string(5, r._name)
+        .i32(7, (_SAMPLED if c.sampled else 0) | (_DEBUG if c.debug else 0))
+        .i64(8, r._timestamp or 0)
+        .i64(9, r._duration or 0)
+    )
+    if tags:
+        span.structs(10, tags)
+    if logs:
+        span.structs(11, logs)
+    return span.build()
+
+
+def _message_header(seq_id: int) -> bytes:
+    # protocol id, version 1 with oneway message type, seq id and method name
+    return b"\x82\x81" + _varint(seq_id) + _binary("emitBatch")
+
+
+def encode_batch(seq_id: int, process: bytes, spans: List[bytes]) -> bytes:
+    """Encodes ``Agent.emitBatch`` message with encoded process and spans."""
+    batch = _Struct().struct(1, process).structs(2, spans).build()
+    args = _Struct().struct(1, batch).build()
+    return _message_header(seq_id) + args
+
+
+# message header, emitBatch args struct, Batch struct with process field
+# and list header of spans, both structs stops
+_OVERHEAD = len(_message_header(_MAX_SEQ_ID)) + 1 + 1 + 1 + 6 + 2
+
+
+class JaegerTransport(TransportABC):
+    """Transport that sends spans to jaeger agent with UDP.
+
+    Spans finished during one event loop iteration are packed into as few
+    datagrams as possible, every datagram is at most max_packet_size bytes.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_JAEGER_HOST,
+        port: int = DEFAULT_JAEGER_PORT,
+        *,
+        max_packet_size: int = MAX_PACKET_SIZE,
+    ) -> None:
+        self._address = (host, port)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._max_spans_size = max_packet_size - _OVERHEAD
+        self._loop = asyncio.get_event_loop()
+        self._processes: Dict[Endpoint, bytes] = {}
+        # encoded spans grouped by encoded process
+        self._pending: Dict[bytes, List[bytes]] = {}
+        self._flush_scheduled = False
+        self._seq_id = 0
+        self._closed = False
+        self._stats = TransportStats()
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    def _process(self, endpoint: Endpoint) -> bytes:
+        process = self._processes.get(endpoint)
+        if process is None:
+            process = encode_process(endpoint)
+            self._processes[endpoint] = process
+        return process
+
+    def send(self, record: Record) -> None:
+        if self._closed:
+            self._stats.drop(DROP_UNAVAILABLE)
+            return
+        try:
+            process = self._process(record._local_endpoint)
+            data = encode_span(record)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        if len(process) + len(data) > self._max_spans_size:
+            self._stats.drop(DROP_TOO_LARGE)
+            return
+        self._pending.setdefault(process, []).append(data)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        for process, spans in pending.items():
+            batch: List[bytes] = []
+            size = len(process)
+            for span in spans:
+                if batch and size + len(span) > self._max_spans_size:
+                    self._send_batch(process, batch)
+                    batch = []
+                    size = len(process)
+                batch.append(span)
+                size += len(span)
+            self._send_batch(process, batch)
+
+    def _send_batch(self, process: bytes, spans: List[bytes]) -> None:
+        self._seq_id = (self._seq_id + 1) & _MAX_SEQ_ID
+        datagram = encode_batch(self._seq_id, process, spans)
+        try:
+            self._sock.sendto(datagram, self._address)
+        except BlockingIOError:
+            self._stats.drop(DROP_QUEUE_FULL, len(spans))
+        except OSError:
+            # agent is not running, spans are lost
+            self._stats.drop(DROP_UNAVAILABLE, len(spans))
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+        self._sock.close()
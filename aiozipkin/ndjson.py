@@ -0,0 +1,244 @@
+"""Transport that writes spans to newline delimited JSON files.
+
+Every line of file is one zipkin v2 JSON span, so files can be shipped
+to collector later, for example with ``python -m aiozipkin.replay``.
+File being written has ``.part`` suffix and is renamed when it is
+rotated or transport is closed, so shippers must pick only files with
+``.ndjson`` or ``.ndjson.gz`` suffix.
+
+Spans are encoded on event loop into in memory buffer, buffer is written
+to file by single worker thread, so event loop never waits for disk.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import gzip
+import os
+import time
+from typing import IO, List, Optional, Union
+
+from .encoding import JsonEncoder
+from .log import logger
+from .record import Record
+from .transport import (
+    DROP_ENCODING_ERROR,
+    DROP_QUEUE_FULL,
+    DROP_UNAVAILABLE,
+    DROP_WRITE_ERROR,
+    TransportABC,
+    TransportStats,
+)
+
+
+# file is synced to disk never, when it is closed or after every write
+FSYNC_NEVER = "never"
+FSYNC_ROTATE = "rotate"
+FSYNC_ALWAYS = "always"
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_ROTATE, FSYNC_ALWAYS)
+
+SUFFIX = ".ndjson"
+GZIP_SUFFIX = ".ndjson.gz"
+PART_SUFFIX = ".part"
+
+DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024
+DEFAULT_ROTATE_INTERVAL = 3600.0
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_MAX_PENDING_SIZE = 64 * 1024 * 1024
+
+
+class _Writer:
+    """Owns current file, used only from writer thread."""
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str,
+        compress: bool,
+        max_file_size: int,
+        rotate_interval: float,
+        fsync: str,
+    ) -> None:
+        self._directory = directory
+        self._prefix = prefix
+        self._compress = compress
+        self._max_file_size = max_file_size
+        self._rotate_interval = rotate_interval
+        self._fsync = fsync
+        self._raw: Optional[IO[bytes]] = None
+        self._file: Optional[Union[IO[bytes], gzip.GzipFile]] = None
+        self._path = ""
+        self._opened_at = 0.0
+        self._seq = 0
+
+    def write(self, data: bytes) -> None:
+        now = time.time()
+        if self._file is not None and (
+            now - self._opened_at >= self._rotate_interval
+            or self._size() >= self._max_file_size
+        ):
+            self.close()
+        if not data:
+            return
+        if self._file is None:
+            self._open(now)
+        assert self._file is not None and self._raw is not None
+        self._file.write(data)
+        if self._fsync == FSYNC_ALWAYS:
+            self._file.flush()
+            os.fsync(self._raw.fileno())
+
+    def _size(self) -> int:
+        assert self._raw is not None
+        # compressed size for gzip files, data still buffered by
+        # compressor is not counted
+        return self._raw.tell()
+
+    def _open(self, now: float) -> None:
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+        self._seq += 1
+        name = f"{self._prefix}-{stamp}-{os.getpid()}-{self._seq}"
+        name += GZIP_SUFFIX if self._compress else SUFFIX
+        self._path = os.path.join(self._directory, name)
+        self._raw = open(self._path + PART_SUFFIX, "wb")
+        if self._compress:
+            self._file = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        else:
+            self._file = self._raw
+        self._opened_at = now
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        assert self._raw is not None
+        if self._file is not self._raw:
+            self._file.close()
+        if self._fsync != FSYNC_NEVER:
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        self._raw.close()
+        self._file = self._raw = None
+        os.rename(self._path + PART_SUFFIX, self._path)
+
+
+class FileTransport(TransportABC):
+    """Transport that appends spans to NDJSON files in directory.
+
+    Files are rotated when they reach max_file_size bytes or are older
+    than rotate_interval seconds. Buffer is written when it reaches
+    buffer_size bytes or every flush_interval seconds, spans are dropped
+    if more than max_pending_size bytes wait for disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        prefix: str = "spans",
+        compress: bool = False,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        rotate_interval: float = DEFAULT_ROTATE_INTERVAL,
+        fsync: str = FSYNC_ROTATE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        max_pending_size: int = DEFAULT_MAX_PENDING_SIZE,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}")
+        os.makedirs(directory, exist_ok=True)
+        self._writer = _Writer(
+            directory, prefix, compress, max_file_size, rotate_interval, fsync
+        )
+        self._encoder = JsonEncoder()
+        self._flush_interval = flush_interval
+        self._buffer_size = buffer_size
+        self._max_pending_size = max_pending_size
+        self._high_water_mark = max_pending_size * 8 // 10
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        # bytes handed to writer thread and not written yet
+        self._writing_bytes = 0
+        # single worker keeps order of writes
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="aiozipkin-file"
+        )
+        self._loop = asyncio.get_event_loop()
+        self._timer = self._loop.call_later(flush_interval, self._on_timer)
+        self._closed = False
+        self._stats = TransportStats()
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    @property
+    def saturated(self) -> bool:
+        return self._buffer_bytes + self._writing_bytes >= self._high_water_mark
+
+    async def wait_for_capacity(self) -> None:
+        await self._capacity.wait()
+
+    def send(self, record: Record) -> None:
+        if self._closed:
+            self._stats.drop(DROP_UNAVAILABLE)
+            return
+        try:
+            data = self._encoder.encode_span(record) + b"\n"
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        if self._buffer_bytes + self._writing_bytes >= self._max_pending_size:
+            self._stats.drop(DROP_QUEUE_FULL)
+            return
+        self._buffer.append(data)
+        self._buffer_bytes += len(data)
+        if self._buffer_bytes >= self._buffer_size:
+            self._flush()
+        elif self.saturated:
+            # buffer is written right away, so waiters get capacity back
+            # without waiting for flush interval
+            self._flush()
+        if self.saturated:
+            self._capacity.clear()
+
+    def _on_timer(self) -> None:
+        self._flush()
+        self._timer = self._loop.call_later(self._flush_interval, self._on_timer)
+
+    def _flush(self) -> "asyncio.Future[None]":
+        # empty write still lets writer rotate file by time
+        buffer, self._buffer = self._buffer, []
+        size, self._buffer_bytes = self._buffer_bytes, 0
+        self._writing_bytes += size
+        data = b"".join(buffer)
+        fut = self._loop.run_in_executor(self._executor, self._writer.write, data)
+        fut.add_done_callback(functools.partial(self._on_written, size, len(buffer)))
+        return fut
+
+    def _on_written(self, size: int, count: int, fut: "asyncio.Future[None]") -> None:
+        self._writing_bytes -= size
+        if not self.saturated:
+            self._capacity.set()
+        exc = fut.exception()
+        if exc is not None:
+            logger.error("Can not write spans to file", exc_info=exc)
+            self._stats.drop(DROP_WRITE_ERROR, count)
+        else:
+            self._stats.uncompressed_bytes += size
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._capacity.set()
+        self._timer.cancel()
+        try:
+            await self._flush()
+        except OSError:
+            # already logged and counted
+            pass
+        await self._loop.run_in_executor(self._executor, self._writer.close)
+        self._executor.shutdown()
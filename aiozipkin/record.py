@@ -19,14 +19,14 @@ T = TypeVar("T", bound="Record")
 class Record:
     def __init__(self: T, context: TraceContext, local_endpoint: Endpoint) -> None:
         self._context = context
-        self._local_endpoint = _endpoint_asdict(local_endpoint)
+        self._local_endpoint = local_endpoint
         self._finished = False
 
         self._name = "unknown"
         self._kind: OptStr = None
         self._timestamp: OptInt = None
         self._duration: OptInt = None
-        self._remote_endpoint: Optional[Dict[str, Any]] = None
+        self._remote_endpoint: Optional[Endpoint] = None
         self._annotations: List[Annotation] = []
         self._tags: Dict[str, str] = {}
 
@@ -65,11 +65,14 @@ class Record:
         return self
 
     def remote_endpoint(self: T, endpoint: Endpoint) -> T:
-        self._remote_endpoint = _endpoint_asdict(endpoint)
+        self._remote_endpoint = endpoint
         return self
 
     def asdict(self) -> Dict[str, Any]:
         c = self._context
+        remote_endpoint = None
+        if self._remote_endpoint is not None:
+            remote_endpoint = _endpoint_asdict(self._remote_endpoint)
         rec = {
             "traceId": c.trace_id,
             "name": self._name,
@@ -80,8 +83,8 @@ class Record:
             "duration": self._duration,
             "debug": c.debug,
             "shared": c.shared,
-            "localEndpoint": self._local_endpoint,
-            "remoteEndpoint": self._remote_endpoint,
+            "localEndpoint": _endpoint_asdict(self._local_endpoint),
+            "remoteEndpoint": remote_endpoint,
             "annotations": [a._asdict() for a in self._annotations],
             "tags": self._tags,
         }
@@ -0,0 +1,270 @@
+"""Replays spans exported to files or left in disk spool to collector.
+
+Spans are read as a stream and queued to Transport, which batches,
+compresses and retries them, reading pauses while transport queue is
+full, so memory use does not depend on size of input. Progress is saved
+to checkpoint file after spans read so far are delivered, interrupted
+replay started again with same checkpoint continues from that point.
+If some spans are dropped, for example all attempts to send them failed,
+replay stops without saving progress, so they are sent again by next
+run.
+
+Run with::
+
+    python -m aiozipkin.replay --collector http://localhost:9411/api/v2/spans \\
+        --checkpoint replay.json spans/*.ndjson.gz
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from typing import IO, Any, Dict, List, Optional, Sequence, Union
+
+from .compression import GZIP
+from .encoding import JSON, get_encoder
+from .log import logger
+from .ndjson import GZIP_SUFFIX, SUFFIX
+from .spool import Spool
+from .transport import Transport
+
+
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+DEFAULT_REPORT_INTERVAL = 5.0
+# how often transport queue is checked while waiting for delivery
+_POLL_INTERVAL = 0.01
+
+
+def _open(path: str) -> Union[IO[bytes], gzip.GzipFile]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+class DeliveryError(Exception):
+    """Some of replayed spans were dropped by transport."""
+
+
+def find_files(paths: Sequence[str]) -> List[str]:
+    """Expands directories into sorted lists of span files."""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith((SUFFIX, GZIP_SUFFIX))
+            )
+        else:
+            files.append(path)
+    return files
+
+
+class Replayer:
+    """Queues encoded spans to transport, waiting while it is saturated,
+    with optional rate limit in spans per second and checkpoints.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        *,
+        rate: Optional[float] = None,
+        checkpoint: Optional[str] = None,
+        checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+        report_interval: float = DEFAULT_REPORT_INTERVAL,
+    ) -> None:
+        self._transport = transport
+        self._rate = rate
+        self._checkpoint = checkpoint
+        self._checkpoint_interval = checkpoint_interval
+        self._report_interval = report_interval
+        self._loop = asyncio.get_event_loop()
+        self._tokens = 0.0
+        self._tokens_time = self._loop.time()
+        self._started = self._loop.time()
+        self._reported = self._started
+        # spans dropped by transport before replay started
+        self._dropped = sum(transport.stats.dropped_spans.values())
+        self.read_spans = 0
+
+    async def _send(self, data: bytes, key: int = 0) -> None:
+        if self._rate is not None:
+            await self._take_token()
+        if self._transport.saturated:
+            await self._transport.wait_for_capacity()
+        # trace key keeps spans of trace on same collector shard
+        trace_id = f"{key:016x}" if key else None
+        self._transport.send_encoded(data, trace_id=trace_id)
+        self.read_spans += 1
+        if self._loop.time() - self._reported >= self._report_interval:
+            self.report()
+
+    async def _take_token(self) -> None:
+        rate = self._rate
+        assert rate is not None
+        now = self._loop.time()
+        # burst is limited to one second worth of spans
+        self._tokens = min(rate, self._tokens + (now - self._tokens_time) * rate)
+        self._tokens_time = now
+        if self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / rate)
+            self._tokens = 1.0
+            self._tokens_time = self._loop.time()
+        self._tokens -= 1
+
+    async def _drain(self) -> None:
+        # spans are delivered or dropped once queue is empty, progress
+        # can be saved only if nothing was dropped
+        while self._transport.queued_spans:
+            await asyncio.sleep(_POLL_INTERVAL)
+        dropped = sum(self._transport.stats.dropped_spans.values())
+        if dropped != self._dropped:
+            raise DeliveryError(f"{dropped - self._dropped} spans were dropped")
+
+    def report(self) -> None:
+        now = self._loop.time()
+        self._reported = now
+        elapsed = max(now - self._started, 1e-9)
+        dropped = sum(self._transport.stats.dropped_spans.values())
+        logger.info(
+            "Replayed %d spans, %.0f spans/s, %d queued, %d dropped",
+            self.read_spans,
+            self.read_spans / elapsed,
+            self._transport.queued_spans,
+            dropped,
+        )
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if self._checkpoint is None or not os.path.exists(self._checkpoint):
+            return {"done": [], "path": None, "offset": 0}
+        with open(self._checkpoint) as f:
+            data: Dict[str, Any] = json.load(f)
+        return data
+
+    async def _save_checkpoint(self, state: Dict[str, Any]) -> None:
+        await self._drain()
+        if self._checkpoint is None:
+            return
+        tmp = self._checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._checkpoint)
+
+    async def replay_files(self, paths: Sequence[str]) -> None:
+        """Replays NDJSON files, optionally gzip compressed."""
+        state = self._load_checkpoint()
+        for path in paths:
+            if path in state["done"]:
+                continue
+            offset = state["offset"] if state["path"] == path else 0
+            state["path"] = path
+            unsaved = 0
+            with _open(path) as f:
+                f.seek(offset)
+                for line in f:
+                    offset += len(line)
+                    line = line.strip()
+                    if not line:
+                        continue
+                    await self._send(line)
+                    unsaved += 1
+                    if unsaved >= self._checkpoint_interval:
+                        state["offset"] = offset
+                        await self._save_checkpoint(state)
+                        unsaved = 0
+            state["done"].append(path)
+            state["path"] = None
+            state["offset"] = 0
+            await self._save_checkpoint(state)
+
+    async def replay_spool(self, spool: Spool) -> None:
+        """Replays disk spool, spool cursor is used as checkpoint."""
+        while True:
+            chunk = spool.read(self._checkpoint_interval)
+            if chunk is None:
+                break
+            for span, key in zip(chunk.spans, chunk.keys):
+                await self._send(span, key)
+            await self._drain()
+            spool.commit(chunk.position)
+
+
+async def replay(args: argparse.Namespace) -> int:
+    transport = Transport(
+        args.collector,
+        send_interval=args.send_interval,
+        send_max_size=args.batch_size,
+        send_max_in_flight=args.concurrency,
+        send_attempt_count=args.attempts,
+        encoding=args.encoding,
+        compression=None if args.compression == "none" else args.compression,
+        # enough spans to keep every concurrent request busy
+        send_high_water_mark=args.batch_size * args.concurrency * 2,
+    )
+    replayer = Replayer(
+        transport,
+        rate=args.rate,
+        checkpoint=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        report_interval=args.report_interval,
+    )
+    try:
+        if args.spool is not None:
+            spool = Spool(args.spool, encoding=args.encoding)
+            try:
+                await replayer.replay_spool(spool)
+            finally:
+                spool.close()
+        await replayer.replay_files(find_files(args.paths))
+    except DeliveryError as exc:
+        logger.error("Replay stopped, progress is not saved: %s", exc)
+    finally:
+        await transport.close()
+    replayer.report()
+    return 1 if transport.stats.dropped_spans else 0
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m aiozipkin.replay",
+        description="Send exported or spooled spans to zipkin collector",
+    )
+    parser.add_argument("paths", nargs="*", help="NDJSON files or directories")
+    parser.add_argument("--collector", required=True, help="collector span URL")
+    parser.add_argument("--spool", help="disk spool directory")
+    parser.add_argument("--encoding", default=JSON, help="encoding of spool")
+    parser.add_argument("--compression", default=GZIP, help="gzip, zstd or none")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="max spans per second")
+    parser.add_argument("--attempts", type=int, default=10)
+    parser.add_argument("--send-interval", type=float, default=0.1)
+    parser.add_argument("--checkpoint", help="file to save progress to")
+    parser.add_argument(
+        "--checkpoint-interval", type=int, default=DEFAULT_CHECKPOINT_INTERVAL
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=DEFAULT_REPORT_INTERVAL
+    )
+    args = parser.parse_args(argv)
+    if not args.paths and args.spool is None:
+        parser.error("span files or --spool are required")
+    if args.paths and args.encoding != JSON:
+        parser.error("span files are always JSON encoded")
+    try:
+        get_encoder(args.encoding)
+    except ValueError as exc:
+        parser.error(str(exc))
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    raise SystemExit(asyncio.run(replay(args)))
+
+
+if __name__ == "__main__":
+    main()
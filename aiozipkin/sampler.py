@@ -1,7 +1,87 @@
 import abc
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
 from random import Random
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from .mypy_types import OptInt
+from .log import logger
+from .mypy_types import OptInt, OptStr
+from .transport import TransportABC
+
+
+DEFAULT_PRESSURE_INTERVAL = 1.0
+DEFAULT_PRESSURE_DECREASE = 0.5
+DEFAULT_PRESSURE_INCREASE = 0.05
+DEFAULT_PRESSURE_MIN_FACTOR = 0.01
+# trace ids are sampled by their low 64 bits
+_TRACE_ID_LIMIT = 2**64
+DEFAULT_REFILL_INTERVAL = 0.1
+DEFAULT_MAX_KEYS = 1000
+DEFAULT_RULE_SAMPLE_RATE = 0.01
+DEFAULT_RELOAD_INTERVAL = 5.0
+DEFAULT_ADAPTIVE_WINDOW = 60.0
+DEFAULT_ADAPTIVE_INTERVAL = 1.0
+DEFAULT_MIN_SAMPLE_RATE = 0.001
+
+
+class _PeriodicTimer:
+    """Calls callback every interval seconds on event loop.
+
+    Samplers are often created before event loop runs, so timer is
+    started on running loop by first call of ensure_started.
+    """
+
+    def __init__(self, interval: float, callback: Callable[[], None]) -> None:
+        self._interval = interval
+        self._callback = callback
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+
+    def ensure_started(self) -> None:
+        if self._handle is not None or self._closed:
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._handle = self._loop.call_later(self._interval, self._run)
+
+    def _run(self) -> None:
+        self._callback()
+        assert self._loop is not None
+        self._handle = self._loop.call_later(self._interval, self._run)
+
+    def close(self) -> None:
+        self._closed = True
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class SamplingAttributes(NamedTuple):
+    """Attributes of request that starts or joins trace, known before
+    span is created.
+    """
+
+    name: OptStr = None
+    method: OptStr = None
+    path: OptStr = None
+    # route template, like /users/{id}
+    route: OptStr = None
+    headers: Optional[Mapping[str, str]] = None
 
 
 class SamplerABC(abc.ABC):
@@ -10,6 +90,16 @@ class SamplerABC(abc.ABC):
         """Defines if given trace should be recorded for further actions."""
         pass
 
+    def should_sample(self, trace_id: str, attributes: SamplingAttributes) -> bool:
+        """Same as is_sampled, but also gets attributes of request, by
+        default they are ignored.
+        """
+        return self.is_sampled(trace_id)
+
+    def close(self) -> None:
+        """Releases resources like timers, called when tracer is closed."""
+        pass
+
 
 class Sampler(SamplerABC):
     def __init__(self, *, sample_rate: float = 1.0, seed: OptInt = None) -> None:
@@ -24,4 +114,476 @@ class Sampler(SamplerABC):
         return sampled
 
 
-# TODO: implement other types of sampler for example hash trace_id
+class PressureSampler(SamplerABC):
+    """Lowers sample rate of wrapped sampler while transport is under
+    pressure, for example collector answers 429 or 503 or transport queue
+    passes its high water mark.
+
+    Pressure is checked at most once per interval seconds, sampled traces
+    are kept with probability factor, which is multiplied by decrease
+    under pressure and grows back by increase otherwise.
+    """
+
+    def __init__(
+        self,
+        sampler: SamplerABC,
+        transport: TransportABC,
+        *,
+        interval: float = DEFAULT_PRESSURE_INTERVAL,
+        decrease: float = DEFAULT_PRESSURE_DECREASE,
+        increase: float = DEFAULT_PRESSURE_INCREASE,
+        min_factor: float = DEFAULT_PRESSURE_MIN_FACTOR,
+        seed: OptInt = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._sampler = sampler
+        self._transport = transport
+        self._interval = interval
+        self._decrease = decrease
+        self._increase = increase
+        self._min_factor = min_factor
+        self._rng = Random(seed)
+        self._clock = clock
+        self._checked_at = clock()
+        self._factor = 1.0
+
+    @property
+    def factor(self) -> float:
+        """Share of traces sampled by wrapped sampler that are kept."""
+        return self._factor
+
+    def is_sampled(self, trace_id: str) -> bool:
+        self._check()
+        return self._sampler.is_sampled(trace_id) and self._keep()
+
+    def should_sample(self, trace_id: str, attributes: SamplingAttributes) -> bool:
+        self._check()
+        return self._sampler.should_sample(trace_id, attributes) and self._keep()
+
+    def _check(self) -> None:
+        now = self._clock()
+        if now - self._checked_at >= self._interval:
+            self._checked_at = now
+            self._adjust(self._transport.under_pressure)
+
+    def _keep(self) -> bool:
+        return self._factor >= 1.0 or self._rng.random() < self._factor
+
+    def _adjust(self, pressure: bool) -> None:
+        factor = self._factor
+        if pressure:
+            factor = max(factor * self._decrease, self._min_factor)
+        else:
+            factor = min(factor + self._increase, 1.0)
+        if factor == self._factor:
+            return
+        if pressure:
+            logger.warning("Transport under pressure, sampling factor %.3f", factor)
+        else:
+            logger.info("Transport pressure relieved, sampling factor %.3f", factor)
+        self._factor = factor
+
+    def close(self) -> None:
+        self._sampler.close()
+
+
+def _threshold(sample_rate: float) -> int:
+    if not 0.0 <= sample_rate <= 1.0:
+        raise ValueError(f"Sample rate {sample_rate!r} is not in [0, 1]")
+    return round(sample_rate * _TRACE_ID_LIMIT)
+
+
+def _below(trace_id: str, threshold: int) -> bool:
+    try:
+        return int(trace_id[-16:], 16) < threshold
+    except ValueError:
+        # malformed id of incoming request
+        return False
+
+
+class HashSampler(SamplerABC):
+    """Samples trace if low 64 bits of its id are below threshold.
+
+    Decision depends only on trace id, so every process using the same
+    rule, in any language, keeps or drops the same traces. Rule is the
+    same as OpenTelemetry TraceIdRatioBased sampler uses.
+    """
+
+    def __init__(self, *, sample_rate: float = 1.0) -> None:
+        self._threshold = _threshold(sample_rate)
+        self._sample_rate = sample_rate
+
+    @property
+    def sample_rate(self) -> float:
+        return self._sample_rate
+
+    def is_sampled(self, trace_id: str) -> bool:
+        return _below(trace_id, self._threshold)
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens")
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        # burst is limited to one second worth of traces
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+
+    def refill(self, elapsed: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + self.rate * elapsed)
+
+    def take(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RateLimitingSampler(SamplerABC):
+    """Samples at most traces_per_second new traces, regardless of
+    traffic.
+
+    Traces with key, like route, tenant or span name, first use quota of
+    that key: explicit one from quotas or default_quota for other keys,
+    and only then shared limit, so rare keys are sampled even when
+    frequent ones exhaust shared limit. Buckets are refilled by event
+    loop timer every refill_interval seconds, so decision itself does not
+    read clock. Timer starts with first decision made on running loop.
+    """
+
+    def __init__(
+        self,
+        traces_per_second: float,
+        *,
+        quotas: Optional[Mapping[str, float]] = None,
+        default_quota: Optional[float] = None,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        refill_interval: float = DEFAULT_REFILL_INTERVAL,
+    ) -> None:
+        self._bucket = _Bucket(traces_per_second)
+        self._quotas: Dict[str, _Bucket] = {
+            key: _Bucket(rate) for key, rate in (quotas or {}).items()
+        }
+        self._default_quota = default_quota
+        # buckets of keys without explicit quota, least recently used first
+        self._keys: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._max_keys = max_keys
+        self._refilled_at = time.monotonic()
+        self._timer = _PeriodicTimer(refill_interval, self._refill)
+
+    def is_sampled(self, trace_id: str, key: OptStr = None) -> bool:
+        self._timer.ensure_started()
+        if key is not None:
+            bucket = self._key_bucket(key)
+            if bucket is not None and bucket.take():
+                return True
+        return self._bucket.take()
+
+    def should_sample(self, trace_id: str, attributes: SamplingAttributes) -> bool:
+        return self.is_sampled(trace_id, attributes.route or attributes.name)
+
+    def _key_bucket(self, key: str) -> Optional[_Bucket]:
+        bucket = self._quotas.get(key)
+        if bucket is not None or self._default_quota is None:
+            return bucket
+        bucket = self._keys.get(key)
+        if bucket is None:
+            bucket = self._keys[key] = _Bucket(self._default_quota)
+            if len(self._keys) > self._max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        return bucket
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._bucket.refill(elapsed)
+        for bucket in self._quotas.values():
+            bucket.refill(elapsed)
+        for bucket in self._keys.values():
+            bucket.refill(elapsed)
+
+    def close(self) -> None:
+        self._timer.close()
+
+
+Rule = Mapping[str, Any]
+# kind of rule (route or name), its value and HTTP method or None for any
+_RuleKey = Tuple[str, str, OptStr]
+_RULE_FIELDS = frozenset(("route", "name", "method", "sample_rate"))
+
+
+def _compile_rules(rules: Sequence[Rule]) -> Dict[_RuleKey, int]:
+    table: Dict[_RuleKey, int] = {}
+    for rule in rules:
+        if not isinstance(rule, Mapping):
+            raise ValueError(f"Rule {rule!r} is not a mapping")
+        unknown = set(rule) - _RULE_FIELDS
+        if unknown:
+            raise ValueError(f"Rule {rule!r} has unknown fields {sorted(unknown)}")
+        kinds = [kind for kind in ("route", "name") if kind in rule]
+        if len(kinds) != 1:
+            raise ValueError(f"Rule {rule!r} must have either route or name")
+        if "sample_rate" not in rule:
+            raise ValueError(f"Rule {rule!r} has no sample_rate")
+        kind = kinds[0]
+        method = rule.get("method")
+        key = (kind, str(rule[kind]), None if method is None else method.upper())
+        if key in table:
+            raise ValueError(f"Duplicate rule {rule!r}")
+        table[key] = _threshold(float(rule["sample_rate"]))
+    return table
+
+
+class RuleSampler(SamplerABC):
+    """Samples traces with rate of rule matching request route or span
+    name, optionally limited to HTTP method.
+
+    Rules are compiled into dict, so decision takes a few lookups however
+    many rules there are. Most specific rule wins: route with method,
+    route, span name with method, span name, then default_sample_rate.
+    Route is matched against route template, or path if request did not
+    match any route. Rates are applied to trace id the same way as in
+    HashSampler.
+
+    Rules file is JSON object::
+
+        {
+            "default_sample_rate": 0.01,
+            "rules": [
+                {"route": "/healthz", "sample_rate": 0},
+                {"route": "/checkout", "method": "POST", "sample_rate": 1}
+            ]
+        }
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule] = (),
+        *,
+        default_sample_rate: float = DEFAULT_RULE_SAMPLE_RATE,
+    ) -> None:
+        self._table: Dict[_RuleKey, int] = {}
+        self._default = 0
+        self.update(rules, default_sample_rate=default_sample_rate)
+        self._path: OptStr = None
+        self._file_state: Optional[Tuple[int, int]] = None
+        self._timer: Optional[_PeriodicTimer] = None
+
+    @classmethod
+    def from_file(
+        cls, path: str, *, reload_interval: Optional[float] = DEFAULT_RELOAD_INTERVAL
+    ) -> "RuleSampler":
+        """Loads rules from JSON file, file is checked for changes every
+        reload_interval seconds, if it is not None, once sampler is used on
+        running event loop.
+        """
+        sampler = cls()
+        sampler._path = path
+        sampler.reload()
+        if reload_interval is not None:
+            sampler._timer = _PeriodicTimer(reload_interval, sampler._on_timer)
+        return sampler
+
+    def update(
+        self,
+        rules: Sequence[Rule],
+        *,
+        default_sample_rate: float = DEFAULT_RULE_SAMPLE_RATE,
+    ) -> None:
+        """Replaces rules, old rules are kept if new ones are not valid."""
+        table = _compile_rules(rules)
+        default = _threshold(default_sample_rate)
+        self._table, self._default = table, default
+
+    def reload(self) -> bool:
+        """Loads rules file again if it was modified, returns True if
+        rules were replaced.
+        """
+        assert self._path is not None, "Sampler is not created from file"
+        stat = os.stat(self._path)
+        state = (stat.st_mtime_ns, stat.st_size)
+        if state == self._file_state:
+            return False
+        # broken file is reported once, not on every check
+        self._file_state = state
+        with open(self._path) as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("Sampling rules file must contain JSON object")
+        self.update(
+            config.get("rules", ()),
+            default_sample_rate=config.get(
+                "default_sample_rate", DEFAULT_RULE_SAMPLE_RATE
+            ),
+        )
+        return True
+
+    def _on_timer(self) -> None:
+        try:
+            if self.reload():
+                logger.info("Sampling rules reloaded from %s", self._path)
+        except (OSError, ValueError) as exc:
+            logger.error(
+                "Can not reload sampling rules from %s", self._path, exc_info=exc
+            )
+
+    def _rule_threshold(self, attributes: SamplingAttributes) -> int:
+        table = self._table
+        method = attributes.method
+        route = attributes.route or attributes.path
+        if route is not None:
+            if method is not None:
+                threshold = table.get(("route", route, method))
+                if threshold is not None:
+                    return threshold
+            threshold = table.get(("route", route, None))
+            if threshold is not None:
+                return threshold
+        name = attributes.name
+        if name is not None:
+            if method is not None:
+                threshold = table.get(("name", name, method))
+                if threshold is not None:
+                    return threshold
+            threshold = table.get(("name", name, None))
+            if threshold is not None:
+                return threshold
+        return self._default
+
+    def is_sampled(self, trace_id: str) -> bool:
+        if self._timer is not None:
+            self._timer.ensure_started()
+        return _below(trace_id, self._default)
+
+    def should_sample(self, trace_id: str, attributes: SamplingAttributes) -> bool:
+        if self._timer is not None:
+            self._timer.ensure_started()
+        return _below(trace_id, self._rule_threshold(attributes))
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.close()
+
+
+class _Operation:
+    __slots__ = ("counts", "count", "total", "sample_rate", "threshold")
+
+    def __init__(self, size: int, sample_rate: float) -> None:
+        # requests seen in every interval of window, ring buffer
+        self.counts = [0] * size
+        # requests seen in current interval
+        self.count = 0
+        self.total = 0
+        self.sample_rate = sample_rate
+        self.threshold = _threshold(sample_rate)
+
+
+class AdaptiveSampler(SamplerABC):
+    """Adjusts sample rate of every operation, route or span name, so
+    process samples about traces_per_second traces in total.
+
+    Request rates of operations are measured over sliding window of
+    seconds and sample rates are recomputed every interval seconds.
+    Target is split evenly between operations, share that rare
+    operations do not use goes to frequent ones, every operation keeps
+    at least min_sample_rate. Timer starts with first decision made on
+    running event loop. Processes do not coordinate, so target of
+    fleet should be divided by number of processes. Rates are applied to
+    trace id like HashSampler does.
+    """
+
+    def __init__(
+        self,
+        traces_per_second: float,
+        *,
+        min_sample_rate: float = DEFAULT_MIN_SAMPLE_RATE,
+        initial_sample_rate: float = DEFAULT_RULE_SAMPLE_RATE,
+        window: float = DEFAULT_ADAPTIVE_WINDOW,
+        interval: float = DEFAULT_ADAPTIVE_INTERVAL,
+        max_operations: int = DEFAULT_MAX_KEYS,
+    ) -> None:
+        _threshold(min_sample_rate)
+        _threshold(initial_sample_rate)
+        self._target = traces_per_second
+        self._min_sample_rate = min_sample_rate
+        self._initial_sample_rate = max(initial_sample_rate, min_sample_rate)
+        self._size = max(round(window / interval), 1)
+        self._interval = interval
+        self._max_operations = max_operations
+        self._operations: Dict[str, _Operation] = {}
+        # position of current interval in ring buffers and number of
+        # intervals measured so far, up to size of window
+        self._position = 0
+        self._filled = 0
+        self._timer = _PeriodicTimer(interval, self.update)
+
+    @property
+    def sample_rates(self) -> Dict[str, float]:
+        """Current sample rates of operations, empty string is key of
+        traces without operation.
+        """
+        return {key: op.sample_rate for key, op in self._operations.items()}
+
+    def is_sampled(self, trace_id: str) -> bool:
+        return self._sample("", trace_id)
+
+    def should_sample(self, trace_id: str, attributes: SamplingAttributes) -> bool:
+        return self._sample(attributes.route or attributes.name or "", trace_id)
+
+    def _sample(self, key: str, trace_id: str) -> bool:
+        self._timer.ensure_started()
+        op = self._operations.get(key)
+        if op is None:
+            if len(self._operations) >= self._max_operations:
+                # operations over limit share one sample rate
+                key = ""
+                op = self._operations.get(key)
+            if op is None:
+                op = _Operation(self._size, self._initial_sample_rate)
+                self._operations[key] = op
+        op.count += 1
+        return _below(trace_id, op.threshold)
+
+    def update(self) -> None:
+        """Closes current interval and recomputes sample rates, called by
+        timer every interval seconds.
+        """
+        position = self._position
+        self._position = (position + 1) % self._size
+        self._filled = min(self._filled + 1, self._size)
+        elapsed = self._filled * self._interval
+        rates: Dict[str, float] = {}
+        for key, op in list(self._operations.items()):
+            op.total += op.count - op.counts[position]
+            op.counts[position] = op.count
+            op.count = 0
+            if op.total == 0 and self._filled == self._size:
+                # no requests during whole window
+                del self._operations[key]
+            else:
+                rates[key] = op.total / elapsed
+
+        # operations from least to most frequent, each one gets even
+        # share of target left by previous ones
+        remaining = self._target
+        left = len(rates)
+        for key in sorted(rates, key=rates.__getitem__):
+            rate = rates[key]
+            share = remaining / left
+            left -= 1
+            if rate <= share:
+                sample_rate = 1.0
+                remaining -= rate
+            else:
+                sample_rate = max(share / rate, self._min_sample_rate)
+                remaining -= share
+            op = self._operations[key]
+            op.sample_rate = sample_rate
+            op.threshold = _threshold(sample_rate)
+
+    def close(self) -> None:
+        self._timer.close()
@@ -0,0 +1,70 @@
+"""Consistent hashing of traces to collector shards.
+
+Every span of trace is routed to the same collector, so collectors that
+process whole traces (tail sampling, trace aggregation) see all spans of
+trace. Each shard owns many virtual points on hash ring, so adding or
+removing shard moves only about 1/N of traces to other shards.
+"""
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+
+DEFAULT_REPLICAS = 128
+
+
+def _point(node: str, replica: int) -> int:
+    digest = hashlib.blake2b(f"{node}#{replica}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def trace_key(trace_id: str) -> int:
+    """Returns hash ring key of trace, low 64 bits of trace id are random
+    for both 64 and 128 bit ids, so they are used as is.
+    """
+    return int(trace_id[-16:], 16)
+
+
+class HashRing:
+    """Maps traces to nodes, node is usually collector URL."""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = DEFAULT_REPLICAS) -> None:
+        self._replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: Dict[str, List[int]] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            raise ValueError(f"Duplicate node: {node!r}")
+        self._nodes[node] = [_point(node, i) for i in range(self._replicas)]
+        self._rebuild()
+
+    def remove(self, node: str) -> None:
+        del self._nodes[node]
+        self._rebuild()
+
+    def get(self, trace_id: str) -> str:
+        return self.get_key(trace_key(trace_id))
+
+    def get_key(self, key: int) -> str:
+        """Returns node of trace with given trace_key."""
+        if not self._points:
+            raise LookupError("Hash ring is empty")
+        i = bisect.bisect(self._points, key)
+        if i == len(self._points):
+            i = 0
+        return self._owners[i]
+
+    def _rebuild(self) -> None:
+        ring: List[Tuple[int, str]] = sorted(
+            (point, node) for node, points in self._nodes.items() for point in points
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
@@ -0,0 +1,363 @@
+"""Multi-process span export through shared memory ring buffer.
+
+Worker processes (for example gunicorn workers) encode spans and write
+them into their own slot of shared memory segment, single exporter
+process reads all slots, batches spans and uploads them with regular
+Transport, so collector sees one connection and large batches per host.
+
+Each slot is single producer, single consumer ring: worker only moves
+write position, exporter only moves read position, so no locks are
+taken on hot path. Worker claims slot with flock() on slot lock file,
+lock is released by kernel when worker dies, so slot of crashed worker
+is reused by next one. Write position is advanced only after record is
+fully written, so partially written record of crashed worker is never
+read. When ring is full record is dropped and counted, worker never
+blocks.
+
+Requires Python 3.8 or newer and POSIX platform.
+
+Usage with gunicorn::
+
+    # gunicorn.conf.py
+    def on_starting(server):
+        RingBuffer.create("myapp", encoding="json")
+        multiprocessing.Process(
+            target=run_exporter,
+            args=("myapp", "http://localhost:9411/api/v2/spans"),
+            daemon=True,
+        ).start()
+
+    # in application factory, executed in worker
+    transport = ShmTransport("myapp")
+    tracer = await az.create_custom(endpoint, transport)
+"""
+import asyncio
+import fcntl
+import os
+import signal
+import struct
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, List, Optional, Tuple
+
+from .encoding import JSON, get_encoder
+from .log import logger
+from .record import Record
+from .transport import (
+    DROP_ENCODING_ERROR,
+    DROP_QUEUE_FULL,
+    DROP_TOO_LARGE,
+    Transport,
+    TransportABC,
+    TransportStats,
+    _priority,
+)
+
+
+DEFAULT_SLOTS = 64
+DEFAULT_SLOT_SIZE = 1024 * 1024
+DEFAULT_POLL_INTERVAL = 0.05
+
+_MAGIC = b"AZSR"
+_VERSION = 1
+# segment header: magic, version, slot count, slot data size, encoding
+_HEADER = struct.Struct("<4sIII16s")
+# slot header: write position, dropped count, read position; positions
+# grow forever and are taken modulo slot size, read position is kept on
+# separate cache line from fields written by worker
+_SLOT_HEADER_SIZE = 128
+_WRITE_POS = struct.Struct("<Q")
+_DROPPED = struct.Struct("<Q")
+_READ_POS = struct.Struct("<Q")
+_WRITE_POS_OFFSET = 0
+_DROPPED_OFFSET = 8
+_READ_POS_OFFSET = 64
+# record header: span length and priority, records are 8 byte aligned
+_RECORD = struct.Struct("<II")
+_WRAP = 0xFFFFFFFF
+_ALIGN = 8
+
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # resource tracker unlinks segment when process that created or
+    # attached it exits, but segment has to outlive any single worker or
+    # exporter process, so it is removed only by explicit unlink()
+    resource_tracker.unregister(
+        shm._name, "shared_memory"  # type: ignore[attr-defined]
+    )
+
+
+class RingBuffer:
+    """Shared memory segment split into fixed number of span rings."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool) -> None:
+        self._shm = shm
+        self._owner = owner
+        buf = shm.buf
+        assert buf is not None
+        self._buf = buf
+        magic, version, slots, slot_size, encoding = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            shm.close()
+            raise ValueError(f"{shm.name!r} is not aiozipkin ring buffer")
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        self.encoding: str = encoding.rstrip(b"\0").decode("ascii")
+
+    @classmethod
+    def create(
+        cls,
+        name: str,
+        *,
+        slots: int = DEFAULT_SLOTS,
+        slot_size: int = DEFAULT_SLOT_SIZE,
+        encoding: str = JSON,
+    ) -> "RingBuffer":
+        """Creates shared memory segment, should be called once per host
+        before workers start, segment is removed by unlink().
+        """
+        get_encoder(encoding)
+        slot_size = _aligned(slot_size)
+        size = _HEADER.size + slots * (_SLOT_HEADER_SIZE + slot_size)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _untrack(shm)
+        assert shm.buf is not None
+        _HEADER.pack_into(
+            shm.buf, 0, _MAGIC, _VERSION, slots, slot_size, encoding.encode("ascii")
+        )
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "RingBuffer":
+        shm = shared_memory.SharedMemory(name=name)
+        _untrack(shm)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, slot: int, data: bytes, priority: int = 0) -> bool:
+        """Writes span to slot ring, returns False if there is no room."""
+        buf = self._buf
+        base = self._slot_offset(slot)
+        size = self.slot_size
+        (write_pos,) = _WRITE_POS.unpack_from(buf, base + _WRITE_POS_OFFSET)
+        (read_pos,) = _READ_POS.unpack_from(buf, base + _READ_POS_OFFSET)
+
+        record_size = _aligned(_RECORD.size + len(data))
+        pos = write_pos % size
+        # record is never split across end of ring, tail is skipped instead
+        skip = size - pos if pos + record_size > size else 0
+        if skip + record_size > size - (write_pos - read_pos):
+            return False
+
+        data_start = base + _SLOT_HEADER_SIZE
+        if skip:
+            _RECORD.pack_into(buf, data_start + pos, _WRAP, 0)
+            pos = 0
+        start = data_start + pos + _RECORD.size
+        _RECORD.pack_into(buf, data_start + pos, len(data), priority)
+        buf[start : start + len(data)] = data
+        # position is published last, reader never sees half written record
+        new_pos = write_pos + skip + record_size
+        _WRITE_POS.pack_into(buf, base + _WRITE_POS_OFFSET, new_pos)
+        return True
+
+    def read(self, slot: int, max_spans: int) -> List[Tuple[bytes, int]]:
+        """Reads up to max_spans spans with priorities from slot ring."""
+        buf = self._buf
+        base = self._slot_offset(slot)
+        size = self.slot_size
+        (write_pos,) = _WRITE_POS.unpack_from(buf, base + _WRITE_POS_OFFSET)
+        (read_pos,) = _READ_POS.unpack_from(buf, base + _READ_POS_OFFSET)
+
+        spans: List[Tuple[bytes, int]] = []
+        data_start = base + _SLOT_HEADER_SIZE
+        while read_pos < write_pos and len(spans) < max_spans:
+            pos = read_pos % size
+            length, priority = _RECORD.unpack_from(buf, data_start + pos)
+            if length == _WRAP:
+                read_pos += size - pos
+                continue
+            start = data_start + pos + _RECORD.size
+            spans.append((bytes(buf[start : start + length]), priority))
+            read_pos += _aligned(_RECORD.size + length)
+        _READ_POS.pack_into(buf, base + _READ_POS_OFFSET, read_pos)
+        return spans
+
+    def add_dropped(self, slot: int, count: int = 1) -> None:
+        offset = self._slot_offset(slot) + _DROPPED_OFFSET
+        (dropped,) = _DROPPED.unpack_from(self._buf, offset)
+        _DROPPED.pack_into(self._buf, offset, dropped + count)
+
+    def dropped(self, slot: int) -> int:
+        offset = self._slot_offset(slot) + _DROPPED_OFFSET
+        (dropped,) = _DROPPED.unpack_from(self._buf, offset)
+        return int(dropped)
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Removes shared memory segment, only creator should call it."""
+        if self._owner:
+            # SharedMemory.unlink() unregisters segment from tracker
+            resource_tracker.register(
+                self._shm._name, "shared_memory"  # type: ignore[attr-defined]
+            )
+            self._shm.unlink()
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * (_SLOT_HEADER_SIZE + self.slot_size)
+
+
+def _lock_path(lock_dir: Optional[str], name: str, slot: int) -> str:
+    lock_dir = tempfile.gettempdir() if lock_dir is None else lock_dir
+    return os.path.join(lock_dir, f"aiozipkin-{name.lstrip('/')}-{slot}.lock")
+
+
+class ShmTransport(TransportABC):
+    """Transport for worker process, encodes spans and writes them into
+    claimed slot of shared memory ring buffer created with
+    RingBuffer.create().
+
+    Slot is claimed on creation, so transport should be created after
+    worker process is forked.
+    """
+
+    def __init__(self, name: str, *, lock_dir: Optional[str] = None) -> None:
+        self._ring = RingBuffer.attach(name)
+        self._encoder = get_encoder(self._ring.encoding)
+        self._stats = TransportStats()
+        self._lock_file: Optional[Any] = None
+        for slot in range(self._ring.slots):
+            f = open(_lock_path(lock_dir, name, slot), "a")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            self._lock_file = f
+            self.slot = slot
+            break
+        else:
+            self._ring.close()
+            raise RuntimeError(f"All {self._ring.slots} ring buffer slots are busy")
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    def send(self, record: Record) -> None:
+        try:
+            data = self._encoder.encode_span(record)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        if _aligned(_RECORD.size + len(data)) > self._ring.slot_size:
+            self._stats.drop(DROP_TOO_LARGE)
+            return
+        if not self._ring.write(self.slot, data, _priority(record)):
+            # counted in shared memory too, so exporter reports drops of
+            # all workers
+            self._stats.drop(DROP_QUEUE_FULL)
+            self._ring.add_dropped(self.slot)
+
+    async def close(self) -> None:
+        if self._lock_file is None:
+            return
+        self._ring.close()
+        self._lock_file.close()
+        self._lock_file = None
+
+
+class ShmExporter:
+    """Reads spans written by ShmTransport in all slots of ring buffer and
+    sends them with Transport.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        address: str,
+        *,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        **kwargs: Any,
+    ) -> None:
+        self._ring = RingBuffer.attach(name)
+        self._poll_interval = poll_interval
+        self._transport = Transport(address, encoding=self._ring.encoding, **kwargs)
+        self._dropped = [self._ring.dropped(i) for i in range(self._ring.slots)]
+        self._stopping = False
+        self._closing = False
+        self._stopper: Optional["asyncio.Future[None]"] = None
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._transport.stats
+
+    def poll(self, max_spans: int = 1000) -> int:
+        """Moves up to max_spans spans from each slot to transport, returns
+        number of spans read.
+        """
+        count = 0
+        transport = self._transport
+        for slot in range(self._ring.slots):
+            for data, priority in self._ring.read(slot, max_spans):
+                transport.send_encoded(data, priority)
+                count += 1
+            dropped = self._ring.dropped(slot)
+            if dropped != self._dropped[slot]:
+                self.stats.drop(DROP_QUEUE_FULL, dropped - self._dropped[slot])
+                self._dropped[slot] = dropped
+        return count
+
+    async def run(self) -> None:
+        """Polls ring buffer until stop() or close() is called."""
+        loop = asyncio.get_event_loop()
+        self._stopper = loop.create_future()
+        while not self._stopping:
+            if self.poll():
+                # workers keep writing, loop is still given to uploads and
+                # signal handlers
+                await asyncio.sleep(0)
+            else:
+                await asyncio.wait([self._stopper], timeout=self._poll_interval)
+
+    def stop(self) -> None:
+        self._stopping = True
+        if self._stopper is not None and not self._stopper.done():
+            self._stopper.set_result(None)
+
+    async def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self.stop()
+        # spans written after last poll are sent with final flush
+        while self.poll():
+            pass
+        await self._transport.close()
+        self._ring.close()
+
+
+def run_exporter(name: str, address: str, **kwargs: Any) -> None:
+    """Runs ShmExporter until SIGTERM or SIGINT, intended as target of
+    exporter process.
+    """
+
+    async def main() -> None:
+        exporter = ShmExporter(name, address, **kwargs)
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, exporter.stop)
+        await exporter.run()
+        await exporter.close()
+
+    asyncio.run(main())
@@ -0,0 +1,291 @@
+"""Disk spool for span batches that collector did not accept.
+
+Batches are appended to segment files in spool directory, each batch is
+one frame with length and crc32 checksum, so partially written frame
+left by crashed process is detected and truncated on next start. Read
+position is kept in separate cursor file, replaced atomically after
+batch is delivered, so delivery is at least once: batch sent right
+before crash may be sent again after restart. Segments that are fully
+delivered are removed.
+
+Every span is stored with low 64 bits of its trace id, so spans are
+routed to collector shards by current list of collectors when spool is
+drained, not by the one they were spooled with.
+
+Encoding of spans is recorded in spool directory, spool with spans of
+other encoding is not opened, since they can not be sent by transport
+with different content type.
+"""
+import mmap
+import os
+import struct
+import zlib
+from typing import BinaryIO, List, NamedTuple, Optional, Sequence, Tuple
+
+from .encoding import JSON
+from .log import logger
+from .mypy_types import OptInt
+
+
+DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+SEGMENT_SUFFIX = ".spool"
+CURSOR_NAME = "cursor"
+ENCODING_NAME = "encoding"
+
+# frame header: payload length and crc32 of payload
+_FRAME = struct.Struct("<II")
+# span length and trace key inside frame payload
+_SPAN = struct.Struct("<IQ")
+# cursor file: segment id and offset inside segment
+_CURSOR = struct.Struct("<QQ")
+
+Position = Tuple[int, int]
+
+
+class SpoolChunk(NamedTuple):
+    spans: List[bytes]
+    # position to pass to commit() once spans are delivered
+    position: Position
+    # low 64 bits of trace id of every span, see Transport sharding
+    keys: List[int]
+
+
+class Spool:
+    """Append only, segment rotated spool of span batches on local disk."""
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        max_size: int = DEFAULT_MAX_SIZE,
+        fsync: bool = False,
+        encoding: str = JSON,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self.encoding = encoding
+        self._segment_size = segment_size
+        self._max_size = max_size
+        self._fsync = fsync
+        self._writer: Optional[BinaryIO] = None
+        self._segments: List[int] = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        self._sizes = {i: os.path.getsize(self._path(i)) for i in self._segments}
+        self._recover()
+        self._cursor = self._load_cursor()
+        self._compact()
+        self._check_encoding()
+
+    @property
+    def size(self) -> int:
+        """Total size of spool segments in bytes."""
+        return sum(self._sizes.values())
+
+    @property
+    def is_empty(self) -> bool:
+        if not self._segments:
+            return True
+        segment, offset = self._cursor
+        last = self._segments[-1]
+        return segment >= last and offset >= self._sizes[last]
+
+    def append(
+        self, spans: List[bytes], keys: Optional[Sequence[int]] = None
+    ) -> bool:
+        """Writes batch of encoded spans with trace keys of spans to
+        spool, returns False if spool size limit is reached and batch was
+        not written.
+        """
+        if keys is None:
+            keys = [0] * len(spans)
+        payload = b"".join(_SPAN.pack(len(s), k) + s for s, k in zip(spans, keys))
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        if self.size + len(frame) > self._max_size:
+            return False
+
+        writer = self._get_writer()
+        writer.write(frame)
+        writer.flush()
+        if self._fsync:
+            os.fsync(writer.fileno())
+        self._sizes[self._segments[-1]] += len(frame)
+        return True
+
+    def read(
+        self, max_spans: int, max_bytes: OptInt = None
+    ) -> Optional[SpoolChunk]:
+        """Reads batches starting from cursor until max_spans spans or
+        max_bytes bytes are collected, at least one batch is returned if
+        spool is not empty.
+        """
+        segment, offset = self._cursor
+        for segment_id in self._segments:
+            if segment_id < segment:
+                continue
+            if segment_id > segment:
+                offset = 0
+            spans, keys, end = self._read_segment(
+                segment_id, offset, max_spans, max_bytes
+            )
+            if spans:
+                return SpoolChunk(spans, (segment_id, end), keys)
+        return None
+
+    def commit(self, position: Position) -> None:
+        """Marks everything before position as delivered."""
+        self._cursor = position
+        tmp_path = os.path.join(self._directory, CURSOR_NAME + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_CURSOR.pack(*position))
+            if self._fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self._directory, CURSOR_NAME))
+        self._compact()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _path(self, segment_id: int) -> str:
+        return os.path.join(self._directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+
+    def _get_writer(self) -> BinaryIO:
+        writer = self._writer
+        if writer is not None and self._sizes[self._segments[-1]] < self._segment_size:
+            return writer
+        if writer is not None:
+            writer.close()
+        # new segment is started on first write after process start as
+        # well, so tail of old segment is never appended to; ids are never
+        # reused, since cursor may point to removed segment
+        last = self._segments[-1] if self._segments else -1
+        segment_id = max(last, self._cursor[0]) + 1
+        self._segments.append(segment_id)
+        self._sizes[segment_id] = 0
+        self._writer = open(self._path(segment_id), "ab")
+        return self._writer
+
+    def _read_segment(
+        self, segment_id: int, offset: int, max_spans: int, max_bytes: OptInt
+    ) -> Tuple[List[bytes], List[int], int]:
+        spans: List[bytes] = []
+        keys: List[int] = []
+        size = self._sizes[segment_id]
+        if offset >= size:
+            return spans, keys, offset
+        start = offset
+        with open(self._path(segment_id), "rb") as f:
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as m:
+                while offset < size and len(spans) < max_spans:
+                    frame = _parse_frame(m, offset, size)
+                    if frame is None:
+                        # damaged frame, rest of segment can not be trusted
+                        logger.warning("Damaged spool segment %s", segment_id)
+                        return spans, keys, size
+                    frame_spans, frame_keys, end = frame
+                    if spans and max_bytes is not None and end - start > max_bytes:
+                        break
+                    spans.extend(frame_spans)
+                    keys.extend(frame_keys)
+                    offset = end
+        return spans, keys, offset
+
+    def _recover(self) -> None:
+        # only last segment may have partially written frame
+        if not self._segments:
+            return
+        segment_id = self._segments[-1]
+        size = self._sizes[segment_id]
+        offset = 0
+        if size:
+            with open(self._path(segment_id), "rb") as f:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as m:
+                    while offset < size:
+                        frame = _parse_frame(m, offset, size)
+                        if frame is None:
+                            break
+                        offset = frame[2]
+        if offset < size:
+            logger.warning("Truncating damaged spool segment %s", segment_id)
+            os.truncate(self._path(segment_id), offset)
+            self._sizes[segment_id] = offset
+
+    def _load_cursor(self) -> Position:
+        path = os.path.join(self._directory, CURSOR_NAME)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        if len(data) != _CURSOR.size:
+            return (self._segments[0], 0) if self._segments else (0, 0)
+        segment, offset = _CURSOR.unpack(data)
+        return segment, offset
+
+    def _check_encoding(self) -> None:
+        path = os.path.join(self._directory, ENCODING_NAME)
+        try:
+            with open(path) as f:
+                encoding = f.read().strip()
+        except FileNotFoundError:
+            encoding = ""
+        if encoding == self.encoding:
+            return
+        if encoding and not self.is_empty:
+            raise ValueError(
+                f"Spool {self._directory!r} contains spans encoded with "
+                f"{encoding!r}, not {self.encoding!r}"
+            )
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.encoding)
+        os.replace(tmp_path, path)
+
+    def _compact(self) -> None:
+        # removes segments that are fully delivered, segment with cursor
+        # is removed too once cursor reached its end and it is not written
+        segment, offset = self._cursor
+        for segment_id in list(self._segments):
+            if segment_id > segment:
+                break
+            is_writing = self._writer is not None and segment_id == self._segments[-1]
+            done = segment_id < segment or offset >= self._sizes[segment_id]
+            if not done or is_writing:
+                break
+            os.remove(self._path(segment_id))
+            self._segments.remove(segment_id)
+            del self._sizes[segment_id]
+
+
+def _parse_frame(
+    buf: mmap.mmap, offset: int, size: int
+) -> Optional[Tuple[List[bytes], List[int], int]]:
+    if offset + _FRAME.size > size:
+        return None
+    length, crc = _FRAME.unpack_from(buf, offset)
+    start = offset + _FRAME.size
+    end = start + length
+    if end > size:
+        return None
+    payload = buf[start:end]
+    if zlib.crc32(payload) != crc:
+        return None
+
+    spans = []
+    keys = []
+    pos = 0
+    while pos < length:
+        span_length, key = _SPAN.unpack_from(payload, pos)
+        pos += _SPAN.size
+        spans.append(payload[pos : pos + span_length])
+        keys.append(key)
+        pos += span_length
+    return spans, keys, end
@@ -0,0 +1,282 @@
+"""In memory trace store, transport for tests and local development.
+
+Finished spans are kept JSON encoded and grouped by trace, traces are
+indexed by service name, span name and duration bucket, so queries do not
+scan every stored span. When memory budget is exceeded, least recently
+written or read traces are evicted.
+
+Store can serve read endpoints of zipkin v2 HTTP API, so zipkin UI can
+be pointed to local process::
+
+    store = TraceStore()
+    tracer = await az.create_custom(endpoint, store)
+    app.add_subapp("/zipkin/", store.web_app())
+"""
+import heapq
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from aiohttp import web
+
+from .encoding import JsonEncoder
+from .log import logger
+from .mypy_types import OptInt, OptStr
+from .record import Record
+from .transport import DROP_ENCODING_ERROR, TransportABC, TransportStats
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_QUERY_LIMIT = 10
+# estimated memory used by span besides its encoded form
+_SPAN_OVERHEAD = 200
+
+
+class _SpanInfo(NamedTuple):
+    service: OptStr
+    name: str
+    duration: OptInt
+    timestamp: int
+
+
+class _Trace:
+    __slots__ = ("spans", "infos", "size", "timestamp", "keys")
+
+    def __init__(self) -> None:
+        self.spans: List[bytes] = []
+        self.infos: List[_SpanInfo] = []
+        self.size = 0
+        # latest span start, traces are returned most recent first
+        self.timestamp = 0
+        # index keys the trace is registered under
+        self.keys: Set[str] = set()
+
+
+def _duration_bucket(duration: int) -> int:
+    return duration.bit_length()
+
+
+class TraceStore(TransportABC):
+    """Transport that keeps finished spans in memory and answers queries
+    like zipkin server does.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self._max_bytes = max_bytes
+        self._encoder = JsonEncoder()
+        # traces in least recently used order
+        self._traces: "OrderedDict[str, _Trace]" = OrderedDict()
+        # index key to ordered set of trace ids, keys are prefixed with
+        # kind of index: s (service), n (span name), d (duration bucket)
+        self._index: Dict[str, Dict[str, None]] = {}
+        self._size = 0
+        self._stats = TransportStats()
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by stored spans in bytes."""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+    def send(self, record: Record) -> None:
+        try:
+            data = self._encoder.encode_span(record)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        trace_id = record._context.trace_id
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = _Trace()
+        else:
+            self._traces.move_to_end(trace_id)
+        info = _SpanInfo(
+            record._local_endpoint.serviceName,
+            record._name,
+            record._duration,
+            record._timestamp or 0,
+        )
+        size = len(data) + _SPAN_OVERHEAD
+        trace.spans.append(data)
+        trace.infos.append(info)
+        trace.size += size
+        trace.timestamp = max(trace.timestamp, info.timestamp)
+        self._size += size
+
+        keys = ["n" + info.name]
+        if info.service:
+            keys.append("s" + info.service)
+        if info.duration is not None:
+            keys.append("d%d" % _duration_bucket(info.duration))
+        for key in keys:
+            if key not in trace.keys:
+                trace.keys.add(key)
+                self._index.setdefault(key, {})[trace_id] = None
+
+        while self._size > self._max_bytes and len(self._traces) > 1:
+            self._evict(next(iter(self._traces)))
+
+    def _evict(self, trace_id: str) -> None:
+        trace = self._traces.pop(trace_id)
+        self._size -= trace.size
+        for key in trace.keys:
+            trace_ids = self._index[key]
+            del trace_ids[trace_id]
+            if not trace_ids:
+                del self._index[key]
+
+    def get_trace(self, trace_id: str) -> Optional[List[bytes]]:
+        """Returns JSON encoded spans of trace."""
+        trace_id = trace_id.lower()
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            return None
+        self._traces.move_to_end(trace_id)
+        return list(trace.spans)
+
+    def services(self) -> List[str]:
+        return sorted(key[1:] for key in self._index if key[0] == "s")
+
+    def span_names(self, service_name: str) -> List[str]:
+        names: Set[str] = set()
+        for trace_id in self._index.get("s" + service_name, ()):
+            trace = self._traces[trace_id]
+            names.update(i.name for i in trace.infos if i.service == service_name)
+        return sorted(names)
+
+    def find_traces(
+        self,
+        service_name: OptStr = None,
+        span_name: OptStr = None,
+        min_duration: OptInt = None,
+        max_duration: OptInt = None,
+        end_ts: OptInt = None,
+        lookback: OptInt = None,
+        limit: int = DEFAULT_QUERY_LIMIT,
+    ) -> List[List[bytes]]:
+        """Returns JSON encoded spans of most recent traces with at least
+        one span matching all criteria, durations and timestamps are in
+        microseconds.
+        """
+        candidates = self._candidates(
+            service_name, span_name, min_duration, max_duration
+        )
+        start_ts = None
+        if end_ts is not None and lookback is not None:
+            start_ts = end_ts - lookback
+
+        def matches(info: _SpanInfo) -> bool:
+            if service_name is not None and info.service != service_name:
+                return False
+            if span_name is not None and info.name != span_name:
+                return False
+            if min_duration is not None or max_duration is not None:
+                if info.duration is None:
+                    return False
+                if min_duration is not None and info.duration < min_duration:
+                    return False
+                if max_duration is not None and info.duration > max_duration:
+                    return False
+            if end_ts is not None and info.timestamp > end_ts:
+                return False
+            return start_ts is None or info.timestamp >= start_ts
+
+        found = (
+            self._traces[trace_id]
+            for trace_id in candidates
+            if any(matches(i) for i in self._traces[trace_id].infos)
+        )
+        traces = heapq.nlargest(limit, found, key=lambda t: t.timestamp)
+        return [list(t.spans) for t in traces]
+
+    def _candidates(
+        self,
+        service_name: OptStr,
+        span_name: OptStr,
+        min_duration: OptInt,
+        max_duration: OptInt,
+    ) -> List[str]:
+        # smallest index that applies to query is scanned, rest of
+        # criteria are checked against spans of candidate traces
+        sets: List[Dict[str, None]] = []
+        if service_name is not None:
+            sets.append(self._index.get("s" + service_name, {}))
+        if span_name is not None:
+            sets.append(self._index.get("n" + span_name, {}))
+        if min_duration is not None or max_duration is not None:
+            low = _duration_bucket(min_duration or 0)
+            high = _duration_bucket(max_duration) if max_duration is not None else 64
+            trace_ids: Dict[str, None] = {}
+            for bucket in range(low, high + 1):
+                trace_ids.update(self._index.get("d%d" % bucket, {}))
+            sets.append(trace_ids)
+        if not sets:
+            return list(self._traces)
+        sets.sort(key=len)
+        return list(sets[0])
+
+    def web_app(self) -> web.Application:
+        """Returns aiohttp application serving read endpoints of zipkin v2
+        API, to be mounted with add_subapp.
+        """
+        app = web.Application()
+        app.router.add_get("/api/v2/trace/{trace_id}", self._handle_trace)
+        app.router.add_get("/api/v2/traces", self._handle_traces)
+        app.router.add_get("/api/v2/services", self._handle_services)
+        app.router.add_get("/api/v2/spans", self._handle_spans)
+        return app
+
+    async def _handle_trace(self, request: web.Request) -> web.Response:
+        spans = self.get_trace(request.match_info["trace_id"])
+        if spans is None:
+            raise web.HTTPNotFound()
+        return _json_response(b"[" + b",".join(spans) + b"]")
+
+    async def _handle_traces(self, request: web.Request) -> web.Response:
+        query = request.query
+        try:
+            span_name = query.get("spanName")
+            end_ts = _int_param(query.get("endTs"))
+            lookback = _int_param(query.get("lookback"))
+            traces = self.find_traces(
+                service_name=query.get("serviceName") or None,
+                span_name=None if span_name in (None, "", "all") else span_name,
+                min_duration=_int_param(query.get("minDuration")),
+                max_duration=_int_param(query.get("maxDuration")),
+                # zipkin API uses milliseconds for endTs and lookback
+                end_ts=None if end_ts is None else end_ts * 1000,
+                lookback=None if lookback is None else lookback * 1000,
+                limit=_int_param(query.get("limit")) or DEFAULT_QUERY_LIMIT,
+            )
+        except ValueError as exc:
+            raise web.HTTPBadRequest(text=str(exc))
+        body = b"[" + b",".join(b"[" + b",".join(t) + b"]" for t in traces) + b"]"
+        return _json_response(body)
+
+    async def _handle_services(self, request: web.Request) -> web.Response:
+        return web.json_response(self.services())
+
+    async def _handle_spans(self, request: web.Request) -> web.Response:
+        service_name = request.query.get("serviceName")
+        if not service_name:
+            raise web.HTTPBadRequest(text="serviceName is required")
+        return web.json_response(self.span_names(service_name))
+
+    async def close(self) -> None:
+        pass
+
+
+def _int_param(value: OptStr) -> OptInt:
+    if not value:
+        return None
+    return int(value)
+
+
+def _json_response(body: bytes) -> web.Response:
+    return web.Response(body=body, content_type="application/json")
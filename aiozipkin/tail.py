@@ -0,0 +1,152 @@
+"""Tail based sampling of traces rooted in this process.
+
+Traces that head sampler did not sample are still recorded, finished
+spans are kept in memory until local root span of trace finishes, then
+whole trace is sent if it is interesting: has span with error tag, root
+span took at least min_duration microseconds or custom predicate accepts
+its spans. Other traces are freed right away::
+
+    tail_sampler = TailSampler(min_duration=500000)
+    tracer = await az.create_custom(
+        endpoint, transport, sampler, tail_sampler=tail_sampler
+    )
+
+Decision is local, downstream services get not sampled flag, so kept
+traces contain only spans of this process.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence
+
+from .constants import ERROR
+from .log import logger
+from .mypy_types import OptInt
+from .record import Record
+
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_TIMEOUT = 60.0
+# estimated memory used by record besides its strings
+_RECORD_OVERHEAD = 500
+
+TailPredicate = Callable[[Sequence[Record]], bool]
+
+
+def _record_size(record: Record) -> int:
+    size = _RECORD_OVERHEAD + len(record._name)
+    for key, value in record._tags.items():
+        size += len(key) + len(value)
+    for annotation in record._annotations:
+        size += len(annotation.value)
+    return size
+
+
+class _Buffer:
+    __slots__ = ("root_id", "records", "size", "created")
+
+    def __init__(self, root_id: str, created: float) -> None:
+        self.root_id = root_id
+        self.records: List[Record] = []
+        self.size = 0
+        self.created = created
+
+
+class TailSampler:
+    """Buffers finished spans per trace and decides to keep or drop trace
+    when its local root span finishes.
+
+    Buffers use at most max_bytes, estimated, oldest traces are dropped
+    when budget is exceeded or when their root span does not finish in
+    timeout seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        keep_errors: bool = True,
+        min_duration: OptInt = None,
+        predicates: Sequence[TailPredicate] = (),
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float = DEFAULT_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._keep_errors = keep_errors
+        self._min_duration = min_duration
+        self._predicates = list(predicates)
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self._clock = clock
+        # buffers of undecided traces, oldest first
+        self._buffers: "OrderedDict[str, _Buffer]" = OrderedDict()
+        self._size = 0
+        self.kept_traces = 0
+        self.dropped_traces = 0
+        self.evicted_traces = 0
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by buffered spans in bytes."""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def start(self, trace_id: str, root_id: str) -> None:
+        """Starts buffering trace, root_id is id of its local root span."""
+        if trace_id not in self._buffers:
+            self._buffers[trace_id] = _Buffer(root_id, self._clock())
+        self._evict()
+
+    def is_buffered(self, trace_id: str) -> bool:
+        return trace_id in self._buffers
+
+    def add(self, record: Record) -> Optional[List[Record]]:
+        """Buffers finished record, returns records of trace if it is
+        decided to be kept.
+        """
+        trace_id = record.context.trace_id
+        buf = self._buffers.get(trace_id)
+        if buf is None:
+            # trace was already decided, evicted or expired
+            return None
+        size = _record_size(record)
+        buf.records.append(record)
+        buf.size += size
+        self._size += size
+        if record.context.span_id != buf.root_id:
+            self._evict()
+            return None
+
+        del self._buffers[trace_id]
+        self._size -= buf.size
+        if self._keep(buf.records, record):
+            self.kept_traces += 1
+            return buf.records
+        self.dropped_traces += 1
+        return None
+
+    def _keep(self, records: List[Record], root: Record) -> bool:
+        if self._keep_errors and any(ERROR in r._tags for r in records):
+            return True
+        duration = root._duration
+        if self._min_duration is not None and duration is not None:
+            if duration >= self._min_duration:
+                return True
+        for predicate in self._predicates:
+            try:
+                if predicate(records):
+                    return True
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error("Tail sampling predicate failed", exc_info=exc)
+        return False
+
+    def _evict(self) -> None:
+        now = self._clock()
+        while self._buffers:
+            trace_id, buf = next(iter(self._buffers.items()))
+            expired = now - buf.created >= self._timeout
+            if not expired and self._size <= self._max_bytes:
+                break
+            del self._buffers[trace_id]
+            self._size -= buf.size
+            self.evicted_traces += 1
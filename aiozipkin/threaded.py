@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Optional
+
+from .log import logger
+from .record import Record
+from .transport import DROP_QUEUE_FULL, Transport, TransportABC, TransportStats
+
+
+DEFAULT_HANDOFF_INTERVAL = 0.05
+DEFAULT_MAX_PENDING = 10**5
+
+
+class ThreadedTransport(TransportABC):
+    """Transport that encodes and uploads spans on dedicated thread with
+    its own event loop and ClientSession, so application event loop only
+    appends finished records to a deque.
+
+    Keyword arguments, except handoff_interval and max_pending, are
+    passed to Transport created inside sender thread.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        handoff_interval: float = DEFAULT_HANDOFF_INTERVAL,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        **kwargs: Any,
+    ) -> None:
+        self._address = address
+        self._kwargs = kwargs
+        self._handoff_interval = handoff_interval
+        self._max_pending = max_pending
+        # deque append and popleft are atomic, so no lock is required to
+        # pass records between threads
+        self._records: Deque[Record] = deque()
+        # records dropped on handoff, counted apart from stats of sender
+        # thread transport, so threads never update same counters
+        self._dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopper: Optional["asyncio.Future[None]"] = None
+        self._closing = False
+        self._transport: Optional[Transport] = None
+        self._error: Optional[BaseException] = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="aiozipkin-sender", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise self._error
+
+    @property
+    def stats(self) -> TransportStats:
+        """Snapshot of transport counters, including handoff drops."""
+        assert self._transport is not None
+        inner = self._transport.stats
+        stats = TransportStats()
+        stats.uncompressed_bytes = inner.uncompressed_bytes
+        stats.compressed_bytes = inner.compressed_bytes
+        stats.dropped_spans = dict(inner.dropped_spans)
+        stats.spooled_spans = inner.spooled_spans
+        stats.endpoints = dict(inner.endpoints)
+        if self._dropped:
+            stats.drop(DROP_QUEUE_FULL, self._dropped)
+        return stats
+
+    @property
+    def saturated(self) -> bool:
+        if len(self._records) >= self._max_pending:
+            return True
+        transport = self._transport
+        return transport is not None and transport.saturated
+
+    async def wait_for_capacity(self) -> None:
+        # state is owned by sender thread, so it is polled
+        while self.saturated and not self._closing:
+            await asyncio.sleep(self._handoff_interval)
+
+    def send(self, record: Record) -> None:
+        if len(self._records) >= self._max_pending:
+            self._dropped += 1
+            return
+        self._records.append(record)
+
+    async def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        if self._loop is not None and self._stopper is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stopper.set_result, None)
+            except RuntimeError:
+                # sender thread already finished and closed its loop
+                pass
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._thread.join)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._stopper = loop.create_future()
+        try:
+            loop.run_until_complete(self._sender())
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Span sender thread failed", exc_info=exc)
+        finally:
+            self._started.set()
+            loop.close()
+
+    async def _sender(self) -> None:
+        try:
+            self._transport = Transport(self._address, **self._kwargs)
+        except BaseException as exc:
+            self._error = exc
+            return
+        self._started.set()
+
+        transport = self._transport
+        records = self._records
+        stopper = self._stopper
+        assert stopper is not None
+        while not stopper.done():
+            await asyncio.wait([stopper], timeout=self._handoff_interval)
+            while records:
+                transport.send(records.popleft())
+
+        while records:
+            transport.send(records.popleft())
+        await transport.close()
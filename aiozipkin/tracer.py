@@ -7,15 +7,19 @@ from typing import (  # noqa
     Dict,
     List,
     Optional,
+    Sequence,
     Type,
+    Union,
 )
 
 from .context_managers import _ContextManager
+from .encoding import JSON
 from .helpers import Endpoint, TraceContext
-from .mypy_types import OptBool, OptLoop
+from .mypy_types import OptBool, OptLoop, OptStr
 from .record import Record
-from .sampler import Sampler, SamplerABC
+from .sampler import Sampler, SamplerABC, SamplingAttributes
 from .span import NoopSpan, Span, SpanAbc
+from .tail import TailSampler
 from .transport import StubTransport, Transport, TransportABC
 from .utils import generate_random_64bit_string, generate_random_128bit_string
 
@@ -38,6 +42,7 @@ class Tracer(_Base):
         sampler: SamplerABC,
         local_endpoint: Endpoint,
         ignored_exceptions: Optional[List[Type[Exception]]] = None,
+        tail_sampler: Optional[TailSampler] = None,
     ) -> None:
         super().__init__()
         self._records: Dict[TraceContext, Record] = {}
@@ -45,43 +50,74 @@ class Tracer(_Base):
         self._sampler = sampler
         self._local_endpoint = local_endpoint
         self._ignored_exceptions = ignored_exceptions or []
+        self._tail_sampler = tail_sampler
 
-    def new_trace(self, sampled: OptBool = None, debug: bool = False) -> SpanAbc:
-        context = self._next_context(None, sampled=sampled, debug=debug)
+    def new_trace(
+        self,
+        sampled: OptBool = None,
+        debug: bool = False,
+        attributes: Optional[SamplingAttributes] = None,
+    ) -> SpanAbc:
+        context = self._next_context(
+            None, sampled=sampled, debug=debug, attributes=attributes
+        )
         return self.to_span(context)
 
-    def join_span(self, context: TraceContext) -> SpanAbc:
+    def join_span(
+        self, context: TraceContext, attributes: Optional[SamplingAttributes] = None
+    ) -> SpanAbc:
         new_context = context
         if context.sampled is None:
-            sampled = self._sampler.is_sampled(context.trace_id)
+            sampled = self._is_sampled(context.trace_id, attributes)
             new_context = new_context._replace(sampled=sampled)
+            if not sampled:
+                self._start_tail(new_context)
         else:
             new_context = new_context._replace(shared=True)
         return self.to_span(new_context)
 
     def new_child(self, context: TraceContext) -> SpanAbc:
         new_context = self._next_context(context)
-        if not context.sampled:
+        if not self._is_recorded(context):
             return NoopSpan(self, new_context, self._ignored_exceptions)
         return self.to_span(new_context)
 
     def to_span(self, context: TraceContext) -> SpanAbc:
-        if not context.sampled:
+        if not self._is_recorded(context):
             return NoopSpan(self, context, self._ignored_exceptions)
 
         record = Record(context, self._local_endpoint)
         self._records[context] = record
         return Span(self, context, record, self._ignored_exceptions)
 
+    def _is_recorded(self, context: TraceContext) -> bool:
+        if context.sampled:
+            return True
+        tail = self._tail_sampler
+        return tail is not None and tail.is_buffered(context.trace_id)
+
+    def _start_tail(self, context: TraceContext) -> None:
+        # trace not sampled by head sampler is recorded and decided
+        # when its local root span finishes
+        if self._tail_sampler is not None:
+            self._tail_sampler.start(context.trace_id, context.span_id)
+
     def _send(self, record: Record) -> None:
         self._records.pop(record.context, None)
-        self._transport.send(record)
+        if record.context.sampled:
+            self._transport.send(record)
+            return
+        if self._tail_sampler is None:
+            return
+        for kept in self._tail_sampler.add(record) or ():
+            self._transport.send(kept)
 
     def _next_context(
         self,
         context: Optional[TraceContext] = None,
         sampled: OptBool = None,
         debug: bool = False,
+        attributes: Optional[SamplingAttributes] = None,
     ) -> TraceContext:
         span_id = generate_random_64bit_string()
         if context is not None:
@@ -91,8 +127,10 @@ class Tracer(_Base):
             return new_context
 
         trace_id = generate_random_128bit_string()
+        tail = False
         if sampled is None:
-            sampled = self._sampler.is_sampled(trace_id)
+            sampled = self._is_sampled(trace_id, attributes)
+            tail = not sampled
 
         new_context = TraceContext(
             trace_id=trace_id,
@@ -102,9 +140,26 @@ class Tracer(_Base):
             debug=debug,
             shared=False,
         )
+        if tail:
+            self._start_tail(new_context)
         return new_context
 
+    def _is_sampled(
+        self, trace_id: str, attributes: Optional[SamplingAttributes]
+    ) -> bool:
+        if attributes is None:
+            return self._sampler.is_sampled(trace_id)
+        return self._sampler.should_sample(trace_id, attributes)
+
+    @property
+    def saturated(self) -> bool:
+        """True if transport can not keep up with finished spans, samplers
+        and applications may shed tracing then.
+        """
+        return self._transport.saturated
+
     async def close(self) -> None:
+        self._sampler.close()
         await self._transport.close()
 
     async def __aenter__(self) -> "Tracer":
@@ -115,13 +170,15 @@ class Tracer(_Base):
 
 
 def create(
-    zipkin_address: str,
+    zipkin_address: Union[str, Sequence[str]],
     local_endpoint: Endpoint,
     *,
     sample_rate: float = 0.01,
     send_interval: float = 5,
     loop: OptLoop = None,
-    ignored_exceptions: Optional[List[Type[Exception]]] = None
+    ignored_exceptions: Optional[List[Type[Exception]]] = None,
+    encoding: str = JSON,
+    compression: OptStr = None
 ) -> _ContextManager[Tracer]:
     if loop is not None:
         warnings.warn(
@@ -130,7 +187,12 @@ def create(
 
     async def build_tracer() -> Tracer:
         sampler = Sampler(sample_rate=sample_rate)
-        transport = Transport(zipkin_address, send_interval=send_interval)
+        transport = Transport(
+            zipkin_address,
+            send_interval=send_interval,
+            encoding=encoding,
+            compression=compression,
+        )
         return Tracer(transport, sampler, local_endpoint, ignored_exceptions)
 
     result = _ContextManager(build_tracer())
@@ -142,13 +204,14 @@ def create_custom(
     transport: Optional[TransportABC] = None,
     sampler: Optional[SamplerABC] = None,
     ignored_exceptions: Optional[List[Type[Exception]]] = None,
+    tail_sampler: Optional[TailSampler] = None,
 ) -> _ContextManager[Tracer]:
     t = transport or StubTransport()
     sample_rate = 1  # sample everything
     s = sampler or Sampler(sample_rate=sample_rate)
 
     async def build_tracer() -> Tracer:
-        return Tracer(t, s, local_endpoint, ignored_exceptions)
+        return Tracer(t, s, local_endpoint, ignored_exceptions, tail_sampler)
 
     result = _ContextManager(build_tracer())
     return result
@@ -1,24 +1,99 @@
 import abc
 import asyncio
+import heapq
+import itertools
+import random
+import time
 import warnings
 from collections import deque
-from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from email.utils import parsedate_to_datetime
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import aiohttp
 from aiohttp.client_exceptions import ClientError
 from yarl import URL
 
+from .compression import get_compressor
+from .constants import ERROR
+from .encoding import JSON, get_encoder
 from .log import logger
-from .mypy_types import OptLoop
+from .mypy_types import OptInt, OptLoop, OptStr, OptTs
 from .record import Record
+from .sharding import HashRing, trace_key
+from .spool import Spool
 
 
 DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=5 * 60)
 BATCHES_MAX_COUNT = 10**4
+DEFAULT_BACKOFF = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+DEFAULT_CIRCUIT_THRESHOLD = 5
+DEFAULT_CIRCUIT_COOLDOWN = 30.0
+HTTP_PAYLOAD_TOO_LARGE = 413
+# collector asks to slow down, retry honors Retry-After header if present
+HTTP_THROTTLE_CODES = (429, 503)
 
-DataList = List[Dict[str, Any]]
-SndBatches = Deque[Tuple[int, DataList]]
-SendDataCoro = Callable[[DataList], Awaitable[bool]]
+# what to drop when queue of spans waiting for upload is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DROP_LOWEST_PRIORITY = "drop_lowest_priority"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, DROP_LOWEST_PRIORITY)
+
+# reasons of dropped spans
+DROP_QUEUE_FULL = "queue_full"
+DROP_ATTEMPTS_EXHAUSTED = "attempts_exhausted"
+DROP_TOO_LARGE = "too_large"
+DROP_ENCODING_ERROR = "encoding_error"
+DROP_SHUTDOWN = "shutdown"
+DROP_SPOOL_FULL = "spool_full"
+DROP_UNAVAILABLE = "unavailable"
+DROP_REJECTED = "rejected"
+DROP_WRITE_ERROR = "write_error"
+# spans lost for these reasons are written to spool if transport has one
+SPOOLED_DROP_REASONS = (DROP_QUEUE_FULL, DROP_ATTEMPTS_EXHAUSTED, DROP_SHUTDOWN)
+DEFAULT_SPOOL_DRAIN_RATE = 1000.0
+DEFAULT_EJECT_THRESHOLD = 3
+DEFAULT_EJECT_COOLDOWN = 10.0
+# weight of latest request in moving averages of endpoint health
+HEALTH_DECAY = 0.2
+# request bodies larger than this are compressed in executor, so event
+# loop is not blocked
+COMPRESS_IN_EXECUTOR_SIZE = 64 * 1024
+
+
+class SendResult(NamedTuple):
+    ok: bool
+    status: OptInt = None
+    retry_after: OptTs = None
+    # batch can not be delivered and should not be retried
+    drop_reason: OptStr = None
+
+
+Batch = List[bytes]
+RetryBatches = List[Tuple[float, int, "_PendingBatch"]]
+# batches that may be evicted, by creation order
+VictimHeap = List[Tuple[int, int, "_PendingBatch"]]
+# dead entries of queues are removed once there are this many of them
+# besides as many as there are queued batches
+_COMPACT_SLACK = 64
+# coroutine that sends batch of spans that belong to given shard
+SendDataCoro = Callable[[Batch, int], Awaitable[SendResult]]
+# maps trace key of span to its shard
+ShardOf = Callable[[int], int]
 
 
 class TransportABC(abc.ABC):
@@ -27,6 +102,33 @@ class TransportABC(abc.ABC):
         """Sends data to zipkin collector."""
         pass
 
+    @property
+    def saturated(self) -> bool:
+        """True if transport holds more spans than it can export soon,
+        new spans may be dropped then.
+        """
+        return False
+
+    async def wait_for_capacity(self) -> None:
+        """Waits until transport is not saturated."""
+        pass
+
+    @property
+    def under_pressure(self) -> bool:
+        """True if transport is saturated or collector asks to slow down,
+        samplers may lower sample rate then.
+        """
+        return self.saturated
+
+    async def send_many(self, records: Iterable[Record]) -> None:
+        """Sends records, waits for capacity whenever transport becomes
+        saturated instead of letting it drop spans.
+        """
+        for record in records:
+            if self.saturated:
+                await self.wait_for_capacity()
+            self.send(record)
+
     @abc.abstractmethod
     async def close(self) -> None:  # pragma: no cover
         """Performs additional cleanup actions if required."""
@@ -47,6 +149,236 @@ class StubTransport(TransportABC):
         pass
 
 
+def _parse_retry_after(value: OptStr) -> OptTs:
+    # Retry-After is either number of seconds or HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def _priority(record: Record) -> int:
+    # debug and failed spans are kept when queue overflows with
+    # DROP_LOWEST_PRIORITY policy
+    if record._context.debug:
+        return 2
+    if ERROR in record._tags:
+        return 1
+    return 0
+
+
+class TransportStats:
+    """Counters of data exported by transport."""
+
+    __slots__ = (
+        "uncompressed_bytes",
+        "compressed_bytes",
+        "dropped_spans",
+        "spooled_spans",
+        "endpoints",
+    )
+
+    def __init__(self) -> None:
+        # size of request bodies before and after compression, equal if
+        # compression is disabled
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        # number of lost spans by reason
+        self.dropped_spans: Dict[str, int] = {}
+        # number of spans written to disk spool instead of being dropped
+        self.spooled_spans = 0
+        # health and counters of each collector endpoint by URL
+        self.endpoints: Dict[str, EndpointStats] = {}
+
+    def drop(self, reason: str, count: int = 1) -> None:
+        self.dropped_spans[reason] = self.dropped_spans.get(reason, 0) + count
+
+
+class CircuitBreaker:
+    """Stops upload attempts for cool-down period after number of
+    consecutive failures, then lets single probe request through.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float) -> None:
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until: OptTs = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_until is not None
+
+    def allow(self, now: float) -> bool:
+        if self._open_until is None:
+            return True
+        if self._probing or now < self._open_until:
+            return False
+        self._probing = True
+        return True
+
+    def cancel_probe(self) -> None:
+        # probe request was not sent, next one is let through instead
+        self._probing = False
+
+    def success(self) -> None:
+        if self._open_until is not None:
+            logger.info("Zipkin collector recovered, resuming span export")
+        self._failures = 0
+        self._open_until = None
+        self._probing = False
+
+    def failure(self, now: float) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            if self._open_until is None:
+                logger.warning(
+                    "Zipkin collector is not available, pausing span export "
+                    "for %s seconds",
+                    self._cooldown,
+                )
+            self._open_until = now + self._cooldown
+            self._probing = False
+
+
+class EndpointStats:
+    """Health of one collector endpoint, tracked with moving averages of
+    request latency and error rate. Endpoint is ejected for cool-down
+    period after number of consecutive failures, then single probe
+    request is sent to it.
+    """
+
+    __slots__ = (
+        "url",
+        "requests",
+        "errors",
+        "latency",
+        "has_latency",
+        "error_rate",
+        "in_flight",
+        "consecutive_errors",
+        "ejected_until",
+        "probing",
+    )
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.requests = 0
+        self.errors = 0
+        # moving averages, latency is in seconds
+        self.latency = 0.0
+        self.has_latency = False
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self.ejected_until: OptTs = None
+        self.probing = False
+
+    @property
+    def is_ejected(self) -> bool:
+        return self.ejected_until is not None
+
+    def score(self) -> float:
+        # expected latency of next request, lower is better; failed
+        # requests and requests already in flight make endpoint worse
+        latency = self.latency + 0.001
+        return latency * (self.in_flight + 1) * (1 + 10 * self.error_rate)
+
+    def begin(self) -> None:
+        self.requests += 1
+        self.in_flight += 1
+
+    def success(self, latency: float) -> None:
+        self._update(latency, 0.0)
+        if self.ejected_until is not None:
+            logger.info("Zipkin collector %s recovered", self.url)
+        self.consecutive_errors = 0
+        self.ejected_until = None
+        self.probing = False
+
+    def failure(
+        self, latency: float, now: float, threshold: int, cooldown: float
+    ) -> None:
+        self._update(latency, 1.0)
+        self.errors += 1
+        self.consecutive_errors += 1
+        if self.probing or self.consecutive_errors >= threshold:
+            if self.ejected_until is None:
+                logger.warning(
+                    "Zipkin collector %s is failing, ejecting it for %s seconds",
+                    self.url,
+                    cooldown,
+                )
+            self.ejected_until = now + cooldown
+            self.probing = False
+
+    def _update(self, latency: float, error: float) -> None:
+        self.in_flight -= 1
+        if not self.has_latency:
+            # several requests may be in flight before first response
+            self.latency = latency
+            self.has_latency = True
+        else:
+            self.latency += HEALTH_DECAY * (latency - self.latency)
+        self.error_rate += HEALTH_DECAY * (error - self.error_rate)
+
+
+class _PendingBatch:
+    __slots__ = (
+        "spans",
+        "keys",
+        "size",
+        "priority",
+        "attempt",
+        "seq",
+        "shard",
+        "queued",
+    )
+
+    def __init__(
+        self,
+        spans: Batch,
+        size: int,
+        priority: int,
+        seq: int,
+        shard: int = 0,
+        keys: Optional[List[int]] = None,
+    ) -> None:
+        self.spans = spans
+        # trace keys of spans, kept so spooled spans can be routed again
+        self.keys = keys if keys is not None else [0] * len(spans)
+        self.size = size
+        self.priority = priority
+        self.attempt = 0
+        # creation order, drop policies evict oldest batches first
+        self.seq = seq
+        self.shard = shard
+        # batch waits in sending queue or for retry, so it may be evicted
+        self.queued = False
+
+    def split(self) -> Tuple["_PendingBatch", "_PendingBatch"]:
+        half = len(self.spans) // 2
+        halves = []
+        parts = (
+            (self.spans[:half], self.keys[:half]),
+            (self.spans[half:], self.keys[half:]),
+        )
+        for spans, keys in parts:
+            size = sum(len(s) + 1 for s in spans)
+            b = _PendingBatch(spans, size, self.priority, self.seq, self.shard, keys)
+            b.attempt = self.attempt
+            halves.append(b)
+        return halves[0], halves[1]
+
+
 class BatchManager:
     def __init__(
         self,
@@ -54,34 +386,310 @@ class BatchManager:
         send_interval: float,
         attempt_count: int,
         send_data: SendDataCoro,
+        max_bytes: OptInt = None,
+        max_in_flight: int = 1,
+        backoff: float = DEFAULT_BACKOFF,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        max_queue_spans: OptInt = None,
+        max_queue_bytes: OptInt = None,
+        drop_policy: str = DROP_OLDEST,
+        stats: Optional[TransportStats] = None,
+        spool: Optional[Spool] = None,
+        spool_drain_rate: float = DEFAULT_SPOOL_DRAIN_RATE,
+        high_water_mark: OptInt = None,
+        shard_of: Optional[ShardOf] = None,
     ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy: {drop_policy!r}")
         loop = asyncio.get_event_loop()
+        self._loop = loop
         self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._max_in_flight = max_in_flight
         self._send_interval = send_interval
         self._send_data = send_data
         self._attempt_count = attempt_count
-        self._max = BATCHES_MAX_COUNT
-        self._sending_batches: SndBatches = deque([], maxlen=self._max)
-        self._active_batch: Optional[DataList] = None
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker(
+                DEFAULT_CIRCUIT_THRESHOLD, DEFAULT_CIRCUIT_COOLDOWN
+            )
+        self._circuit_breaker = circuit_breaker
+        if max_queue_spans is None:
+            max_queue_spans = BATCHES_MAX_COUNT * max_size
+        self._max_queue_spans = max_queue_spans
+        self._max_queue_bytes = max_queue_bytes
+        # manager is saturated once queue is filled up to this level
+        if high_water_mark is None:
+            high_water_mark = max(max_queue_spans * 8 // 10, 1)
+        self._high_water_mark = high_water_mark
+        self._high_water_bytes: OptInt = None
+        if max_queue_bytes is not None:
+            self._high_water_bytes = max_queue_bytes * 8 // 10
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._drop_policy = drop_policy
+        self._stats = stats if stats is not None else TransportStats()
+        self._spool = spool
+        # batches waiting to be written to spool with trace keys of spans
+        # and reason they were lost
+        self._spool_pending: List[Tuple[Batch, List[int], str]] = []
+        self._shard_of = shard_of
+        # spans per second sent from spool once collector is reachable
+        self._spool_drain_rate = spool_drain_rate
+        self._spool_budget = 0.0
+        self._spool_time = loop.time()
+        # spans held by manager, including ones in flight
+        self._queued_spans = 0
+        self._queued_bytes = 0
+        self._sending_batches: Deque[_PendingBatch] = deque()
+        self._retry_batches: RetryBatches = []
+        # evicted batches are left in sending and retry queues and skipped
+        # when reached; eviction candidates are kept in heaps by priority,
+        # entries of batches that are not queued anymore are skipped too
+        self._queued_batches = 0
+        self._evicted_waiting = 0
+        self._victims: Dict[int, VictimHeap] = {}
+        self._victim_entries = 0
+        self._victim_ids = itertools.count()
+        self._seq = itertools.count()
+        # batch that is being filled for each shard
+        self._active_batches: Dict[int, _PendingBatch] = {}
         self._ender = loop.create_future()
         self._timer: Optional[asyncio.Future[Any]] = None
         self._sender_task = asyncio.ensure_future(self._sender_loop())
 
-    def add(self, data: Dict[str, Any]) -> None:
-        if self._active_batch is None:
-            self._active_batch = []
-        self._active_batch.append(data)
-        if len(self._active_batch) >= self._max_size:
-            self._sending_batches.append((0, self._active_batch))
-            self._active_batch = None
+    @property
+    def queued_spans(self) -> int:
+        return self._queued_spans
+
+    @property
+    def saturated(self) -> bool:
+        if self._queued_spans >= self._high_water_mark:
+            return True
+        high_water_bytes = self._high_water_bytes
+        return high_water_bytes is not None and self._queued_bytes >= high_water_bytes
+
+    async def wait_for_capacity(self) -> None:
+        await self._capacity.wait()
+
+    def _update_capacity(self) -> None:
+        if not self.saturated or self._ender.done():
+            self._capacity.set()
+        elif self._capacity.is_set():
+            self._capacity.clear()
+            # queued spans are sent right away instead of waiting for
+            # send interval
             if self._timer is not None and not self._timer.done():
                 self._timer.cancel()
 
+    def add(
+        self, data: bytes, priority: int = 0, shard: int = 0, key: int = 0
+    ) -> None:
+        # one extra byte per span accounts for list delimiters of the
+        # request body
+        size = len(data) + 1
+        if not self._reserve(size, priority):
+            self._discard([data], [key], DROP_QUEUE_FULL)
+            return
+
+        max_bytes = self._max_bytes
+        batch = self._active_batches.get(shard)
+        if (
+            batch is not None
+            and max_bytes is not None
+            and batch.size + size > max_bytes
+        ):
+            self._flush_active_batch(shard)
+            batch = None
+
+        if batch is None:
+            batch = _PendingBatch([], 0, 0, 0, shard)
+            self._active_batches[shard] = batch
+        batch.spans.append(data)
+        batch.keys.append(key)
+        batch.size += size
+        batch.priority = max(batch.priority, priority)
+        if len(batch.spans) >= self._max_size or (
+            max_bytes is not None and batch.size >= max_bytes
+        ):
+            self._flush_active_batch(shard)
+
+    def _is_full(self, size: int) -> bool:
+        if self._queued_spans + 1 > self._max_queue_spans:
+            return True
+        max_queue_bytes = self._max_queue_bytes
+        return max_queue_bytes is not None and (
+            self._queued_bytes + size > max_queue_bytes
+        )
+
+    def _reserve(self, size: int, priority: int) -> bool:
+        # makes room for new span according to drop policy, returns False
+        # if new span itself should be dropped
+        while self._is_full(size):
+            if self._drop_policy == DROP_NEWEST:
+                return False
+            victim = self._find_victim(priority)
+            if victim is None:
+                return False
+            self._release(victim, DROP_QUEUE_FULL)
+        self._queued_spans += 1
+        self._queued_bytes += size
+        self._update_capacity()
+        return True
+
+    def _find_victim(self, priority: int) -> Optional[_PendingBatch]:
+        # batches in flight and active batches are never evicted, oldest
+        # batch is taken from heap of every priority, there are only few
+        lowest_priority = self._drop_policy == DROP_LOWEST_PRIORITY
+        victims: Optional[VictimHeap] = None
+        for victim_priority in sorted(self._victims):
+            if lowest_priority and victim_priority > priority:
+                break
+            heap = self._victims[victim_priority]
+            while heap and not heap[0][2].queued:
+                heapq.heappop(heap)
+                self._victim_entries -= 1
+            if not heap:
+                continue
+            if lowest_priority:
+                victims = heap
+                break
+            if victims is None or heap[0][0] < victims[0][0]:
+                victims = heap
+        if victims is None:
+            return None
+
+        victim = heapq.heappop(victims)[2]
+        self._victim_entries -= 1
+        self._dequeue(victim)
+        self._evicted_waiting += 1
+        batches = self._sending_batches
+        while batches and not batches[0].queued:
+            batches.popleft()
+            self._evicted_waiting -= 1
+        if self._evicted_waiting > self._queued_batches + _COMPACT_SLACK:
+            self._compact_queues()
+        return victim
+
+    def _enqueue(self, batch: _PendingBatch) -> None:
+        batch.queued = True
+        self._queued_batches += 1
+        heap = self._victims.setdefault(batch.priority, [])
+        heapq.heappush(heap, (batch.seq, next(self._victim_ids), batch))
+        self._victim_entries += 1
+        if self._victim_entries > 2 * self._queued_batches + _COMPACT_SLACK:
+            self._compact_victims()
+
+    def _dequeue(self, batch: _PendingBatch) -> bool:
+        # returns False if batch was evicted while it was waiting
+        if not batch.queued:
+            return False
+        batch.queued = False
+        self._queued_batches -= 1
+        return True
+
+    def _skip_evicted(self, batch: _PendingBatch) -> bool:
+        # takes batch out of sending or retry queue, returns True if it
+        # was evicted and should be skipped
+        if self._dequeue(batch):
+            return False
+        self._evicted_waiting -= 1
+        return True
+
+    def _compact_queues(self) -> None:
+        self._sending_batches = deque(b for b in self._sending_batches if b.queued)
+        self._retry_batches = [i for i in self._retry_batches if i[2].queued]
+        heapq.heapify(self._retry_batches)
+        self._evicted_waiting = 0
+
+    def _compact_victims(self) -> None:
+        seen: Set[int] = set()
+        entries = 0
+        for priority, heap in self._victims.items():
+            live = []
+            for entry in heap:
+                batch = entry[2]
+                # batch queued again after retry may have several entries
+                if batch.queued and id(batch) not in seen:
+                    seen.add(id(batch))
+                    live.append(entry)
+            heapq.heapify(live)
+            self._victims[priority] = live
+            entries += len(live)
+        self._victim_entries = entries
+
+    def _release(self, batch: _PendingBatch, drop_reason: OptStr = None) -> None:
+        self._queued_spans -= len(batch.spans)
+        self._queued_bytes -= batch.size
+        self._update_capacity()
+        if drop_reason is not None:
+            self._discard(batch.spans, batch.keys, drop_reason)
+
+    def _discard(self, spans: Batch, keys: List[int], reason: str) -> None:
+        if self._spool is not None and reason in SPOOLED_DROP_REASONS:
+            # disk writes and fsync are done in executor by sender loop,
+            # never on path of span being finished
+            self._spool_pending.append((spans, keys, reason))
+            return
+        self._stats.drop(reason, len(spans))
+
+    async def _write_spool(self) -> None:
+        spool = self._spool
+        pending = self._spool_pending
+        if spool is None or not pending:
+            return
+        self._spool_pending = []
+
+        def write() -> List[OptStr]:
+            # drop reason of each batch, None if batch is written
+            reasons: List[OptStr] = []
+            for spans, keys, reason in pending:
+                try:
+                    written = spool.append(spans, keys)
+                    reasons.append(None if written else DROP_SPOOL_FULL)
+                except OSError as exc:
+                    logger.error("Can not write spans to spool", exc_info=exc)
+                    reasons.append(reason)
+            return reasons
+
+        reasons = await self._loop.run_in_executor(None, write)
+        for (spans, _, _), drop_reason in zip(pending, reasons):
+            if drop_reason is None:
+                self._stats.spooled_spans += len(spans)
+            else:
+                self._stats.drop(drop_reason, len(spans))
+
+    def _flush_active_batch(self, shard: int) -> None:
+        batch = self._active_batches.pop(shard)
+        batch.seq = next(self._seq)
+        self._sending_batches.append(batch)
+        self._enqueue(batch)
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+
     async def stop(self) -> None:
         self._ender.set_result(None)
+        # nothing is accepted after stop, so waiters are released
+        self._capacity.set()
 
         await self._sender_task
-        await self._send()
+        await self._send(flush=True)
+
+        # whatever is left after last attempt is lost
+        for batch in self._sending_batches:
+            if not self._skip_evicted(batch):
+                self._release(batch, DROP_SHUTDOWN)
+        for _, _, batch in self._retry_batches:
+            if not self._skip_evicted(batch):
+                self._release(batch, DROP_SHUTDOWN)
+        self._sending_batches.clear()
+        self._retry_batches.clear()
+        self._victims.clear()
+        self._victim_entries = 0
+        await self._write_spool()
 
         if self._timer is not None:
             self._timer.cancel()
@@ -95,18 +703,155 @@ class BatchManager:
             await self._wait()
             await self._send()
 
-    async def _send(self) -> None:
-        if self._active_batch is not None:
-            self._sending_batches.append((0, self._active_batch))
-            self._active_batch = None
+    async def _send(self, flush: bool = False) -> None:
+        for shard in list(self._active_batches):
+            self._flush_active_batch(shard)
+
+        # batches waiting for retry are sent only when their backoff
+        # delay is over, or regardless of it on flush
+        now = self._loop.time()
+        due: Deque[_PendingBatch] = deque()
+        retries = self._retry_batches
+        while retries and (flush or retries[0][0] <= now):
+            batch = heapq.heappop(retries)[2]
+            if not self._skip_evicted(batch):
+                due.append(batch)
+
+        # up to max_in_flight workers share the queue, so one slow
+        # response does not block other batches, including ones filled
+        # while requests are in flight
+        workers = [self._send_worker(due) for _ in range(self._max_in_flight)]
+        await asyncio.gather(*workers)
+
+        # circuit breaker stopped workers, keep batches for later
+        for batch in due:
+            self._schedule_retry(batch, 0)
+
+        await self._write_spool()
+        if self._spool is not None and not flush:
+            await self._drain_spool()
+
+    async def _drain_spool(self) -> None:
+        spool = self._spool
+        assert spool is not None
+        # token bucket with burst of one second worth of spans
+        now = self._loop.time()
+        rate = self._spool_drain_rate
+        elapsed = now - self._spool_time
+        self._spool_budget = min(rate, self._spool_budget + elapsed * rate)
+        self._spool_time = now
+
+        # reads and cursor updates with fsync are done in executor like
+        # spool writes, sender loop awaits them, so spool is never used
+        # from two threads at once
+        while self._spool_budget >= 1 and self._circuit_breaker.allow(now):
+            max_spans = min(self._max_size, int(self._spool_budget))
+            try:
+                chunk = await self._loop.run_in_executor(
+                    None, spool.read, max_spans, self._max_bytes
+                )
+            except OSError as exc:
+                logger.error("Can not read spans from spool", exc_info=exc)
+                return
+            if chunk is None:
+                return
+            spans, position, keys = chunk
+            if not await self._send_spooled(spans, keys):
+                return
+            try:
+                await self._loop.run_in_executor(None, spool.commit, position)
+            except OSError as exc:
+                logger.error("Can not update spool cursor", exc_info=exc)
+                return
+            self._spool_budget -= len(spans)
+
+    async def _send_spooled(self, spans: Batch, keys: List[int]) -> bool:
+        # spans are routed by current collectors, not by ones they were
+        # spooled with; returns False if collector is not reachable
+        groups: Dict[int, Batch] = {0: spans}
+        shard_of = self._shard_of
+        if shard_of is not None:
+            groups = {}
+            for span, key in zip(spans, keys):
+                groups.setdefault(shard_of(key), []).append(span)
+
+        for shard, group in groups.items():
+            result = await self._send_data(group, shard)
+            if result.ok:
+                self._circuit_breaker.success()
+            elif result.drop_reason is not None:
+                self._rejected(result)
+                self._stats.drop(result.drop_reason, len(group))
+            elif result.status == HTTP_PAYLOAD_TOO_LARGE:
+                # collector is reachable, only request body is rejected
+                self._circuit_breaker.success()
+                logger.warning("Spooled spans are too large to be sent to zipkin")
+                self._stats.drop(DROP_TOO_LARGE, len(group))
+            else:
+                self._circuit_breaker.failure(self._loop.time())
+                return False
+        return True
+
+    async def _send_worker(self, due: Deque[_PendingBatch]) -> None:
+        # new batches go first and never wait behind retries of old ones
+        # sending queue is replaced when evicted batches are compacted
+        while self._sending_batches or due:
+            if not self._circuit_breaker.allow(self._loop.time()):
+                return
+            if self._sending_batches:
+                batch = self._sending_batches.popleft()
+                if self._skip_evicted(batch):
+                    continue
+            else:
+                batch = due.popleft()
+            result = await self._send_data(batch.spans, batch.shard)
+            if result.ok:
+                self._circuit_breaker.success()
+                self._release(batch)
+                continue
+            if result.drop_reason is not None:
+                self._rejected(result)
+                self._release(batch, result.drop_reason)
+                continue
+            if result.status == HTTP_PAYLOAD_TOO_LARGE:
+                # collector or proxy in front of it rejected request body,
+                # so batch is split in half and both parts sent right away;
+                # collector is reachable, so probe of circuit breaker passed
+                self._circuit_breaker.success()
+                if len(batch.spans) > 1:
+                    first, second = batch.split()
+                    self._sending_batches.appendleft(second)
+                    self._sending_batches.appendleft(first)
+                    self._enqueue(second)
+                    self._enqueue(first)
+                else:
+                    logger.warning("Span is too large to be sent to zipkin")
+                    self._release(batch, DROP_TOO_LARGE)
+                continue
+            self._circuit_breaker.failure(self._loop.time())
+            batch.attempt += 1
+            if batch.attempt >= self._attempt_count:
+                self._release(batch, DROP_ATTEMPTS_EXHAUSTED)
+                continue
+            delay = result.retry_after
+            if delay is None:
+                # exponential backoff with full jitter, so processes do
+                # not retry in lockstep after collector outage
+                cap = min(self._backoff_max, self._backoff * 2 ** (batch.attempt - 1))
+                delay = random.uniform(0, cap)
+            self._schedule_retry(batch, delay)
+
+    def _rejected(self, result: SendResult) -> None:
+        if result.status is not None:
+            # collector responded, so it is reachable
+            self._circuit_breaker.success()
+        else:
+            self._circuit_breaker.cancel_probe()
 
-        batches = self._sending_batches.copy()
-        self._sending_batches = deque([], maxlen=self._max)
-        for attempt, batch in batches:
-            if not await self._send_data(batch):
-                attempt += 1
-                if attempt < self._attempt_count:
-                    self._sending_batches.append((attempt, batch))
+    def _schedule_retry(self, batch: _PendingBatch, delay: float) -> None:
+        retry_at = self._loop.time() + delay
+        heapq.heappush(self._retry_batches, (retry_at, next(self._seq), batch))
+        self._enqueue(batch)
 
     async def _wait(self) -> None:
         self._timer = asyncio.ensure_future(asyncio.sleep(self._send_interval))
@@ -120,13 +865,31 @@ class BatchManager:
 class Transport(TransportABC):
     def __init__(
         self,
-        address: str,
+        address: Union[str, Sequence[str]],
         send_interval: float = 5,
         loop: OptLoop = None,
         *,
         send_max_size: int = 100,
         send_attempt_count: int = 3,
-        send_timeout: Optional[aiohttp.ClientTimeout] = None
+        send_timeout: Optional[aiohttp.ClientTimeout] = None,
+        encoding: str = JSON,
+        send_max_bytes: OptInt = None,
+        compression: OptStr = None,
+        compression_level: OptInt = None,
+        send_max_in_flight: int = 1,
+        send_backoff: float = DEFAULT_BACKOFF,
+        send_backoff_max: float = DEFAULT_BACKOFF_MAX,
+        send_circuit_threshold: int = DEFAULT_CIRCUIT_THRESHOLD,
+        send_circuit_cooldown: float = DEFAULT_CIRCUIT_COOLDOWN,
+        send_max_queue_spans: OptInt = None,
+        send_max_queue_bytes: OptInt = None,
+        send_drop_policy: str = DROP_OLDEST,
+        spool: Optional[Spool] = None,
+        spool_drain_rate: float = DEFAULT_SPOOL_DRAIN_RATE,
+        send_eject_threshold: int = DEFAULT_EJECT_THRESHOLD,
+        send_eject_cooldown: float = DEFAULT_EJECT_COOLDOWN,
+        sharding: bool = False,
+        send_high_water_mark: OptInt = None
     ) -> None:
         if loop is not None:
             warnings.warn(
@@ -134,32 +897,192 @@ class Transport(TransportABC):
                 DeprecationWarning,
                 stacklevel=2,
             )
-        self._address = URL(address)
-        self._queue: DataList = []
+        addresses = [address] if isinstance(address, str) else list(address)
+        if not addresses:
+            raise ValueError("At least one collector address is required")
+        self._addresses = [URL(a) for a in addresses]
         self._closing = False
         self._send_interval = send_interval
+        self._encoder = get_encoder(encoding)
+        if spool is not None and spool.encoding != encoding:
+            raise ValueError(
+                f"Spool encoding {spool.encoding!r} does not match {encoding!r}"
+            )
+        self._compressor = get_compressor(compression, compression_level)
+        self._stats = TransportStats()
+        self._endpoints = [EndpointStats(a) for a in addresses]
+        self._stats.endpoints = {e.url: e for e in self._endpoints}
+        self._eject_threshold = send_eject_threshold
+        # loop time until which collector throttled transport
+        self._throttled_until = 0.0
+        self._eject_cooldown = send_eject_cooldown
+        # with sharding every span of trace goes to same collector, there
+        # is no failover between collectors then
+        self._ring: Optional[HashRing] = None
+        self._shards: Dict[str, int] = {}
+        if sharding:
+            self._ring = HashRing(addresses)
+            self._shards = {a: i for i, a in enumerate(addresses)}
         if send_timeout is None:
             send_timeout = DEFAULT_TIMEOUT
-        self._session = aiohttp.ClientSession(
-            timeout=send_timeout,
-            headers={"Content-Type": "application/json"},
-        )
+        headers = {"Content-Type": self._encoder.content_type}
+        if self._compressor is not None:
+            headers["Content-Encoding"] = self._compressor.content_encoding
+        self._session = aiohttp.ClientSession(timeout=send_timeout, headers=headers)
         self._batch_manager = BatchManager(
             send_max_size,
             send_interval,
             send_attempt_count,
             self._send_data,
+            max_bytes=send_max_bytes,
+            max_in_flight=send_max_in_flight,
+            backoff=send_backoff,
+            backoff_max=send_backoff_max,
+            circuit_breaker=CircuitBreaker(
+                send_circuit_threshold, send_circuit_cooldown
+            ),
+            max_queue_spans=send_max_queue_spans,
+            max_queue_bytes=send_max_queue_bytes,
+            drop_policy=send_drop_policy,
+            stats=self._stats,
+            spool=spool,
+            spool_drain_rate=spool_drain_rate,
+            high_water_mark=send_high_water_mark,
+            shard_of=self._shard_of if sharding else None,
         )
+        self._spool = spool
 
     def send(self, record: Record) -> None:
-        data = record.asdict()
-        self._batch_manager.add(data)
+        try:
+            data = self._encoder.encode_span(record)
+        except Exception as exc:  # pylint: disable=broad-except
+            # malformed span should never break application
+            logger.error("Can not encode span", exc_info=exc)
+            self._stats.drop(DROP_ENCODING_ERROR)
+            return
+        self.send_encoded(data, _priority(record), record._context.trace_id)
+
+    def send_encoded(
+        self, data: bytes, priority: int = 0, trace_id: OptStr = None
+    ) -> None:
+        """Queues span that is already encoded with transport encoding, used
+        when spans are encoded by other process. With sharding, spans
+        without trace_id go to first shard.
+        """
+        key = 0
+        if trace_id is not None:
+            try:
+                key = trace_key(trace_id)
+            except ValueError:
+                # malformed id of incoming request
+                pass
+        shard = 0 if self._ring is None else self._shard_of(key)
+        self._batch_manager.add(data, priority, shard, key)
+
+    def _shard_of(self, key: int) -> int:
+        # key is 0 for spans without valid trace id
+        if not key or self._ring is None:
+            return 0
+        return self._shards[self._ring.get_key(key)]
+
+    @property
+    def stats(self) -> TransportStats:
+        return self._stats
+
+    @property
+    def queued_spans(self) -> int:
+        """Number of spans waiting to be sent or retried, including ones
+        in flight.
+        """
+        return self._batch_manager.queued_spans
+
+    @property
+    def saturated(self) -> bool:
+        return self._batch_manager.saturated
+
+    async def wait_for_capacity(self) -> None:
+        await self._batch_manager.wait_for_capacity()
 
-    async def _send_data(self, data: DataList) -> bool:
+    @property
+    def under_pressure(self) -> bool:
+        if self.saturated:
+            return True
+        return asyncio.get_event_loop().time() < self._throttled_until
+
+    async def _compress(self, payload: bytes) -> bytes:
+        compressor = self._compressor
+        if compressor is None:
+            return payload
+        if len(payload) < COMPRESS_IN_EXECUTOR_SIZE:
+            return compressor.compress(payload)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, compressor.compress, payload)
+
+    def _select_endpoint(self, now: float) -> int:
+        endpoints = self._endpoints
+        for i, endpoint in enumerate(endpoints):
+            ejected_until = endpoint.ejected_until
+            if ejected_until is not None and ejected_until <= now:
+                if not endpoint.probing:
+                    endpoint.probing = True
+                    return i
+        healthy = [i for i, e in enumerate(endpoints) if not e.is_ejected]
+        if not healthy:
+            # all endpoints are failing, one that is probed first is used
+            return min(
+                range(len(endpoints)),
+                key=lambda i: endpoints[i].ejected_until or 0.0,
+            )
+        return min(healthy, key=lambda i: endpoints[i].score())
+
+    async def _send_data(self, data: Batch, shard: int) -> SendResult:
+        loop = asyncio.get_event_loop()
         try:
+            payload = self._encoder.encode_list(data)
+            self._stats.uncompressed_bytes += len(payload)
+            payload = await self._compress(payload)
+            self._stats.compressed_bytes += len(payload)
+        except Exception as exc:  # pylint: disable=broad-except
+            # that code should never fail and break application
+            logger.error("Can not send spans to zipkin", exc_info=exc)
+            return SendResult(False, drop_reason=DROP_ENCODING_ERROR)
+
+        started = loop.time()
+        if self._ring is not None:
+            index = shard
+        else:
+            index = self._select_endpoint(started)
+        endpoint = self._endpoints[index]
+        endpoint.begin()
+        result = await self._post(self._addresses[index], payload)
+        now = loop.time()
+        if result.status in HTTP_THROTTLE_CODES:
+            # pressure lasts at least until next batch is sent
+            delay = max(result.retry_after or 0.0, self._send_interval)
+            self._throttled_until = max(self._throttled_until, now + delay)
+        # 4xx other than 413 is failure too, misconfigured endpoint that
+        # rejects everything quickly should not attract traffic
+        if result.ok or result.status == HTTP_PAYLOAD_TOO_LARGE:
+            endpoint.success(now - started)
+        else:
+            endpoint.failure(
+                now - started, now, self._eject_threshold, self._eject_cooldown
+            )
+        return result
 
-            async with self._session.post(self._address, json=data) as resp:
+    async def _post(self, address: URL, payload: bytes) -> SendResult:
+        status = None
+        try:
+            async with self._session.post(address, data=payload) as resp:
+                status = resp.status
                 body = await resp.text()
+                if resp.status == HTTP_PAYLOAD_TOO_LARGE:
+                    return SendResult(False, resp.status)
+                if resp.status in HTTP_THROTTLE_CODES:
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                    return SendResult(False, resp.status, retry_after)
+                if resp.status >= 500:
+                    return SendResult(False, resp.status)
                 if resp.status >= 300:
                     msg = "zipkin responded with code: {} and body: {}".format(
                         resp.status, body
@@ -167,11 +1090,13 @@ class Transport(TransportABC):
                     raise RuntimeError(msg)
 
         except (asyncio.TimeoutError, ClientError):
-            return False
+            return SendResult(False)
         except Exception as exc:  # pylint: disable=broad-except
-            # that code should never fail and break application
+            # that code should never fail and break application; batch
+            # rejected by collector would be rejected on retry as well
             logger.error("Can not send spans to zipkin", exc_info=exc)
-        return True
+            return SendResult(False, status, drop_reason=DROP_REJECTED)
+        return SendResult(True)
 
     async def close(self) -> None:
         if self._closing:
@@ -180,3 +1105,5 @@ class Transport(TransportABC):
         self._closing = True
         await self._batch_manager.stop()
         await self._session.close()
+        if self._spool is not None:
+            self._spool.close()
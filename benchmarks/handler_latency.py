@@ -0,0 +1,100 @@
+"""aiohttp handler latency without tracing and with tracing at 100%
+sampling, using regular and threaded transports.
+
+Usage: python benchmarks/handler_latency.py
+"""
+import asyncio
+import statistics
+import time
+from typing import Callable, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+import aiozipkin as az
+from aiozipkin.threaded import ThreadedTransport
+from aiozipkin.transport import Transport, TransportABC
+
+
+REQUESTS = 5000
+CONCURRENCY = 20
+CHILD_SPANS = 5
+
+
+async def collector(request: web.Request) -> web.Response:
+    await request.read()
+    return web.Response(status=202)
+
+
+async def handler(request: web.Request) -> web.Response:
+    span = request.get(az.REQUEST_AIOZIPKIN_KEY)
+    for i in range(CHILD_SPANS):
+        if span is not None:
+            with span.new_child(f"child_{i}", az.CLIENT) as child:
+                child.tag("index", str(i))
+    return web.Response(text="ok")
+
+
+async def measure(transport: Optional[TransportABC]) -> List[float]:
+    app = web.Application()
+    app.router.add_get("/", handler)
+    if transport is not None:
+        endpoint = az.create_endpoint("benchmark_service")
+        tracer = await az.create_custom(endpoint, transport)
+        az.setup(app, tracer)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    url = f"http://127.0.0.1:{port}/"
+
+    latencies: List[float] = []
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for i in range(REQUESTS):
+        queue.put_nowait(i)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            async with session.get(url) as resp:
+                await resp.read()
+            latencies.append(time.perf_counter() - started)
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(CONCURRENCY)))
+    await runner.cleanup()
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{name:<20} p50={p50:6.2f}ms p99={p99:6.2f}ms")
+
+
+async def run() -> None:
+    app = web.Application()
+    app.router.add_post("/api/v2/spans", collector)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    collector_url = f"http://127.0.0.1:{port}/api/v2/spans"
+
+    transports: List[Callable[[], Optional[TransportABC]]] = [
+        lambda: None,
+        lambda: Transport(collector_url, send_interval=0.1),
+        lambda: ThreadedTransport(collector_url, send_interval=0.1),
+    ]
+    names = ["no tracing", "Transport", "ThreadedTransport"]
+    for name, make_transport in zip(names, transports):
+        report(name, await measure(make_transport()))
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+"""Batching efficiency of trace sharding: spans per request and number of
+requests with different number of collector shards.
+
+Usage: python benchmarks/sharding_batching.py
+"""
+import asyncio
+import time
+from typing import List
+
+from aiohttp import web
+
+import aiozipkin as az
+from aiozipkin.transport import Transport
+
+
+TRACES = 2000
+SPANS_PER_TRACE = 5
+BATCH_SIZE = 100
+SEND_INTERVAL = 0.2
+
+requests: List[int] = []
+
+
+async def collector(request: web.Request) -> web.Response:
+    requests.append(len(await request.json()))
+    return web.Response(status=202)
+
+
+async def measure(base_url: str, shards: int) -> float:
+    requests.clear()
+    endpoint = az.create_endpoint("benchmark_service", ipv4="127.0.0.1", port=80)
+    addresses = [f"{base_url}/{i}" for i in range(shards)]
+    transport = Transport(
+        addresses,
+        send_interval=SEND_INTERVAL,
+        send_max_size=BATCH_SIZE,
+        sharding=shards > 1,
+    )
+    tracer = await az.create_custom(endpoint, transport)
+
+    started = time.perf_counter()
+    for i in range(TRACES):
+        with tracer.new_trace(sampled=True) as span:
+            for j in range(SPANS_PER_TRACE - 1):
+                with span.new_child(f"child_{j}"):
+                    pass
+        if i % 10 == 0:
+            # spans arrive over time, as in real application
+            await asyncio.sleep(0.001)
+    await tracer.close()
+    return time.perf_counter() - started
+
+
+async def run() -> None:
+    app = web.Application()
+    app.router.add_post("/api/v2/spans/{shard}", collector)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    base_url = f"http://127.0.0.1:{port}/api/v2/spans"
+
+    spans = TRACES * SPANS_PER_TRACE
+    print(f"{spans} spans, batch size {BATCH_SIZE}, send interval {SEND_INTERVAL}s")
+    for shards in (1, 8, 16, 32, 64):
+        elapsed = await measure(base_url, shards)
+        print(
+            f"shards={shards:<3} requests={len(requests):<5} "
+            f"spans/request={spans / len(requests):6.1f} {elapsed:6.2f}s"
+        )
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+"""Span export throughput against slow collector with different number of
+concurrent uploads.
+
+Usage: python benchmarks/transport_in_flight.py
+"""
+import asyncio
+import time
+
+from aiohttp import web
+
+import aiozipkin as az
+from aiozipkin.transport import Transport
+
+
+SPANS = 2000
+BATCH_SIZE = 50
+COLLECTOR_DELAY = 0.1
+
+
+async def slow_collector(request: web.Request) -> web.Response:
+    await request.read()
+    await asyncio.sleep(COLLECTOR_DELAY)
+    return web.Response(status=202)
+
+
+async def measure(url: str, max_in_flight: int) -> float:
+    endpoint = az.create_endpoint("benchmark_service", ipv4="127.0.0.1", port=80)
+    transport = Transport(
+        url,
+        send_interval=0.05,
+        send_max_size=BATCH_SIZE,
+        send_max_in_flight=max_in_flight,
+    )
+    tracer = await az.create_custom(endpoint, transport)
+
+    started = time.perf_counter()
+    for i in range(SPANS):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"span_{i}")
+        if i % BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+    await tracer.close()
+    return time.perf_counter() - started
+
+
+async def run() -> None:
+    app = web.Application()
+    app.router.add_post("/api/v2/spans", slow_collector)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    url = f"http://127.0.0.1:{port}/api/v2/spans"
+
+    print(f"{SPANS} spans, {BATCH_SIZE} per batch, {COLLECTOR_DELAY}s per request")
+    for max_in_flight in (1, 2, 4, 8, 16):
+        elapsed = await measure(url, max_in_flight)
+        print(
+            f"max_in_flight={max_in_flight:<3} {elapsed:6.2f}s "
+            f"{SPANS / elapsed:10.0f} spans/s"
+        )
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -10,6 +10,7 @@ def read(f: str) -> str:
 
 
 install_requires = ["aiohttp>=3.7.2"]
+extras_require = {"zstd": ["zstandard"]}
 
 
 def read_version() -> str:
@@ -56,6 +57,8 @@ setup(
     packages=find_packages(),
     python_requires=">=3.6",
     install_requires=install_requires,
+    extras_require=extras_require,
+    entry_points={"console_scripts": ["aiozipkin-agent = aiozipkin.agent:main"]},
     keywords=["zipkin", "distributed-tracing", "tracing"],
     zip_safe=True,
     include_package_data=True,
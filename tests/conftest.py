@@ -63,6 +63,7 @@ async def client(loop: asyncio.AbstractEventLoop) -> Any:
 class FakeZipkin:
     def __init__(self) -> None:
         self.next_errors: List[Any] = []
+        self.delay = 0.0
         self.app = web.Application()
         self.app.router.add_post("/api/v2/spans", self.spans_handler)
         self.port = None
@@ -75,6 +76,8 @@ class FakeZipkin:
         return "http://127.0.0.1:%s/api/v2/spans" % self.port
 
     async def spans_handler(self, request: web.Request) -> web.Response:
+        if self.delay:
+            await asyncio.sleep(self.delay)
         if len(self.next_errors) > 0:
             err = self.next_errors.pop(0)
             if err == "disconnect":
@@ -83,9 +86,18 @@ class FakeZipkin:
                 await asyncio.sleep(1)
             elif err == "timeout":
                 await asyncio.sleep(60)
+            elif err == "too_large":
+                return web.Response(status=413)
+            elif err == "throttle":
+                return web.Response(status=429, headers={"Retry-After": "0"})
+            elif err == "bad_request":
+                return web.Response(status=400)
             return web.HTTPInternalServerError()
 
-        data = await request.json()
+        if request.content_type == "application/x-protobuf":
+            data = await request.read()
+        else:
+            data = await request.json()
         if self._wait_count is not None:
             self._wait_count -= 1
         self._received_data.append(data)
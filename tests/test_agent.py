@@ -0,0 +1,119 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiohttp.client import ClientTimeout
+
+import aiozipkin as az
+from aiozipkin.agent import Agent, AgentTransport, _parse_datagram
+
+
+@pytest.mark.asyncio
+async def test_agent_unix_and_udp(
+    tmp_path: Any, fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    path = str(tmp_path / "agent.sock")
+    agent = Agent(
+        fake_zipkin.url,
+        path=path,
+        port=0,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+    )
+    await agent.start()
+    assert agent.port is not None and agent.port != 0
+
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    unix_tracer = await az.create_custom(endpoint, AgentTransport(path))
+    udp_tracer = await az.create_custom(endpoint, AgentTransport(port=agent.port))
+
+    waiter = fake_zipkin.wait_data(1)
+    with unix_tracer.new_trace(sampled=True) as span:
+        span.name("unix")
+        with span.new_child("unix_child"):
+            pass
+    with udp_tracer.new_trace(sampled=True) as span:
+        span.name("udp")
+    await asyncio.wait_for(waiter, timeout=5)
+
+    await unix_tracer.close()
+    await udp_tracer.close()
+    await agent.close()
+
+    data = fake_zipkin.get_received_data()
+    names = sorted(s["name"] for batch in data for s in batch)
+    assert names == ["udp", "unix", "unix_child"]
+
+
+@pytest.mark.asyncio
+async def test_agent_transport_drops(
+    tmp_path: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    tr = AgentTransport(str(tmp_path / "missing.sock"), max_datagram_size=400)
+    tracer = await az.create_custom(endpoint, tr)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.tag("big", "x" * 400)
+    with tracer.new_trace(sampled=True):
+        pass
+    await asyncio.sleep(0)
+    await tracer.close()
+    with tracer.new_trace(sampled=True):
+        pass
+
+    assert tr.stats.dropped_spans == {"too_large": 1, "unavailable": 2}
+
+
+@pytest.mark.asyncio
+async def test_agent_encoding_mismatch(
+    tmp_path: Any, fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    path = str(tmp_path / "agent.sock")
+    agent = Agent(fake_zipkin.url, path=path, port=None, encoding="proto3")
+    await agent.start()
+
+    tr = AgentTransport(path)
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    tracer = await az.create_custom(endpoint, tr)
+    with tracer.new_trace(sampled=True):
+        pass
+    await tracer.close()
+    agent._receive(b"\x01")
+    for _ in range(10):
+        await asyncio.sleep(0.01)
+        if agent.stats.dropped_spans:
+            break
+
+    assert agent.stats.dropped_spans == {"encoding_error": 1}
+    await agent.close()
+
+
+def test_parse_datagram() -> None:
+    data = b"\x01\x00" + b"\x02\x00\x00\x00\x01ab" + b"\x00\x00\x00\x00\x00"
+    assert _parse_datagram(data) == (1, 0, [(b"ab", 1), (b"", 0)])
+    with pytest.raises(ValueError):
+        _parse_datagram(data[:-3])
+    with pytest.raises(ValueError):
+        Agent("http://127.0.0.1:9411/api/v2/spans", port=None)
+
+
+@pytest.mark.asyncio
+async def test_agent_keeps_non_socket_path(
+    tmp_path: Any, fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    path = tmp_path / "agent.sock"
+    path.write_text("not a socket")
+    agent = Agent(fake_zipkin.url, path=str(path), port=None)
+    with pytest.raises(ValueError):
+        await agent.start()
+    assert path.read_text() == "not a socket"
+    await agent._transport.close()
+
+    # socket left by previous agent is replaced
+    path.unlink()
+    for _ in range(2):
+        agent = Agent(fake_zipkin.url, path=str(path), port=None)
+        await agent.start()
+        agent._endpoints[0].close()
+        await agent._transport.close()
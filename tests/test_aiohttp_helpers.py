@@ -9,6 +9,7 @@ from aiohttp.web_exceptions import HTTPException, HTTPNotFound
 
 import aiozipkin as az
 from aiozipkin.aiohttp_helpers import middleware_maker
+from aiozipkin.sampler import RuleSampler
 
 
 def test_basic_setup(tracer: az.Tracer) -> None:
@@ -52,6 +53,32 @@ async def test_middleware_with_default_transport(
     assert len(fake_transport.records) == 1
 
 
+@pytest.mark.asyncio
+async def test_middleware_with_rule_sampler(fake_transport: Any) -> None:
+    sampler = RuleSampler(
+        [
+            {"route": "/healthz", "sample_rate": 0},
+            {"route": "/checkout", "method": "POST", "sample_rate": 1},
+        ],
+        default_sample_rate=0,
+    )
+    endpoint = az.create_endpoint("test_service")
+    app = web.Application()
+    az.setup(app, az.Tracer(fake_transport, sampler, endpoint))
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        return web.Response(body=b"data")
+
+    middleware = middleware_maker()
+    for method, path in [("GET", "/healthz"), ("POST", "/checkout")]:
+        req = make_mocked_request(method, path, app=app)
+        assert req.match_info.route.resource is not None
+        req.match_info.route.resource.canonical = path  # type: ignore[misc]
+        await middleware(req, handler)
+    assert len(fake_transport.records) == 1
+    assert fake_transport.records[0].asdict()["name"] == "POST /checkout"
+
+
 @pytest.mark.asyncio
 async def test_middleware_with_not_skip_route(
     tracer: az.Tracer, fake_transport: Any
@@ -0,0 +1,34 @@
+import gzip
+
+import pytest
+
+from aiozipkin.compression import get_compressor
+
+
+def test_no_compression() -> None:
+    assert get_compressor(None) is None
+
+
+def test_gzip() -> None:
+    compressor = get_compressor("gzip", 1)
+    assert compressor is not None
+    assert compressor.content_encoding == "gzip"
+    data = b'{"traceId":"6f9a20b5092fa5e144fd15cc31141cd4"}' * 100
+    compressed = compressor.compress(data)
+    assert len(compressed) < len(data)
+    assert gzip.decompress(compressed) == data
+
+
+def test_zstd() -> None:
+    zstandard = pytest.importorskip("zstandard")
+    compressor = get_compressor("zstd")
+    assert compressor is not None
+    assert compressor.content_encoding == "zstd"
+    data = b'{"traceId":"6f9a20b5092fa5e144fd15cc31141cd4"}' * 100
+    compressed = compressor.compress(data)
+    assert zstandard.ZstdDecompressor().decompress(compressed) == data
+
+
+def test_unknown_compression() -> None:
+    with pytest.raises(ValueError):
+        get_compressor("brotli")
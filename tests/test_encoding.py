@@ -0,0 +1,202 @@
+import json
+import struct
+from typing import Any, List, Tuple
+
+import pytest
+
+from aiozipkin.encoding import (
+    JsonEncoder,
+    OtlpEncoder,
+    Proto3Encoder,
+    get_encoder,
+)
+from aiozipkin.helpers import Endpoint, TraceContext
+from aiozipkin.record import Record
+
+
+Fields = List[Tuple[int, Any]]
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return result, pos
+
+
+def decode_message(buf: bytes) -> Fields:
+    fields: Fields = []
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 0x7
+        value: Any
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            value = struct.unpack_from("<Q", buf, pos)[0]
+            pos += 8
+        else:
+            assert wire_type == 2
+            size, pos = _read_varint(buf, pos)
+            value = buf[pos : pos + size]
+            pos += size
+        fields.append((field, value))
+    return fields
+
+
+@pytest.fixture
+def record() -> Record:
+    context = TraceContext(
+        trace_id="6f9a20b5092fa5e144fd15cc31141cd4",
+        parent_id="41baf1be2fb9bfc5",
+        span_id="17133d482ba4f605",
+        sampled=True,
+        debug=False,
+        shared=True,
+    )
+    local_endpoint = Endpoint("service_a", "127.0.0.1", None, 8080)
+    remote_endpoint = Endpoint("service_b", None, "::1", None)
+    record = (
+        Record(context, local_endpoint)
+        .start(1506970524000000)
+        .name("get")
+        .kind("CLIENT")
+        .set_tag("http.path", "/")
+        .annotate("start:sql", 1506970524000001)
+        .remote_endpoint(remote_endpoint)
+        .finish(1506970524000300)
+    )
+    return record
+
+
+def test_json_encoder(record: Record) -> None:
+    encoder = JsonEncoder()
+    assert encoder.content_type == "application/json"
+    span = encoder.encode_span(record)
+    expected = record.asdict()
+    del expected["debug"]
+    assert json.loads(encoder.encode_list([span, span])) == [expected, expected]
+
+
+def test_json_encoder_minimal() -> None:
+    context = TraceContext('"quoted"', None, "1", True, True, False)
+    record = Record(context, Endpoint("service_a", None, None, None)).start(0)
+    encoder = JsonEncoder()
+    data = json.loads(encoder.encode_list([encoder.encode_span(record)]))
+    assert data == [
+        {
+            "traceId": '"quoted"',
+            "id": "1",
+            "name": "unknown",
+            "timestamp": 0,
+            "debug": True,
+            "localEndpoint": {"serviceName": "service_a"},
+        }
+    ]
+
+
+def test_proto3_encoder(record: Record) -> None:
+    encoder = Proto3Encoder()
+    assert encoder.content_type == "application/x-protobuf"
+
+    encoded = encoder.encode_span(record)
+    spans = decode_message(encoder.encode_list([encoded, encoded]))
+    assert [f for f, _ in spans] == [1, 1]
+
+    span = dict(decode_message(spans[0][1]))
+    assert span[1] == bytes.fromhex("6f9a20b5092fa5e144fd15cc31141cd4")
+    assert span[2] == bytes.fromhex("41baf1be2fb9bfc5")
+    assert span[3] == bytes.fromhex("17133d482ba4f605")
+    assert span[4] == 1
+    assert span[5] == b"get"
+    assert span[6] == 1506970524000000
+    assert span[7] == 300
+    assert 12 not in span
+    assert span[13] == 1
+
+    local_endpoint = dict(decode_message(span[8]))
+    assert local_endpoint == {1: b"service_a", 2: b"\x7f\x00\x00\x01", 4: 8080}
+    remote_endpoint = dict(decode_message(span[9]))
+    assert remote_endpoint == {1: b"service_b", 3: b"\x00" * 15 + b"\x01"}
+
+    annotation = dict(decode_message(span[10]))
+    assert annotation == {1: 1506970524000001, 2: b"start:sql"}
+    tag = dict(decode_message(span[11]))
+    assert tag == {1: b"http.path", 2: b"/"}
+
+
+def test_otlp_encoder(record: Record) -> None:
+    encoder = OtlpEncoder()
+    assert encoder.content_type == "application/x-protobuf"
+
+    context = TraceContext(
+        "00000000000000f1", None, "00000000000000f2", True, False, False
+    )
+    other = (
+        Record(context, Endpoint("service_c", None, None, None))
+        .start(10)
+        .set_tag("error", "boom")
+        .finish(20)
+    )
+    encoded = [encoder.encode_span(r) for r in (record, other, record)]
+    request = decode_message(encoder.encode_list(encoded))
+    assert [f for f, _ in request] == [1, 1]
+
+    # spans are grouped by local endpoint
+    resource_spans = dict(decode_message(request[0][1]))
+    resource = [
+        dict(decode_message(kv)) for _, kv in decode_message(resource_spans[1])
+    ]
+    assert [(kv[1], decode_message(kv[2])[0][1]) for kv in resource] == [
+        (b"service.name", b"service_a"),
+        (b"net.host.ip", b"127.0.0.1"),
+        (b"net.host.port", b"8080"),
+    ]
+    scope_spans = decode_message(resource_spans[2])
+    assert dict(decode_message(scope_spans[0][1])) == {1: b"aiozipkin"}
+    spans = [v for f, v in scope_spans if f == 2]
+    assert len(spans) == 2
+
+    fields = decode_message(spans[0])
+    span = dict(fields)
+    assert span[1] == bytes.fromhex("6f9a20b5092fa5e144fd15cc31141cd4")
+    assert span[2] == bytes.fromhex("17133d482ba4f605")
+    assert span[4] == bytes.fromhex("41baf1be2fb9bfc5")
+    assert span[5] == b"get"
+    assert span[6] == 3
+    assert span[7] == 1506970524000000000
+    assert span[8] == 1506970524000300000
+    attributes = {}
+    for f, v in fields:
+        if f == 9:
+            kv = dict(decode_message(v))
+            attributes[kv[1]] = dict(decode_message(kv[2]))[1]
+    assert attributes == {
+        b"http.path": b"/",
+        b"peer.service": b"service_b",
+        b"net.peer.ip": b"::1",
+    }
+    assert dict(decode_message(span[11])) == {1: 1506970524000001000, 2: b"start:sql"}
+    assert 15 not in span
+
+    resource_spans = dict(decode_message(request[1][1]))
+    (scope_span,) = [v for f, v in decode_message(resource_spans[2]) if f == 2]
+    span = dict(decode_message(scope_span))
+    # 64 bit trace id is padded, span without kind is unspecified
+    assert span[1] == b"\x00" * 15 + b"\xf1"
+    assert 6 not in span
+    assert (span[7], span[8]) == (10000, 20000)
+    assert dict(decode_message(span[15])) == {2: b"boom", 3: 2}
+
+
+def test_get_encoder() -> None:
+    assert isinstance(get_encoder("json"), JsonEncoder)
+    assert isinstance(get_encoder("proto3"), Proto3Encoder)
+    assert isinstance(get_encoder("otlp"), OtlpEncoder)
+    with pytest.raises(ValueError):
+        get_encoder("thrift")
@@ -1,10 +1,164 @@
 import asyncio
+import socket
+from typing import Any, Dict, List, Tuple
 
 import aiohttp
 import pytest
 from yarl import URL
 
 import aiozipkin as az
+from aiozipkin.jaeger import JaegerTransport
+from aiozipkin.utils import signed_int_to_unsigned_hex
+
+
+def _varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return result, pos
+
+
+def _value(buf: bytes, pos: int, t: int) -> Tuple[Any, int]:
+    if t in (1, 2):
+        return t == 1, pos
+    if t in (5, 6):
+        v, pos = _varint(buf, pos)
+        return (v >> 1) ^ -(v & 1), pos
+    if t == 8:
+        size, pos = _varint(buf, pos)
+        return buf[pos : pos + size].decode(), pos + size
+    if t == 9:
+        header = buf[pos]
+        pos += 1
+        size, elem_type = header >> 4, header & 0x0F
+        if size == 15:
+            size, pos = _varint(buf, pos)
+        items = []
+        for _ in range(size):
+            item, pos = _value(buf, pos, elem_type)
+            items.append(item)
+        return items, pos
+    assert t == 12
+    return _struct(buf, pos)
+
+
+def _struct(buf: bytes, pos: int) -> Tuple[Dict[int, Any], int]:
+    fields: Dict[int, Any] = {}
+    field = 0
+    while buf[pos]:
+        header = buf[pos]
+        pos += 1
+        field += header >> 4
+        fields[field], pos = _value(buf, pos, header & 0x0F)
+    return fields, pos + 1
+
+
+def decode_emit_batch(datagram: bytes) -> Dict[int, Any]:
+    assert datagram[:2] == b"\x82\x81"
+    _, pos = _varint(datagram, 2)
+    name, pos = _value(datagram, pos, 8)
+    assert name == "emitBatch"
+    args, pos = _struct(datagram, pos)
+    assert pos == len(datagram)
+    batch: Dict[int, Any] = args[1]
+    return batch
+
+
+class _Receiver(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.datagrams: List[bytes] = []
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self.datagrams.append(data)
+
+
+@pytest.mark.asyncio
+async def test_jaeger_transport(loop: asyncio.AbstractEventLoop) -> None:
+    receiver = _Receiver()
+    endpoint, _ = await loop.create_datagram_endpoint(
+        lambda: receiver, local_addr=("127.0.0.1", 0)
+    )
+    port = endpoint.get_extra_info("sockname")[1]
+    transport = JaegerTransport(port=port)
+    local = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    tracer = await az.create_custom(local, transport)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root")
+        span.kind(az.SERVER)
+        span.annotate("event", 1)
+        span.remote_endpoint("peer", ipv4="10.0.0.1", port=8080)
+        with span.new_child("child") as child:
+            child.tag("error", "boom")
+    await tracer.close()
+    for _ in range(100):
+        if receiver.datagrams:
+            break
+        await asyncio.sleep(0.01)
+    endpoint.close()
+
+    assert len(receiver.datagrams) == 1
+    batch = decode_emit_batch(receiver.datagrams[0])
+    assert batch[1] == {
+        1: "simple_service",
+        2: [{1: "ip", 2: 0, 3: "127.0.0.1"}, {1: "port", 2: 3, 6: 80}],
+    }
+    child_span, root_span = batch[2]
+    context = span.context
+    trace_id = [signed_int_to_unsigned_hex(root_span[i]).zfill(16) for i in (2, 1)]
+    assert "".join(trace_id) == context.trace_id
+    assert signed_int_to_unsigned_hex(root_span[3]).zfill(16) == context.span_id
+    assert root_span[4] == 0
+    assert child_span[4] == root_span[3]
+    assert (root_span[5], root_span[7]) == ("root", 1)
+    assert root_span[11] == [{1: 1000000, 2: [{1: "event", 2: 0, 3: "event"}]}]
+    tags = {t[1]: t.get(3, t.get(6, t.get(5))) for t in root_span[10]}
+    assert tags == {
+        "span.kind": "server",
+        "peer.service": "peer",
+        "peer.ipv4": "10.0.0.1",
+        "peer.port": 8080,
+    }
+    tags = {t[1]: t.get(3, t.get(5)) for t in child_span[10]}
+    assert tags == {"error": True, "error.message": "boom"}
+
+
+@pytest.mark.asyncio
+async def test_jaeger_transport_splits_batches(
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setblocking(False)
+    port = sock.getsockname()[1]
+    transport = JaegerTransport(port=port, max_packet_size=1000)
+    tracer = await az.create_custom(az.create_endpoint("simple_service"), transport)
+    for _ in range(20):
+        with tracer.new_trace(sampled=True) as span:
+            span.tag("payload", "x" * 100)
+    with tracer.new_trace(sampled=True) as span:
+        span.tag("payload", "x" * 1000)
+    await tracer.close()
+    await asyncio.sleep(0.05)
+
+    spans = 0
+    datagrams = 0
+    while True:
+        try:
+            datagram = sock.recv(65536)
+        except BlockingIOError:
+            break
+        assert len(datagram) <= 1000
+        datagrams += 1
+        spans += len(decode_emit_batch(datagram)[2])
+    sock.close()
+    assert spans == 20
+    assert datagrams > 1
+    assert transport.stats.dropped_spans == {"too_large": 1}
 
 
 @pytest.mark.asyncio
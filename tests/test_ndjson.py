@@ -0,0 +1,116 @@
+import asyncio
+import gzip
+import json
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+import aiozipkin as az
+from aiozipkin.helpers import TraceContext
+from aiozipkin.ndjson import FileTransport
+from aiozipkin.record import Record
+
+
+def _read(paths: List[Path]) -> List[Any]:
+    spans: List[Any] = []
+    for path in sorted(paths):
+        opener: Any = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as f:
+            spans.extend(json.loads(line) for line in f)
+    return spans
+
+
+@pytest.mark.asyncio
+async def test_file_transport(tmp_path: Path, loop: asyncio.AbstractEventLoop) -> None:
+    transport = FileTransport(str(tmp_path), buffer_size=100, fsync="always")
+    endpoint = az.create_endpoint("simple_service")
+    tracer = await az.create_custom(endpoint, transport)
+    for i in range(10):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"span-{i}")
+    await asyncio.sleep(0.01)
+    # file is renamed only when it is closed
+    assert list(tmp_path.glob("*.ndjson")) == []
+    assert len(list(tmp_path.glob("*.part"))) == 1
+    await tracer.close()
+
+    assert list(tmp_path.glob("*.part")) == []
+    spans = _read(list(tmp_path.glob("*.ndjson")))
+    assert [s["name"] for s in spans] == [f"span-{i}" for i in range(10)]
+    assert spans[0]["localEndpoint"] == {"serviceName": "simple_service"}
+    assert transport.stats.uncompressed_bytes > 0
+    assert transport.stats.dropped_spans == {}
+
+
+@pytest.mark.asyncio
+async def test_file_transport_rotation(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    transport = FileTransport(
+        str(tmp_path), compress=True, max_file_size=1, buffer_size=1
+    )
+    tracer = await az.create_custom(az.create_endpoint("simple_service"), transport)
+    for i in range(3):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"span-{i}")
+    await tracer.close()
+
+    files = list(tmp_path.glob("*.ndjson.gz"))
+    assert len(files) == 3
+    assert [s["name"] for s in _read(files)] == ["span-0", "span-1", "span-2"]
+
+
+@pytest.mark.asyncio
+async def test_file_transport_time_rotation(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    transport = FileTransport(str(tmp_path), rotate_interval=0.05, flush_interval=0.01)
+    tracer = await az.create_custom(az.create_endpoint("simple_service"), transport)
+    with tracer.new_trace(sampled=True):
+        pass
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if list(tmp_path.glob("*.ndjson")):
+            break
+    # idle file is closed by timer
+    assert len(list(tmp_path.glob("*.ndjson"))) == 1
+    await tracer.close()
+
+
+@pytest.mark.asyncio
+async def test_file_transport_drops(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    transport = FileTransport(str(tmp_path), max_pending_size=1)
+    tracer = await az.create_custom(az.create_endpoint("simple_service"), transport)
+    for _ in range(3):
+        with tracer.new_trace(sampled=True):
+            pass
+    await tracer.close()
+    with tracer.new_trace(sampled=True):
+        pass
+    assert transport.stats.dropped_spans == {"queue_full": 2, "unavailable": 1}
+    assert len(_read(list(tmp_path.glob("*.ndjson")))) == 1
+
+
+def test_file_transport_bad_fsync(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        FileTransport(str(tmp_path), fsync="sometimes")
+
+
+@pytest.mark.asyncio
+async def test_file_transport_send_many(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    transport = FileTransport(str(tmp_path), max_pending_size=500)
+    endpoint = az.create_endpoint("simple_service")
+    records = []
+    for i in range(50):
+        context = TraceContext("%016x" % i, None, "%016x" % i, True, False, False)
+        records.append(Record(context, endpoint).name(f"span-{i}").start(0))
+    # far more than max_pending_size, nothing is dropped
+    await transport.send_many(records)
+    await transport.close()
+    assert transport.stats.dropped_spans == {}
+    assert len(_read(list(tmp_path.glob("*.ndjson")))) == 50
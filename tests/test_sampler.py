@@ -1,4 +1,21 @@
-from aiozipkin.sampler import Sampler
+import asyncio
+import json
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+from aiozipkin.record import Record
+from aiozipkin.sampler import (
+    AdaptiveSampler,
+    HashSampler,
+    PressureSampler,
+    RateLimitingSampler,
+    RuleSampler,
+    Sampler,
+    SamplingAttributes,
+)
+from aiozipkin.transport import TransportABC
 
 
 def test_sample_always() -> None:
@@ -23,3 +40,266 @@ def test_sample_with_rate() -> None:
     assert sampler.is_sampled(trace_id)
     assert sampler.is_sampled(trace_id)
     assert not sampler.is_sampled(trace_id)
+
+
+class _PressureTransport(TransportABC):
+    def __init__(self) -> None:
+        self.pressure = False
+
+    @property
+    def under_pressure(self) -> bool:
+        return self.pressure
+
+    def send(self, record: Record) -> None:
+        pass  # pragma: no cover
+
+    async def close(self) -> None:
+        pass  # pragma: no cover
+
+
+def test_pressure_sampler() -> None:
+    now: List[float] = [0.0]
+    transport = _PressureTransport()
+    sampler = PressureSampler(
+        Sampler(sample_rate=1.0), transport, seed=1, clock=lambda: now[0]
+    )
+    trace_id = "bde15168450e7097008c7aab41c27ade"
+    assert all(sampler.is_sampled(trace_id) for _ in range(100))
+
+    # multiplicative decrease, at most once per interval
+    transport.pressure = True
+    for factor in (0.5, 0.25, 0.125):
+        now[0] += 1
+        sampler.is_sampled(trace_id)
+        sampler.is_sampled(trace_id)
+        assert sampler.factor == factor
+    sampled = sum(sampler.is_sampled(trace_id) for _ in range(1000))
+    assert 75 < sampled < 175
+
+    for _ in range(20):
+        now[0] += 1
+        sampler.is_sampled(trace_id)
+    assert sampler.factor == 0.01
+
+    # additive recovery
+    transport.pressure = False
+    now[0] += 1
+    sampler.is_sampled(trace_id)
+    assert sampler.factor == pytest.approx(0.06)
+    for _ in range(30):
+        now[0] += 1
+        sampler.is_sampled(trace_id)
+    assert sampler.factor == 1.0
+
+
+def test_hash_sampler() -> None:
+    sampler = HashSampler(sample_rate=0.25)
+    # only low 64 bits are used, so 64 and 128 bit ids match
+    assert sampler.is_sampled("3fffffffffffffff")
+    assert sampler.is_sampled("ffffffffffffffff3fffffffffffffff")
+    assert not sampler.is_sampled("4000000000000000")
+    assert not sampler.is_sampled("not a trace id")
+
+    trace_ids = ["%016x" % (i * 0x9E3779B97F4A7C15 % 2**64) for i in range(1000)]
+    decisions = [sampler.is_sampled(t) for t in trace_ids]
+    # deterministic for every sampler with same rate
+    assert decisions == [HashSampler(sample_rate=0.25).is_sampled(t) for t in trace_ids]
+    assert 200 < sum(decisions) < 300
+
+    assert all(HashSampler(sample_rate=1.0).is_sampled(t) for t in trace_ids)
+    assert not any(HashSampler(sample_rate=0.0).is_sampled(t) for t in trace_ids)
+    with pytest.raises(ValueError):
+        HashSampler(sample_rate=1.5)
+
+
+def _refill(sampler: RateLimitingSampler, elapsed: float) -> None:
+    sampler._refilled_at -= elapsed
+    sampler._refill()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiting_sampler(loop: asyncio.AbstractEventLoop) -> None:
+    sampler = RateLimitingSampler(
+        10, quotas={"/checkout": 2}, default_quota=1, refill_interval=60
+    )
+    trace_id = "bde15168450e7097008c7aab41c27ade"
+    assert sum(sampler.is_sampled(trace_id) for _ in range(100)) == 10
+    # rare keys still get their quota when shared limit is exhausted
+    assert [sampler.is_sampled(trace_id, "/checkout") for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    assert sampler.is_sampled(trace_id, "/rare")
+    assert not sampler.is_sampled(trace_id, "/rare")
+
+    _refill(sampler, 0.5)
+    assert sum(sampler.is_sampled(trace_id) for _ in range(100)) == 5
+    # burst is limited to one second
+    _refill(sampler, 60)
+    assert sum(sampler.is_sampled(trace_id) for _ in range(100)) == 10
+    sampler.close()
+    sampler.close()
+
+
+def test_rate_limiting_sampler_created_before_loop() -> None:
+    sampler = RateLimitingSampler(100, refill_interval=0.01)
+    trace_id = "bde15168450e7097008c7aab41c27ade"
+
+    async def exhaust_and_wait() -> bool:
+        while sampler.is_sampled(trace_id):
+            pass
+        await asyncio.sleep(0.05)
+        return sampler.is_sampled(trace_id)
+
+    # timer runs on loop the sampler is used from
+    assert asyncio.run(exhaust_and_wait())
+    sampler.close()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiting_sampler_timer(loop: asyncio.AbstractEventLoop) -> None:
+    sampler = RateLimitingSampler(
+        100, default_quota=1, refill_interval=0.01, max_keys=1
+    )
+    trace_id = "bde15168450e7097008c7aab41c27ade"
+    while sampler.is_sampled(trace_id, "a"):
+        pass
+    sampler.is_sampled(trace_id, "b")
+    # only most recently used keys are tracked
+    assert list(sampler._keys) == ["b"]
+    await asyncio.sleep(0.05)
+    assert sampler.is_sampled(trace_id)
+    sampler.close()
+
+
+# low 64 bits of ids are 10% and 90% of id space
+LOW_ID = "bde15168450e7097" + "1999999999999999"
+HIGH_ID = "bde15168450e7097" + "e666666666666666"
+
+
+def test_rule_sampler() -> None:
+    sampler = RuleSampler(
+        [
+            {"route": "/healthz", "sample_rate": 0},
+            {"route": "/checkout", "sample_rate": 0.5},
+            {"route": "/checkout", "method": "post", "sample_rate": 1},
+            {"name": "db.query", "sample_rate": 1},
+        ],
+        default_sample_rate=0.2,
+    )
+
+    def sampled(trace_id: str, **kwargs: Any) -> bool:
+        return sampler.should_sample(trace_id, SamplingAttributes(**kwargs))
+
+    assert not sampled(LOW_ID, method="GET", route="/healthz")
+    assert sampled(HIGH_ID, method="POST", route="/checkout")
+    assert not sampled(HIGH_ID, method="GET", route="/checkout")
+    assert sampled(LOW_ID, method="GET", route="/checkout")
+    # path is used if request did not match any route
+    assert not sampled(LOW_ID, path="/healthz")
+    assert sampled(HIGH_ID, name="db.query")
+    assert sampled(LOW_ID, route="/other")
+    assert not sampled(HIGH_ID, route="/other")
+    assert sampler.is_sampled(LOW_ID)
+    assert not sampler.is_sampled(HIGH_ID)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        [{"sample_rate": 1}],
+        [{"route": "/", "name": "a", "sample_rate": 1}],
+        [{"route": "/"}],
+        [{"route": "/", "sample_rate": 2}],
+        [{"route": "/", "sample_rate": 1, "path": "/"}],
+        [{"route": "/", "sample_rate": 1}, {"route": "/", "sample_rate": 0}],
+    ],
+)
+def test_rule_sampler_invalid(rules: List[Dict[str, Any]]) -> None:
+    with pytest.raises(ValueError):
+        RuleSampler(rules)
+
+
+def test_rule_sampler_reload(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "rules.json")
+    attributes = SamplingAttributes(route="/checkout")
+
+    def write(config: object, mtime: int) -> None:
+        with open(path, "w") as f:
+            json.dump(config, f)
+        os.utime(path, (mtime, mtime))
+
+    write({"default_sample_rate": 0}, 1)
+    # sampler is created before event loop runs
+    sampler = RuleSampler.from_file(path, reload_interval=0.01)
+
+    async def check() -> None:
+        assert not sampler.should_sample(LOW_ID, attributes)
+        assert not sampler.reload()
+
+        write({"rules": [{"route": "/checkout", "sample_rate": 1}]}, 2)
+        await asyncio.sleep(0.05)
+        assert sampler.should_sample(HIGH_ID, attributes)
+
+        # broken file keeps previous rules
+        write({"rules": [{"route": "/checkout"}]}, 3)
+        await asyncio.sleep(0.05)
+        assert sampler.should_sample(HIGH_ID, attributes)
+
+    asyncio.run(check())
+    sampler.close()
+    sampler.close()
+
+
+@pytest.mark.asyncio
+async def test_adaptive_sampler(loop: asyncio.AbstractEventLoop) -> None:
+    sampler = AdaptiveSampler(
+        10, min_sample_rate=0.01, initial_sample_rate=0.5, window=2, interval=1
+    )
+    frequent = SamplingAttributes(route="/frequent")
+    rare = SamplingAttributes(name="rare")
+    assert sampler.should_sample(LOW_ID, frequent)
+    assert not sampler.should_sample(HIGH_ID, frequent)
+
+    def tick(frequent_count: int, rare_count: int) -> None:
+        for _ in range(frequent_count):
+            sampler.should_sample(LOW_ID, frequent)
+        for _ in range(rare_count):
+            sampler.should_sample(LOW_ID, rare)
+        sampler.update()
+
+    tick(198, 2)
+    # rare operation gets all its traces, rest of target goes to
+    # frequent one
+    assert sampler.sample_rates == {
+        "/frequent": pytest.approx(8 / 200),
+        "rare": 1.0,
+    }
+    # rates are measured over sliding window of two intervals
+    tick(0, 2)
+    assert sampler.sample_rates["/frequent"] == pytest.approx(8 / 100)
+    tick(2000, 0)
+    assert sampler.sample_rates == {"/frequent": 0.01, "rare": 1.0}
+    # operation without requests during window is forgotten
+    tick(1, 0)
+    assert sampler.sample_rates == {"/frequent": 0.01}
+    sampler.close()
+    sampler.close()
+
+
+def test_adaptive_sampler_max_operations() -> None:
+    # sampler is created before event loop runs
+    sampler = AdaptiveSampler(1, max_operations=2, window=0.02, interval=0.01)
+
+    async def check() -> None:
+        for route in ["/a", "/b", "/c", "/d"]:
+            sampler.should_sample(LOW_ID, SamplingAttributes(route=route))
+        # operations over limit share one sample rate
+        assert set(sampler.sample_rates) == {"/a", "/b", ""}
+        # operations without requests during window are forgotten
+        await asyncio.sleep(0.1)
+        assert sampler.sample_rates == {}
+
+    asyncio.run(check())
+    sampler.close()
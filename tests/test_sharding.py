@@ -0,0 +1,38 @@
+import pytest
+
+from aiozipkin.utils import generate_random_64bit_string
+from aiozipkin.sharding import HashRing, trace_key
+
+
+def test_trace_key() -> None:
+    assert trace_key("6f9a20b5092fa5e144fd15cc31141cd4") == 0x44FD15CC31141CD4
+    assert trace_key("44fd15cc31141cd4") == 0x44FD15CC31141CD4
+
+
+def test_hash_ring_minimal_rebalance() -> None:
+    nodes = [f"http://collector-{i}:9411/api/v2/spans" for i in range(8)]
+    ring = HashRing(nodes)
+    assert ring.nodes == nodes
+    traces = [generate_random_64bit_string() for _ in range(5000)]
+    before = {t: ring.get(t) for t in traces}
+    # all shards get traffic
+    assert set(before.values()) == set(nodes)
+
+    ring.add("http://collector-8:9411/api/v2/spans")
+    after = {t: ring.get(t) for t in traces}
+    moved = [t for t in traces if before[t] != after[t]]
+    # only traces taken over by new shard are moved, about 1/9 of them
+    assert all(after[t] == "http://collector-8:9411/api/v2/spans" for t in moved)
+    assert 0.05 < len(moved) / len(traces) < 0.2
+
+    ring.remove("http://collector-8:9411/api/v2/spans")
+    assert {t: ring.get(t) for t in traces} == before
+
+
+def test_hash_ring_errors() -> None:
+    ring = HashRing([])
+    with pytest.raises(LookupError):
+        ring.get("44fd15cc31141cd4")
+    ring.add("a")
+    with pytest.raises(ValueError):
+        ring.add("a")
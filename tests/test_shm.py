@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import uuid
+from typing import Any, Iterator
+
+import pytest
+from aiohttp.client import ClientTimeout
+
+import aiozipkin as az
+from aiozipkin.shm import RingBuffer, ShmExporter, ShmTransport
+
+
+@pytest.fixture
+def ring() -> Iterator[RingBuffer]:
+    ring = RingBuffer.create(f"aiozipkin-test-{uuid.uuid4().hex[:8]}", slots=2)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_ring_buffer_wraps() -> None:
+    ring = RingBuffer.create(f"aiozipkin-test-{uuid.uuid4().hex[:8]}", slot_size=64)
+    try:
+        other = RingBuffer.attach(ring.name)
+        assert (other.slots, other.slot_size, other.encoding) == (64, 64, "json")
+
+        assert ring.write(0, b"a" * 20, 1)
+        assert ring.write(0, b"b" * 20)
+        # 56 of 64 bytes are used
+        assert not ring.write(0, b"c" * 20)
+        assert other.read(0, 10) == [(b"a" * 20, 1), (b"b" * 20, 0)]
+
+        # record does not fit into ring tail and is written from start
+        assert ring.write(0, b"c" * 20)
+        assert ring.write(0, b"d" * 20)
+        assert other.read(0, 1) == [(b"c" * 20, 0)]
+        assert other.read(0, 10) == [(b"d" * 20, 0)]
+        assert other.read(0, 10) == []
+        other.close()
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_ring_buffer_not_ring() -> None:
+    ring = RingBuffer.create(f"aiozipkin-test-{uuid.uuid4().hex[:8]}")
+    try:
+        ring._buf[:4] = b"XXXX"
+        with pytest.raises(ValueError):
+            RingBuffer.attach(ring.name)
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+@pytest.mark.asyncio
+async def test_shm_transport_slots(ring: RingBuffer, tmp_path: Any) -> None:
+    lock_dir = str(tmp_path)
+    tr1 = ShmTransport(ring.name, lock_dir=lock_dir)
+    tr2 = ShmTransport(ring.name, lock_dir=lock_dir)
+    assert (tr1.slot, tr2.slot) == (0, 1)
+    with pytest.raises(RuntimeError):
+        ShmTransport(ring.name, lock_dir=lock_dir)
+
+    # slot of closed or crashed worker is claimed again
+    await tr1.close()
+    tr3 = ShmTransport(ring.name, lock_dir=lock_dir)
+    assert tr3.slot == 0
+    await tr2.close()
+    await tr3.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_export(
+    ring: RingBuffer, tmp_path: Any, fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    exporter = ShmExporter(
+        ring.name,
+        fake_zipkin.url,
+        poll_interval=0.01,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+    )
+    task = asyncio.ensure_future(exporter.run())
+
+    tracers = []
+    for _ in range(2):
+        tr = ShmTransport(ring.name, lock_dir=str(tmp_path))
+        tracers.append(await az.create_custom(endpoint, tr))
+
+    waiter = fake_zipkin.wait_data(1)
+    for i, tracer in enumerate(tracers):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"worker_{i}")
+    await asyncio.wait_for(waiter, timeout=5)
+
+    for tracer in tracers:
+        await tracer.close()
+    await exporter.close()
+    await task
+
+    data = fake_zipkin.get_received_data()
+    names = sorted(s["name"] for batch in data for s in batch)
+    assert names == ["worker_0", "worker_1"]
+
+
+@pytest.mark.asyncio
+async def test_shm_transport_full(tmp_path: Any) -> None:
+    ring = RingBuffer.create(f"aiozipkin-test-{uuid.uuid4().hex[:8]}", slot_size=512)
+    try:
+        endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+        tr = ShmTransport(ring.name, lock_dir=str(tmp_path))
+        tracer = await az.create_custom(endpoint, tr)
+        exporter = ShmExporter(
+            ring.name, "http://127.0.0.1:1/api/v2/spans", send_attempt_count=1
+        )
+        for _ in range(10):
+            with tracer.new_trace(sampled=True):
+                pass
+        dropped = tr.stats.dropped_spans["queue_full"]
+        assert 0 < dropped < 10
+
+        assert exporter.poll() == 10 - dropped
+        assert exporter.stats.dropped_spans == {"queue_full": dropped}
+        await tracer.close()
+        await exporter.close()
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+@pytest.mark.asyncio
+async def test_shm_export_busy_ring(
+    ring: RingBuffer, fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    exporter = ShmExporter(
+        ring.name,
+        fake_zipkin.url,
+        poll_interval=0.01,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+    )
+    stopped = threading.Event()
+    span = b'{"traceId":"1","id":"1","name":"busy"}'
+
+    def produce() -> None:
+        # writer that never lets ring get empty
+        while not stopped.is_set():
+            ring.write(0, span)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    task = asyncio.ensure_future(exporter.run())
+    try:
+        await asyncio.wait_for(fake_zipkin.wait_data(1), timeout=5)
+    finally:
+        stopped.set()
+        producer.join()
+    await exporter.close()
+    await task
+    assert fake_zipkin.get_received_data()
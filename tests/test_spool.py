@@ -0,0 +1,133 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from aiozipkin.spool import Spool
+
+
+def test_append_read_commit(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path))
+    assert spool.is_empty
+    assert spool.read(10) is None
+
+    assert spool.append([b"a", b"bb"])
+    assert spool.append([b"ccc"])
+    assert not spool.is_empty
+
+    chunk = spool.read(2)
+    assert chunk is not None
+    spans, position, keys = chunk
+    assert (spans, keys) == ([b"a", b"bb"], [0, 0])
+    # nothing is consumed until commit
+    chunk = spool.read(10)
+    assert chunk is not None
+    assert chunk[0] == [b"a", b"bb", b"ccc"]
+
+    spool.commit(position)
+    chunk = spool.read(10)
+    assert chunk is not None
+    spans, position, _ = chunk
+    assert spans == [b"ccc"]
+    spool.commit(position)
+    assert spool.is_empty
+    spool.close()
+
+
+def test_read_max_bytes(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path))
+    spool.append([b"a" * 100])
+    spool.append([b"b" * 100])
+    chunk = spool.read(10, max_bytes=150)
+    assert chunk is not None
+    assert chunk[0] == [b"a" * 100]
+    # batch larger than limit is still returned
+    chunk = spool.read(10, max_bytes=10)
+    assert chunk is not None
+    assert chunk[0] == [b"a" * 100]
+    spool.close()
+
+
+def test_rotation_and_compaction(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path), segment_size=50)
+    for i in range(5):
+        spool.append([b"x" * 40])
+    assert len(list(tmp_path.glob("*.spool"))) == 5
+
+    while True:
+        chunk = spool.read(2)
+        if chunk is None:
+            break
+        spool.commit(chunk[1])
+    # segment being written is kept
+    assert len(list(tmp_path.glob("*.spool"))) == 1
+    assert spool.is_empty
+    spool.close()
+
+
+def test_max_size(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path), max_size=100)
+    assert spool.append([b"x" * 50])
+    assert not spool.append([b"x" * 50])
+    spool.close()
+
+
+def test_recovery(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path))
+    spool.append([b"first"])
+    spool.append([b"second"])
+    spool.append([b"third"])
+    chunk = spool.read(1)
+    assert chunk is not None
+    spool.commit(chunk[1])
+    spool.close()
+
+    # simulate crash in the middle of write
+    (segment,) = tmp_path.glob("*.spool")
+    size = os.path.getsize(segment)
+    os.truncate(segment, size - 2)
+
+    spool = Spool(str(tmp_path))
+    chunk = spool.read(10)
+    assert chunk is not None
+    assert chunk[0] == [b"second"]
+    spool.commit(chunk[1])
+
+    # new writes go to new segment
+    spool.append([b"fourth"])
+    chunk = spool.read(10)
+    assert chunk is not None
+    assert chunk[0] == [b"fourth"]
+    spool.commit(chunk[1])
+    assert spool.is_empty
+    assert len(list(tmp_path.glob("*.spool"))) == 1
+    spool.close()
+
+
+def test_trace_keys(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path))
+    spool.append([b"a", b"b"], [1, 2**64 - 1])
+    spool.append([b"c"])
+    chunk = spool.read(10)
+    assert chunk is not None
+    assert (chunk.spans, chunk.keys) == ([b"a", b"b", b"c"], [1, 2**64 - 1, 0])
+    spool.close()
+
+
+def test_encoding_mismatch(tmp_path: Path) -> None:
+    spool = Spool(str(tmp_path))
+    spool.append([b"{}"])
+    spool.close()
+
+    with pytest.raises(ValueError):
+        Spool(str(tmp_path), encoding="proto3")
+
+    spool = Spool(str(tmp_path))
+    chunk = spool.read(10)
+    assert chunk is not None
+    spool.commit(chunk.position)
+    spool.close()
+    # empty spool is reused with new encoding
+    spool = Spool(str(tmp_path), encoding="proto3")
+    assert spool.encoding == "proto3"
+    spool.close()
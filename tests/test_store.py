@@ -0,0 +1,96 @@
+import json
+from typing import Any, List
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from aiozipkin.helpers import Endpoint, TraceContext
+from aiozipkin.record import Record
+from aiozipkin.store import TraceStore
+
+
+def _record(
+    trace_id: str, span_id: str, service: str, name: str, ts: int, duration: int
+) -> Record:
+    context = TraceContext(trace_id, None, span_id, True, False, False)
+    endpoint = Endpoint(service, None, None, None)
+    return Record(context, endpoint).name(name).start(ts).finish(ts + duration)
+
+
+def _ids(traces: List[List[bytes]]) -> List[str]:
+    return [json.loads(t[0])["traceId"] for t in traces]
+
+
+@pytest.fixture
+def store() -> TraceStore:
+    store = TraceStore()
+    store.send(_record("a" * 16, "1" * 16, "api", "get", 1000, 10))
+    store.send(_record("a" * 16, "2" * 16, "db", "query", 1001, 5000))
+    store.send(_record("b" * 16, "3" * 16, "api", "post", 2000, 300))
+    store.send(_record("c" * 16, "4" * 16, "worker", "get", 3000, 70000))
+    return store
+
+
+def test_find_traces(store: TraceStore) -> None:
+    assert len(store) == 3
+    assert _ids(store.find_traces()) == ["c" * 16, "b" * 16, "a" * 16]
+    assert _ids(store.find_traces(limit=1)) == ["c" * 16]
+    assert _ids(store.find_traces(service_name="api")) == ["b" * 16, "a" * 16]
+    assert _ids(store.find_traces(span_name="get")) == ["c" * 16, "a" * 16]
+    assert _ids(store.find_traces(service_name="api", span_name="get")) == ["a" * 16]
+    # criteria must match single span
+    assert store.find_traces(service_name="api", min_duration=1000) == []
+    assert _ids(store.find_traces(min_duration=200, max_duration=6000)) == [
+        "b" * 16,
+        "a" * 16,
+    ]
+    assert _ids(store.find_traces(end_ts=2500, lookback=1000)) == ["b" * 16]
+    assert store.services() == ["api", "db", "worker"]
+    assert store.span_names("api") == ["get", "post"]
+
+    spans = store.get_trace("A" * 16)
+    assert spans is not None
+    assert [json.loads(s)["name"] for s in spans] == ["get", "query"]
+    assert store.get_trace("d" * 16) is None
+
+
+def test_eviction() -> None:
+    probe = TraceStore()
+    probe.send(_record("a" * 16, "1" * 16, "api", "get", 1000, 10))
+    store = TraceStore(max_bytes=probe.size * 2)
+    store.send(_record("a" * 16, "1" * 16, "api", "get", 1000, 10))
+    store.send(_record("b" * 16, "2" * 16, "api", "get", 2000, 10))
+    # read makes trace recently used, so other one is evicted
+    assert store.get_trace("a" * 16) is not None
+    store.send(_record("c" * 16, "3" * 16, "dbs", "put", 3000, 10))
+
+    assert store.get_trace("b" * 16) is None
+    assert _ids(store.find_traces(service_name="api")) == ["a" * 16]
+    assert store.services() == ["api", "dbs"]
+    assert store.size == probe.size * 2
+
+
+@pytest.mark.asyncio
+async def test_web_app(store: TraceStore, loop: Any) -> None:
+    client = TestClient(TestServer(store.web_app()))
+    await client.start_server()
+    try:
+        resp = await client.get("/api/v2/trace/" + "a" * 16)
+        assert resp.status == 200
+        assert [s["id"] for s in await resp.json()] == ["1" * 16, "2" * 16]
+        resp = await client.get("/api/v2/trace/" + "d" * 16)
+        assert resp.status == 404
+
+        params = {"serviceName": "api", "spanName": "all", "endTs": "3", "limit": "5"}
+        resp = await client.get("/api/v2/traces", params=params)
+        traces = await resp.json()
+        assert [t[0]["traceId"] for t in traces] == ["b" * 16, "a" * 16]
+        resp = await client.get("/api/v2/traces", params={"minDuration": "x"})
+        assert resp.status == 400
+
+        resp = await client.get("/api/v2/services")
+        assert await resp.json() == ["api", "db", "worker"]
+        resp = await client.get("/api/v2/spans", params={"serviceName": "api"})
+        assert await resp.json() == ["get", "post"]
+    finally:
+        await client.close()
@@ -0,0 +1,114 @@
+from typing import Any, List, Sequence
+
+import pytest
+
+from aiozipkin.helpers import TraceContext, create_endpoint
+from aiozipkin.record import Record
+from aiozipkin.sampler import Sampler
+from aiozipkin.tail import TailSampler
+from aiozipkin.tracer import Tracer
+
+
+def _make_tracer(fake_transport: Any, tail_sampler: TailSampler) -> Tracer:
+    endpoint = create_endpoint("test_service")
+    return Tracer(
+        fake_transport, Sampler(sample_rate=0), endpoint, tail_sampler=tail_sampler
+    )
+
+
+def test_tail_sampler(fake_transport: Any) -> None:
+    tail_sampler = TailSampler(min_duration=1000000)
+    tracer = _make_tracer(fake_transport, tail_sampler)
+
+    with tracer.new_trace() as span:
+        span.name("fast")
+        with span.new_child("child"):
+            pass
+    assert not span.is_noop
+    assert not span.context.sampled
+    assert not fake_transport.records
+    assert len(tail_sampler) == 0
+    assert tail_sampler.size == 0
+
+    with pytest.raises(ValueError):
+        with tracer.new_trace() as span:
+            span.name("failed")
+            with span.new_child("child"):
+                raise ValueError("boom")
+    assert [r.asdict()["name"] for r in fake_transport.records] == [
+        "child",
+        "failed",
+    ]
+
+    span = tracer.new_trace()
+    span.name("slow").start(ts=0)
+    span.finish(ts=2)
+    assert fake_transport.records[-1].asdict()["name"] == "slow"
+
+    # spans finished after decision are not recorded
+    span = tracer.new_trace()
+    child = span.new_child("late")
+    span.start().finish()
+    assert len(tail_sampler) == 0
+    child.start().finish()
+    assert len(fake_transport.records) == 3
+    assert tracer.new_child(span.context).is_noop
+
+    assert tail_sampler.kept_traces == 2
+    assert tail_sampler.dropped_traces == 2
+
+    # explicit decision of caller or upstream service is kept
+    assert tracer.new_trace(sampled=False).is_noop
+    context = TraceContext(
+        trace_id="6f9a20b5092fa5e144fd15cc31141cd4",
+        parent_id=None,
+        span_id="41baf1be2fb9bfc5",
+        sampled=False,
+        debug=False,
+        shared=False,
+    )
+    assert tracer.join_span(context).is_noop
+    assert not tracer.join_span(context._replace(sampled=None)).is_noop
+    assert len(tail_sampler) == 1
+
+
+def test_tail_sampler_predicates(fake_transport: Any) -> None:
+    def has_db(records: Sequence[Record]) -> bool:
+        return any(r._name == "db" for r in records)
+
+    def broken(records: Sequence[Record]) -> bool:
+        raise RuntimeError
+
+    tail_sampler = TailSampler(keep_errors=False, predicates=[broken, has_db])
+    tracer = _make_tracer(fake_transport, tail_sampler)
+    with pytest.raises(ValueError):
+        with tracer.new_trace():
+            raise ValueError("boom")
+    with tracer.new_trace() as span:
+        with span.new_child("db"):
+            pass
+    assert len(fake_transport.records) == 2
+    assert tail_sampler.dropped_traces == 1
+
+
+def test_tail_sampler_limits(fake_transport: Any) -> None:
+    now = [0.0]
+    tail_sampler = TailSampler(max_bytes=1200, timeout=10, clock=lambda: now[0])
+    tracer = _make_tracer(fake_transport, tail_sampler)
+
+    spans: List[Any] = [tracer.new_trace() for _ in range(3)]
+    for span in spans:
+        span.new_child("child").start().finish()
+    # budget is exceeded, oldest trace is dropped
+    assert len(tail_sampler) == 2
+    assert not tail_sampler.is_buffered(spans[0].context.trace_id)
+    assert tail_sampler.size <= 1200
+
+    now[0] = 10.0
+    tracer.new_trace()
+    assert len(tail_sampler) == 1
+    assert tail_sampler.evicted_traces == 3
+
+    for span in spans:
+        span.tag("error", "true").start().finish()
+    assert not fake_transport.records
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiohttp.client import ClientTimeout
+
+import aiozipkin as az
+from aiozipkin.threaded import ThreadedTransport
+
+
+@pytest.mark.asyncio
+async def test_threaded_transport(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = ThreadedTransport(
+        fake_zipkin.url,
+        handoff_interval=0.01,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    waiter = fake_zipkin.wait_data(1)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root_span")
+        with span.new_child("child", az.CLIENT):
+            pass
+
+    await asyncio.wait_for(waiter, timeout=5)
+    await tracer.close()
+    # second close is noop
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    names = [s["name"] for batch in data for s in batch]
+    assert names == ["child", "root_span"]
+    assert tr.stats.uncompressed_bytes > 0
+
+
+@pytest.mark.asyncio
+async def test_threaded_transport_max_pending(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = ThreadedTransport(fake_zipkin.url, handoff_interval=60, max_pending=2)
+    tracer = await az.create_custom(endpoint, tr)
+
+    for _ in range(3):
+        with tracer.new_trace(sampled=True):
+            pass
+
+    assert tr.stats.dropped_spans == {"queue_full": 1}
+    # sender thread counters are not updated by application thread
+    assert tr._transport is not None
+    assert tr._transport.stats.dropped_spans == {}
+    await tracer.close()
+
+
+def test_threaded_transport_error() -> None:
+    with pytest.raises(ValueError):
+        ThreadedTransport("http://127.0.0.1:9411/api/v2/spans", encoding="thrift")
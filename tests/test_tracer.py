@@ -4,7 +4,7 @@ from unittest import mock
 import pytest
 
 from aiozipkin.helpers import TraceContext, create_endpoint
-from aiozipkin.sampler import SamplerABC
+from aiozipkin.sampler import RuleSampler, SamplerABC, SamplingAttributes
 from aiozipkin.span import NoopSpan, Span
 from aiozipkin.tracer import Tracer, create_custom
 from aiozipkin.transport import StubTransport
@@ -106,6 +106,33 @@ def test_trace_join_span(tracer: Tracer, context: Any) -> None:
     assert span.context.sampled is not None
 
 
+def test_sampling_attributes(fake_transport: Any) -> None:
+    endpoint = create_endpoint("simple_service")
+    sampler = RuleSampler(
+        [{"route": "/checkout", "sample_rate": 1}], default_sample_rate=0
+    )
+    tracer = Tracer(fake_transport, sampler, endpoint)
+    checkout = SamplingAttributes(method="GET", route="/checkout")
+    other = SamplingAttributes(method="GET", route="/other")
+
+    assert not tracer.new_trace().context.sampled
+    assert tracer.new_trace(attributes=checkout).context.sampled
+    assert not tracer.new_trace(attributes=other).context.sampled
+    # explicit decision of caller is kept
+    assert tracer.new_trace(sampled=True, attributes=other).context.sampled
+
+    context = TraceContext(
+        trace_id="6f9a20b5092fa5e144fd15cc31141cd4",
+        parent_id=None,
+        span_id="41baf1be2fb9bfc5",
+        sampled=None,
+        debug=False,
+        shared=False,
+    )
+    assert tracer.join_span(context, attributes=checkout).context.sampled
+    assert not tracer.join_span(context, attributes=other).context.sampled
+
+
 def test_trace_new_child(tracer: Tracer, context: Any) -> None:
 
     with tracer.new_child(context) as span:
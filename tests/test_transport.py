@@ -1,11 +1,17 @@
 import asyncio
-from typing import Any
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Set
 
 import pytest
 from aiohttp.client import ClientTimeout
 
 import aiozipkin as az
 import aiozipkin.transport as azt
+from aiozipkin.record import Record
+from aiozipkin.sharding import HashRing
+from aiozipkin.spool import Spool
 
 
 @pytest.mark.asyncio
@@ -137,3 +143,747 @@ async def test_lost_spans(fake_zipkin: Any, loop: asyncio.AbstractEventLoop) ->
 
     data = fake_zipkin.get_received_data()
     assert len(data) == 0
+    assert tr.stats.dropped_spans == {"attempts_exhausted": 1}
+
+
+@pytest.mark.asyncio
+async def test_proto3_encoding(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+        encoding="proto3",
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    waiter = fake_zipkin.wait_data(1)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root_span")
+
+    await waiter
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert len(data) == 1
+    assert bytes.fromhex(span.context.trace_id) in data[0]
+    assert b"root_span" in data[0]
+
+
+def test_unknown_encoding() -> None:
+    with pytest.raises(ValueError):
+        azt.Transport("http://127.0.0.1:9411/api/v2/spans", encoding="thrift")
+
+
+@pytest.mark.asyncio
+async def test_batches_max_bytes(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=60,
+        send_max_size=100,
+        send_max_bytes=1000,
+        send_timeout=ClientTimeout(total=1),
+    )
+    tracer = await az.create_custom(endpoint, tr)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root_span")
+        for i in range(3):
+            with span.new_child(f"child_{i}", az.CLIENT) as child:
+                child.tag("payload", "x" * 200)
+
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert [len(batch) for batch in data] == [2, 2]
+    assert [s["name"] for batch in data for s in batch] == [
+        "child_0",
+        "child_1",
+        "child_2",
+        "root_span",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_split_too_large_batch(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=60,
+        send_max_size=100,
+        send_attempt_count=1,
+        send_timeout=ClientTimeout(total=1),
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    fake_zipkin.next_errors.append("too_large")
+    fake_zipkin.next_errors.append("too_large")
+
+    for i in range(4):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"span_{i}")
+
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert [len(batch) for batch in data] == [1, 1, 2]
+    assert [s["name"] for batch in data for s in batch] == [
+        "span_0",
+        "span_1",
+        "span_2",
+        "span_3",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_gzip_compression(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=0.01,
+        send_timeout=ClientTimeout(total=1),
+        compression="gzip",
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    waiter = fake_zipkin.wait_data(1)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root_span")
+        for i in range(10):
+            with span.new_child(f"child_{i}", az.CLIENT):
+                pass
+
+    await waiter
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert len(data[0]) == 11
+    assert 0 < tr.stats.compressed_bytes < tr.stats.uncompressed_bytes
+
+
+@pytest.mark.asyncio
+async def test_max_in_flight(fake_zipkin: Any, loop: asyncio.AbstractEventLoop) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=60,
+        send_max_size=1,
+        send_timeout=ClientTimeout(total=5),
+        send_max_in_flight=4,
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    fake_zipkin.delay = 0.5
+
+    for i in range(4):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"span_{i}")
+
+    started = loop.time()
+    await tracer.close()
+    # sequential upload would take 4 * 0.5 seconds
+    assert loop.time() - started < 1.5
+
+    data = fake_zipkin.get_received_data()
+    names = sorted(s["name"] for batch in data for s in batch)
+    assert names == ["span_0", "span_1", "span_2", "span_3"]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_throttle(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=0.01,
+        send_attempt_count=2,
+        send_backoff=60,
+        send_timeout=ClientTimeout(total=1),
+    )
+    fake_zipkin.next_errors.append("throttle")
+    waiter = fake_zipkin.wait_data(1)
+    tracer = await az.create_custom(endpoint, tr)
+
+    with tracer.new_trace(sampled=True) as span:
+        span.name("root_span")
+
+    # Retry-After: 0 overrides backoff delay
+    await asyncio.wait_for(waiter, timeout=5)
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert data[0][0]["name"] == "root_span"
+
+
+def test_parse_retry_after() -> None:
+    assert azt._parse_retry_after(None) is None
+    assert azt._parse_retry_after("") is None
+    assert azt._parse_retry_after("120") == 120
+    assert azt._parse_retry_after("-1") == 0
+    assert azt._parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert azt._parse_retry_after("tomorrow") is None
+
+
+def test_circuit_breaker() -> None:
+    breaker = azt.CircuitBreaker(failure_threshold=2, cooldown=10)
+    assert breaker.allow(0)
+    breaker.failure(0)
+    assert not breaker.is_open
+    breaker.failure(1)
+    assert breaker.is_open
+    assert not breaker.allow(5)
+
+    # single probe after cool-down
+    assert breaker.allow(11)
+    assert not breaker.allow(11)
+    breaker.failure(12)
+    assert not breaker.allow(13)
+
+    assert breaker.allow(22)
+    breaker.success()
+    assert not breaker.is_open
+    assert breaker.allow(22)
+    assert breaker.allow(22)
+
+
+@pytest.mark.asyncio
+async def test_new_batches_do_not_wait_for_retries(
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    sent: List[List[bytes]] = []
+
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        if batch == [b"old"]:
+            return azt.SendResult(False)
+        sent.append(batch)
+        return azt.SendResult(True)
+
+    manager = azt.BatchManager(
+        max_size=1,
+        send_interval=0.01,
+        attempt_count=3,
+        send_data=send_data,
+        backoff=60,
+    )
+    manager.add(b"old")
+    await asyncio.sleep(0.05)
+    manager.add(b"new")
+    await asyncio.sleep(0.05)
+    assert sent == [[b"new"]]
+    assert len(manager._retry_batches) == 1
+
+    await manager.stop()
+    assert sent == [[b"new"]]
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_keeps_batches(
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    calls = 0
+
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        nonlocal calls
+        calls += 1
+        return azt.SendResult(False)
+
+    manager = azt.BatchManager(
+        max_size=1,
+        send_interval=0.01,
+        attempt_count=100,
+        send_data=send_data,
+        backoff=0,
+        circuit_breaker=azt.CircuitBreaker(failure_threshold=2, cooldown=60),
+    )
+    for i in range(5):
+        manager.add(b"span")
+    await asyncio.sleep(0.1)
+    assert calls == 2
+    assert len(manager._sending_batches) + len(manager._retry_batches) == 5
+
+    await manager.stop()
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_probe_too_large(
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    sent: List[List[bytes]] = []
+
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        if batch == [b"big"]:
+            return azt.SendResult(False, azt.HTTP_PAYLOAD_TOO_LARGE)
+        sent.append(batch)
+        return azt.SendResult(True)
+
+    stats = azt.TransportStats()
+    breaker = azt.CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.failure(loop.time())
+    manager = azt.BatchManager(
+        max_size=1,
+        send_interval=0.01,
+        attempt_count=3,
+        send_data=send_data,
+        circuit_breaker=breaker,
+        stats=stats,
+    )
+    # probe request is rejected as too large, collector is reachable
+    manager.add(b"big")
+    await asyncio.sleep(0.05)
+    manager.add(b"small")
+    await asyncio.sleep(0.05)
+    await manager.stop()
+
+    assert not breaker.is_open
+    assert sent == [[b"small"]]
+    assert stats.dropped_spans == {"too_large": 1}
+
+
+def _paused_manager(**kwargs: Any) -> azt.BatchManager:
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        raise AssertionError("collector should not be called")
+
+    breaker = azt.CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.failure(asyncio.get_event_loop().time())
+    return azt.BatchManager(
+        max_size=1,
+        send_interval=60,
+        attempt_count=3,
+        send_data=send_data,
+        circuit_breaker=breaker,
+        **kwargs,
+    )
+
+
+def _queued(manager: azt.BatchManager) -> List[bytes]:
+    # evicted batches are skipped when reached
+    return [s for b in manager._sending_batches if b.queued for s in b.spans]
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest(loop: asyncio.AbstractEventLoop) -> None:
+    stats = azt.TransportStats()
+    manager = _paused_manager(max_queue_spans=3, stats=stats)
+    for data in (b"a", b"b", b"c", b"d"):
+        manager.add(data)
+    assert _queued(manager) == [b"b", b"c", b"d"]
+    assert stats.dropped_spans == {"queue_full": 1}
+
+    await manager.stop()
+    assert stats.dropped_spans == {"queue_full": 1, "shutdown": 3}
+
+
+@pytest.mark.asyncio
+async def test_drop_newest(loop: asyncio.AbstractEventLoop) -> None:
+    stats = azt.TransportStats()
+    manager = _paused_manager(max_queue_bytes=6, drop_policy="drop_newest", stats=stats)
+    for data in (b"a", b"b", b"c", b"d"):
+        manager.add(data)
+    assert _queued(manager) == [b"a", b"b", b"c"]
+    assert stats.dropped_spans == {"queue_full": 1}
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_drop_lowest_priority(loop: asyncio.AbstractEventLoop) -> None:
+    stats = azt.TransportStats()
+    manager = _paused_manager(
+        max_queue_spans=3, drop_policy="drop_lowest_priority", stats=stats
+    )
+    manager.add(b"a", priority=0)
+    manager.add(b"b", priority=1)
+    manager.add(b"c", priority=0)
+    manager.add(b"d", priority=1)
+    assert _queued(manager) == [b"b", b"c", b"d"]
+    manager.add(b"e", priority=2)
+    assert _queued(manager) == [b"b", b"d", b"e"]
+    # nothing with lower priority left, new span is dropped
+    manager.add(b"f", priority=0)
+    assert _queued(manager) == [b"b", b"d", b"e"]
+    assert stats.dropped_spans == {"queue_full": 3}
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_evicted_batches_compacted(loop: asyncio.AbstractEventLoop) -> None:
+    stats = azt.TransportStats()
+    manager = _paused_manager(
+        max_queue_spans=3, drop_policy="drop_lowest_priority", stats=stats
+    )
+    manager.add(b"a", priority=1)
+    manager.add(b"b", priority=1)
+    for i in range(1000):
+        manager.add(b"%d" % i, priority=0)
+    assert _queued(manager) == [b"a", b"b", b"999"]
+    assert stats.dropped_spans == {"queue_full": 999}
+    # evicted batches behind queue head do not pile up while collector is down
+    assert len(manager._sending_batches) < 100
+    assert manager._victim_entries < 100
+
+    await manager.stop()
+    assert stats.dropped_spans == {"queue_full": 999, "shutdown": 3}
+
+
+def test_unknown_drop_policy() -> None:
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        return azt.SendResult(True)  # pragma: no cover
+
+    with pytest.raises(ValueError):
+        azt.BatchManager(1, 1, 1, send_data, drop_policy="drop_random")
+
+
+@pytest.mark.asyncio
+async def test_spool_and_drain(tmp_path: Path, loop: asyncio.AbstractEventLoop) -> None:
+    sent: List[List[bytes]] = []
+    available = False
+
+    async def send_data(batch: List[bytes], shard: int) -> azt.SendResult:
+        if not available:
+            return azt.SendResult(False)
+        sent.append(batch)
+        return azt.SendResult(True)
+
+    stats = azt.TransportStats()
+    spool = Spool(str(tmp_path))
+    # spool is read and committed off event loop thread
+    threads: Set[int] = set()
+    read, commit = spool.read, spool.commit
+
+    def read_in_thread(*args: Any) -> Any:
+        threads.add(threading.get_ident())
+        return read(*args)
+
+    def commit_in_thread(*args: Any) -> Any:
+        threads.add(threading.get_ident())
+        return commit(*args)
+
+    spool.read = read_in_thread  # type: ignore[method-assign,assignment]
+    spool.commit = commit_in_thread  # type: ignore[method-assign,assignment]
+    manager = azt.BatchManager(
+        max_size=2,
+        send_interval=0.01,
+        attempt_count=1,
+        send_data=send_data,
+        stats=stats,
+        circuit_breaker=azt.CircuitBreaker(failure_threshold=100, cooldown=0),
+        spool=spool,
+        spool_drain_rate=10000,
+    )
+    for data in (b"a", b"b", b"c"):
+        manager.add(data)
+    await asyncio.sleep(0.1)
+    assert stats.spooled_spans == 3
+    assert stats.dropped_spans == {}
+    assert not spool.is_empty
+
+    available = True
+    await asyncio.sleep(0.1)
+    assert sorted(s for batch in sent for s in batch) == [b"a", b"b", b"c"]
+    assert spool.is_empty
+    assert threads and threading.get_ident() not in threads
+
+    await manager.stop()
+    spool.close()
+
+
+@pytest.mark.asyncio
+async def test_failover(fake_zipkin: Any, loop: asyncio.AbstractEventLoop) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    dead_url = "http://127.0.0.1:1/api/v2/spans"
+
+    tr = azt.Transport(
+        [dead_url, fake_zipkin.url],
+        send_interval=0.01,
+        send_attempt_count=3,
+        send_backoff=0,
+        send_timeout=ClientTimeout(total=1),
+        send_eject_threshold=1,
+        send_eject_cooldown=60,
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    waiter = fake_zipkin.wait_data(1)
+
+    for i in range(3):
+        with tracer.new_trace(sampled=True) as span:
+            span.name(f"root_span_{i}")
+        await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(waiter, timeout=5)
+    await tracer.close()
+
+    data = fake_zipkin.get_received_data()
+    assert sum(len(batch) for batch in data) == 3
+    dead = tr.stats.endpoints[dead_url]
+    alive = tr.stats.endpoints[fake_zipkin.url]
+    assert (dead.requests, dead.errors, dead.is_ejected) == (1, 1, True)
+    assert alive.errors == 0
+    assert alive.requests == len(data)
+    assert alive.latency > 0
+
+
+@pytest.mark.asyncio
+async def test_endpoint_stats(loop: asyncio.AbstractEventLoop) -> None:
+    tr = azt.Transport(["http://a", "http://b"])
+    a, b = tr.stats.endpoints.values()
+
+    a.begin()
+    a.success(0.5)
+    b.begin()
+    b.success(0.1)
+    assert tr._select_endpoint(0) == 1
+
+    # endpoint is ejected after consecutive failures
+    for now in range(2):
+        b.begin()
+        b.failure(0.1, now, threshold=2, cooldown=10)
+    assert b.is_ejected
+    assert tr._select_endpoint(5) == 0
+
+    # and probed once after cool-down
+    assert tr._select_endpoint(12) == 1
+    assert tr._select_endpoint(12) == 0
+    b.begin()
+    b.success(0.1)
+    assert not b.is_ejected
+    assert (b.requests, b.errors) == (4, 2)
+    await tr.close()
+
+    with pytest.raises(ValueError):
+        azt.Transport([])
+
+
+@pytest.mark.asyncio
+async def test_sharding(loop: asyncio.AbstractEventLoop) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    addresses = [f"http://127.0.0.1:1/api/v2/spans/{i}" for i in range(4)]
+    tr = azt.Transport(
+        addresses, send_interval=60, send_attempt_count=1, sharding=True
+    )
+    tracer = await az.create_custom(endpoint, tr)
+
+    traces = {}
+    for _ in range(20):
+        with tracer.new_trace(sampled=True) as span:
+            with span.new_child("child"):
+                pass
+            traces[span.context.trace_id] = tr._ring.get(  # type: ignore
+                span.context.trace_id
+            )
+
+    # spans of trace are in active batch of its shard
+    batches = tr._batch_manager._active_batches
+    assert len(batches) > 1
+    for shard, batch in batches.items():
+        trace_ids = {json.loads(s)["traceId"] for s in batch.spans}
+        assert all(addresses.index(traces[t]) == shard for t in trace_ids)
+        assert len(batch.spans) == 2 * len(trace_ids)
+
+    # span of trace with malformed id goes to first shard
+    tr.send_encoded(b"{}", trace_id="not-hex-id")
+    assert batches[0].spans[-1] == b"{}"
+    shards = len(batches)
+
+    await tracer.close()
+    stats = tr.stats
+    assert stats.dropped_spans == {"attempts_exhausted": 41}
+    assert sum(e.requests for e in stats.endpoints.values()) == shards
+
+
+@pytest.mark.asyncio
+async def test_spool_drain_with_sharding(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    keys = [1, 0x44FD15CC31141CD4, 0xFFFFFFFFFFFFFFF0, 0x8000000000000000, 0]
+    spool = Spool(str(tmp_path))
+    spool.append([b'"%d"' % i for i in range(len(keys))], keys)
+    # spool may be written by transport with other collectors
+    addresses = [f"http://127.0.0.1:1/api/v2/spans/{i}" for i in range(2)]
+    tr = azt.Transport(addresses, send_interval=0.01, sharding=True, spool=spool)
+    posted: Dict[str, List[str]] = {}
+
+    async def post(address: Any, payload: bytes) -> azt.SendResult:
+        posted.setdefault(str(address), []).extend(json.loads(payload))
+        return azt.SendResult(True)
+
+    tr._post = post  # type: ignore[method-assign]
+    await asyncio.sleep(0.1)
+    await tr.close()
+
+    ring = HashRing(addresses)
+    expected: Dict[str, List[str]] = {}
+    for i, key in enumerate(keys):
+        # spans without trace id go to first shard
+        address = ring.get_key(key) if key else addresses[0]
+        expected.setdefault(address, []).append(str(i))
+    assert posted == expected
+    assert spool.is_empty
+    spool.close()
+
+
+@pytest.mark.asyncio
+async def test_rejected_batches_are_counted(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    endpoint = az.create_endpoint("simple_service", ipv4="127.0.0.1", port=80)
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=0.01,
+        send_attempt_count=3,
+        send_timeout=ClientTimeout(total=1),
+    )
+    tracer = await az.create_custom(endpoint, tr)
+    fake_zipkin.next_errors.append("bad_request")
+
+    with tracer.new_trace(sampled=True):
+        pass
+    await asyncio.sleep(0.1)
+
+    def broken_encode_list(spans: List[bytes]) -> bytes:
+        raise ValueError("boom")
+
+    tr._encoder.encode_list = broken_encode_list  # type: ignore
+    with tracer.new_trace(sampled=True):
+        pass
+    await asyncio.sleep(0.1)
+    await tracer.close()
+
+    # neither batch is retried, both are counted as lost
+    assert fake_zipkin.get_received_data() == []
+    assert tr.stats.dropped_spans == {"rejected": 1, "encoding_error": 1}
+
+
+@pytest.mark.asyncio
+async def test_spool_encoding_mismatch(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    spool = Spool(str(tmp_path))
+    with pytest.raises(ValueError):
+        azt.Transport("http://127.0.0.1:9411", encoding="proto3", spool=spool)
+    spool.close()
+
+
+@pytest.mark.asyncio
+async def test_spool_is_written_off_span_path(
+    tmp_path: Path, loop: asyncio.AbstractEventLoop
+) -> None:
+    stats = azt.TransportStats()
+    spool = Spool(str(tmp_path), fsync=True)
+    manager = _paused_manager(max_queue_spans=1, stats=stats, spool=spool)
+    manager.add(b"a")
+    manager.add(b"b")
+    # span that did not fit into queue is not written by add()
+    assert spool.is_empty
+    assert stats.spooled_spans == 0
+
+    await manager.stop()
+    assert stats.spooled_spans == 2
+    assert not spool.is_empty
+    spool.close()
+
+
+@pytest.mark.asyncio
+async def test_endpoint_health_of_rejecting_collector(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    tr = azt.Transport(fake_zipkin.url, send_timeout=ClientTimeout(total=1))
+    fake_zipkin.next_errors.append("bad_request")
+    result = await tr._send_data([b"{}"], 0)
+    assert result.drop_reason == "rejected"
+    stats = tr.stats.endpoints[fake_zipkin.url]
+    assert (stats.requests, stats.errors, stats.error_rate) == (1, 1, 0.2)
+    await tr.close()
+
+
+def test_endpoint_latency_with_requests_in_flight() -> None:
+    stats = azt.EndpointStats("http://a")
+    for _ in range(3):
+        stats.begin()
+    # first response sets latency even if it is not first request
+    stats.success(0.5)
+    assert stats.latency == 0.5
+    stats.success(1.5)
+    assert stats.latency == pytest.approx(0.7)
+
+
+@pytest.mark.asyncio
+async def test_send_many_waits_for_capacity(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    fake_zipkin.delay = 0.02
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=10,
+        send_max_size=2,
+        send_max_queue_spans=5,
+        send_high_water_mark=4,
+        send_timeout=ClientTimeout(total=1),
+    )
+    endpoint = az.create_endpoint("simple_service")
+    tracer = az.Tracer(tr, az.Sampler(sample_rate=1.0), endpoint)
+    records = []
+    for i in range(20):
+        context = tracer._next_context(None, sampled=True)
+        records.append(Record(context, endpoint).name(f"span-{i}").start(0))
+    assert not tracer.saturated
+
+    task = asyncio.ensure_future(tr.send_many(records))
+    await asyncio.sleep(0)
+    # spans are sent right away once high water mark is reached, instead
+    # of waiting for send interval
+    assert tracer.saturated
+    await asyncio.wait_for(task, timeout=5)
+    await tracer.close()
+
+    assert not tr.stats.dropped_spans
+    data = fake_zipkin.get_received_data()
+    assert len([s for batch in data for s in batch]) == 20
+
+
+@pytest.mark.asyncio
+async def test_wait_for_capacity_after_close(loop: asyncio.AbstractEventLoop) -> None:
+    manager = _paused_manager(max_queue_spans=3, high_water_mark=1)
+    manager.add(b"a")
+    assert manager.saturated
+    await manager.stop()
+    await asyncio.wait_for(manager.wait_for_capacity(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_throttled_transport_is_under_pressure(
+    fake_zipkin: Any, loop: asyncio.AbstractEventLoop
+) -> None:
+    tr = azt.Transport(
+        fake_zipkin.url,
+        send_interval=0.3,
+        send_attempt_count=1,
+        send_timeout=ClientTimeout(total=1),
+    )
+    fake_zipkin.next_errors.append("throttle")
+    tracer = await az.create_custom(az.create_endpoint("simple_service"), tr)
+    with tracer.new_trace(sampled=True):
+        pass
+    assert not tr.under_pressure
+    for _ in range(100):
+        if tr.stats.dropped_spans:
+            break
+        await asyncio.sleep(0.01)
+    # pressure lasts at least one send interval
+    assert tr.under_pressure
+    await asyncio.sleep(0.4)
+    assert not tr.under_pressure
+    await tracer.close()